@@ -238,15 +238,21 @@ REST_FRAMEWORK = {
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
-        "LOCATION": "redis://127.0.0.1:6379/1",
+        "LOCATION": env('REDIS_URL', default="redis://127.0.0.1:6379/1"),
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # Response caching is an optimization: treat Redis outages as cache misses
+            "IGNORE_EXCEPTIONS": True,
         }
     }
 }
 
 # Feature flags
 PURGE_EXPIRED_OFFERS_ON_START = env.bool('PURGE_EXPIRED_OFFERS_ON_START', default=True)
+# Download a restaurant's remote image_url into image_file after it is saved (off by default)
+RESTAURANT_COVER_AUTO_DOWNLOAD = env.bool('RESTAURANT_COVER_AUTO_DOWNLOAD', default=False)
+# Serve nearby/available_now from a per-worker KD-tree instead of geohash rings (see marketplace.spatial)
+SPATIAL_INDEX_ENABLED = env.bool('SPATIAL_INDEX_ENABLED', default=False)
 
 # Security settings for production
 SECURE_BROWSER_XSS_FILTER = True
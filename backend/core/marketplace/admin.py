@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Restaurant, Offer, OfferTimeSlot, Booking, BookingSlot, BookingHold
+from .models import City, Restaurant, Offer, OfferTimeSlot, Booking, BookingSlot, BookingHold
 
 
 class OfferTimeSlotInline(admin.TabularInline):
@@ -35,10 +35,16 @@ class OfferInline(admin.TabularInline):
 	fields = ("title", "offer_type", "discount_percentage", "discount_amount", "start_date", "end_date", "is_active")
 
 
+@admin.register(City)
+class CityAdmin(admin.ModelAdmin):
+	list_display = ("id", "name", "aliases", "min_latitude", "max_latitude", "min_longitude", "max_longitude")
+	search_fields = ("name",)
+
+
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
-	list_display = ("id", "name", "owner", "cuisine_type", "price_range", "is_active", "is_featured")
-	list_filter = ("is_active", "is_featured", "cuisine_type", "price_range")
+	list_display = ("id", "name", "owner", "city", "cuisine_type", "price_range", "is_active", "is_featured")
+	list_filter = ("is_active", "is_featured", "city", "cuisine_type", "price_range")
 	search_fields = ("name", "address", "owner__username", "owner__email")
 	autocomplete_fields = ("owner",)
 	inlines = [OfferInline]
@@ -9,20 +9,19 @@ class MarketplaceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'marketplace'
 
-    def ready(self):  # noqa: D401
-        # Import signals so post_save handler registers
-        from . import signals  # pylint: disable=unused-import
-
     _startup_purge_ran = False
 
     def ready(self):
-        """On backend start, purge expired offers once.
+        """Register signal handlers and, on backend start, purge expired offers once.
 
-        Guards:
+        Purge guards:
         - Only when running the web server (runserver/gunicorn)
         - Avoid double run on Django autoreload (RUN_MAIN)
         - Run in background thread to not block startup
         """
+        # Import signals so post_save/post_delete handlers register
+        from . import signals  # pylint: disable=unused-import
+
         try:
             from django.conf import settings
         except Exception:
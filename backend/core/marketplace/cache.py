@@ -0,0 +1,117 @@
+"""Response caching for the public read endpoints (feed, timeslots, filters).
+
+Keys are built from the normalized query parameters plus the current
+30-minute time bucket, so time-dependent parts of a response (past times,
+lead-time cutoffs) roll over on their own. Writes never touch cached values
+directly; instead signals bump version counters:
+
+- one counter per restaurant, bumped whenever that restaurant, its offers,
+  offer timeslots, booking slots, bookings or holds change;
+- one catalog counter, bumped when restaurants or offers are added, removed
+  or edited (anything that can change which cards a list contains).
+- one locations counter, bumped when restaurants are added, removed, moved
+  or (de)activated; workers rebuild their in-process spatial index when it moves
+  (see marketplace.spatial).
+
+Per-restaurant responses embed the restaurant's version in the key. List
+responses (the feed) store the versions of every restaurant they contain and
+are rejected on read if any of them moved.
+"""
+import hashlib
+import json
+import logging
+
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TIME_BUCKET_SECONDS = 30 * 60
+KEY_PREFIX = 'mkt'
+CATALOG_VERSION_KEY = f'{KEY_PREFIX}:v:catalog'
+LOCATIONS_VERSION_KEY = f'{KEY_PREFIX}:v:locations'
+
+
+def time_bucket(now=None):
+    """Index of the current 30-minute bucket."""
+    now = now or timezone.now()
+    return int(now.timestamp() // TIME_BUCKET_SECONDS)
+
+
+def _restaurant_version_key(restaurant_id):
+    return f'{KEY_PREFIX}:v:restaurant:{restaurant_id}'
+
+
+def _bump(key):
+    # add() is a no-op when the counter exists; incr() then moves it atomically.
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr(): start over from a fresh counter
+        cache.set(key, 1, timeout=None)
+
+
+def bump_restaurant(restaurant_id):
+    if restaurant_id:
+        _bump(_restaurant_version_key(restaurant_id))
+
+
+def bump_catalog():
+    _bump(CATALOG_VERSION_KEY)
+
+
+def bump_locations():
+    _bump(LOCATIONS_VERSION_KEY)
+
+
+def restaurant_versions(restaurant_ids):
+    """Return {restaurant_id: version} (0 when the counter was never bumped)."""
+    restaurant_ids = list(dict.fromkeys(restaurant_ids))
+    if not restaurant_ids:
+        return {}
+    found = cache.get_many([_restaurant_version_key(rid) for rid in restaurant_ids]) or {}
+    return {rid: found.get(_restaurant_version_key(rid), 0) for rid in restaurant_ids}
+
+
+def catalog_version():
+    return cache.get(CATALOG_VERSION_KEY) or 0
+
+
+def locations_version():
+    return cache.get(LOCATIONS_VERSION_KEY) or 0
+
+
+def make_key(namespace, params, *parts):
+    """Build a cache key from normalized query params and extra key parts."""
+    normalized = sorted(
+        (k, str(v).strip().lower())
+        for k, v in params.items()
+        if v is not None and str(v).strip() != ''
+    )
+    digest = hashlib.sha1(json.dumps(normalized).encode('utf-8')).hexdigest()
+    suffix = ':'.join(str(p) for p in parts)
+    return f'{KEY_PREFIX}:{namespace}:{suffix}:{digest}'
+
+
+def get_cached(key):
+    return cache.get(key)
+
+
+def set_cached(key, value, timeout=TIME_BUCKET_SECONDS):
+    cache.set(key, value, timeout=timeout)
+
+
+def get_cached_list(key):
+    """Return a cached list response if none of its restaurants changed since."""
+    entry = cache.get(key)
+    if not entry:
+        return None
+    deps = entry.get('versions') or {}
+    if deps and restaurant_versions(deps.keys()) != deps:
+        return None
+    return entry.get('data')
+
+
+def set_cached_list(key, data, restaurant_ids):
+    cache.set(key, {'data': data, 'versions': restaurant_versions(restaurant_ids)}, timeout=TIME_BUCKET_SECONDS)
@@ -0,0 +1,127 @@
+"""Drill-down facet counts for the restaurant filters endpoint.
+
+Active restaurants are counted by city, cuisine, price tier and discount
+band in a single grouped query; the band comes from the best discount among
+the restaurant's offers active today, with amounts converted to a percentage
+of the original price (Offer.objects.with_discount_percent, as the map
+clusters do). The grouped rows are
+small (one per distinct combination) and cached for FACETS_TTL seconds under
+the catalog version, so every filter state is answered in memory from them.
+
+Counts are drill-down style: each facet is counted with every other
+selected facet applied but not its own, so the UI can show how many results
+switching to another value of that facet would give.
+"""
+from django.db.models import Case, CharField, Count, DecimalField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from marketplace import cache as response_cache
+from marketplace.models import City, Offer, Restaurant
+
+FACETS_TTL = 60
+FACET_NAMES = ('city', 'cuisine', 'price_tier', 'discount')
+# (lower bound, band key), highest first; restaurants without an offer today are 'none'
+DISCOUNT_BANDS = ((50, '50+'), (30, '30-49'), (20, '20-29'), (10, '10-19'), (1, '1-9'))
+NO_DISCOUNT = 'none'
+BAND_ORDER = [key for _, key in DISCOUNT_BANDS] + [NO_DISCOUNT]
+MAX_BRANDS = 50
+
+
+def load_rows(day):
+    """[(city, cuisine, price_tier, discount_band, count)] for active restaurants, in one query."""
+    best_discount = Subquery(
+        Offer.objects.active_on(day).filter(restaurant=OuterRef('pk')).with_discount_percent()
+        .filter(discount_pct__isnull=False).order_by('-discount_pct').values('discount_pct')[:1]
+    )
+    band = Case(
+        *[When(best_discount__gte=low, then=Value(key)) for low, key in DISCOUNT_BANDS],
+        default=Value(NO_DISCOUNT), output_field=CharField(),
+    )
+    rows = (
+        Restaurant.objects.filter(is_active=True)
+        .annotate(best_discount=Coalesce(best_discount, Value(0), output_field=DecimalField(max_digits=5, decimal_places=2)))
+        .annotate(discount_band=band)
+        .values_list('city__name', 'cuisine_type', 'price_range', 'discount_band')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    return [tuple(row) for row in rows]
+
+
+def load_brands():
+    """Distinct names of active restaurants, alphabetically, at most MAX_BRANDS."""
+    return list(
+        Restaurant.objects.filter(is_active=True).exclude(name='')
+        .order_by('name').values_list('name', flat=True).distinct()[:MAX_BRANDS]
+    )
+
+
+def get_table(day=None):
+    """Cached {'rows': load_rows(), 'brands': load_brands()} for ``day`` (default today)."""
+    day = day or timezone.localdate()
+    key = response_cache.make_key('facets', {}, response_cache.catalog_version(), day.isoformat())
+    table = response_cache.get_cached(key)
+    if table is None:
+        table = {'rows': load_rows(day), 'brands': load_brands()}
+        response_cache.set_cached(key, table, timeout=FACETS_TTL)
+    return table
+
+
+def parse_selection(params):
+    """Selected facet values from query params; unknown or empty values are ignored."""
+    selected = {}
+    city = (params.get('city') or '').strip()
+    if city:
+        city_obj = City.lookup(city)
+        selected['city'] = city_obj.name if city_obj else city
+    cuisine = (params.get('cuisine') or '').strip().lower()
+    if cuisine:
+        selected['cuisine'] = cuisine
+    try:
+        selected['price_tier'] = int(params.get('price_tier'))
+    except (TypeError, ValueError):
+        pass
+    discount = (params.get('discount') or '').strip()
+    if discount in BAND_ORDER:
+        selected['discount'] = discount
+    return selected
+
+
+def _matches(values, selected, skip):
+    for name, value in selected.items():
+        if name == skip:
+            continue
+        actual = values[name]
+        if name in ('city', 'cuisine'):
+            if (actual or '').lower() != value.lower():
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def counts(rows, selected):
+    """Return {'total': n, facet: [{'value', 'count'}, ...]} for the selection.
+
+    Cities, cuisines and price tiers are ordered by count; discount bands
+    keep their natural order. Values with no matches are left out.
+    """
+    tallies = {name: {} for name in FACET_NAMES}
+    total = 0
+    for city, cuisine, price_tier, band, count in rows:
+        values = {'city': city, 'cuisine': cuisine, 'price_tier': price_tier, 'discount': band}
+        if _matches(values, selected, skip=None):
+            total += count
+        for name in FACET_NAMES:
+            if values[name] is not None and _matches(values, selected, skip=name):
+                tally = tallies[name]
+                tally[values[name]] = tally.get(values[name], 0) + count
+    result = {'total': total}
+    for name, tally in tallies.items():
+        if name == 'discount':
+            ordered = [band for band in BAND_ORDER if band in tally]
+        else:
+            ordered = sorted(tally, key=lambda value: (-tally[value], str(value)))
+        result[name] = [{'value': value, 'count': tally[value]} for value in ordered]
+    return result
@@ -0,0 +1,99 @@
+"""Sparse fieldsets (?fields= / ?expand=) for the restaurant and offer endpoints.
+
+``?fields=id,name,rating`` limits each object in a GET response to those
+fields; ``?expand=`` names nested or computed fields to add on top, e.g.
+``?fields=id,name&expand=active_offers``. Without ``?fields`` the full
+representation is served, so existing clients see no change. ``id`` is always
+included and unknown names are ignored.
+
+The selection also plans the query: plan() only selects the columns the
+chosen fields read (``.only()``) and only runs the select_related /
+prefetch loaders of relations that are still serialized, so a smaller payload
+also means fewer queries and less serialization work.
+"""
+
+CONTEXT_KEY = 'sparse_fields'
+
+
+def parse(request):
+    """frozenset of requested field names, or None for the full representation."""
+    if request is None or request.method != 'GET':
+        return None
+    raw = request.query_params.get('fields')
+    if raw is None:
+        return None
+    names = {'id'}
+    for param in ('fields', 'expand'):
+        names.update(n.strip() for n in (request.query_params.get(param) or '').split(',') if n.strip())
+    return frozenset(names)
+
+
+def columns(serializer_class, model, fields):
+    """Concrete model columns read by ``fields`` of ``serializer_class``.
+
+    Declared fields use the first segment of their ``source``; computed
+    fields list their columns in ``Meta.sparse_sources``.
+    """
+    declared = serializer_class._declared_fields
+    sources = getattr(serializer_class.Meta, 'sparse_sources', {})
+    concrete = {f.name for f in model._meta.concrete_fields}
+    needed = {model._meta.pk.name}
+    for name in fields:
+        if name in sources:
+            needed.update(sources[name])
+            continue
+        field = declared.get(name)
+        source = getattr(field, 'source', None) or name
+        if source != '*':
+            needed.add(source.split('.')[0])
+    return sorted(needed & concrete)
+
+
+def plan(qs, serializer_class, fields, loaders):
+    """Apply the relation ``loaders`` needed by ``fields`` and defer unused columns.
+
+    ``loaders`` maps a serializer field name to a callable taking and
+    returning a queryset (select_related / prefetch_related); fields sharing
+    one callable run it once. With ``fields`` None every loader runs.
+    """
+    applied = []
+    for name, loader in loaders.items():
+        if (fields is None or name in fields) and loader not in applied:
+            applied.append(loader)
+            qs = loader(qs)
+    if fields is not None:
+        qs = qs.only(*columns(serializer_class, qs.model, fields))
+    return qs
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin dropping the fields a request did not ask for.
+
+    Only applies to the serializer class the view selected the fields for, so
+    nested serializers of other classes keep their full shape.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.context.get(CONTEXT_KEY)
+        if selection and selection[0] is type(self):
+            for name in list(fields):
+                if name not in selection[1]:
+                    fields.pop(name)
+        return fields
+
+
+class SparseFieldsetViewMixin:
+    """ViewSet mixin exposing the selection as ``sparse_fields`` and passing it to the serializer."""
+
+    @property
+    def sparse_fields(self):
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = parse(getattr(self, 'request', None))
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.sparse_fields is not None:
+            context[CONTEXT_KEY] = (self.get_serializer_class(), self.sparse_fields)
+        return context
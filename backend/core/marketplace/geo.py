@@ -0,0 +1,161 @@
+"""Geohash helpers and ring-expanding nearest-neighbour search.
+
+Restaurant.geohash stores a precision-9 geohash (~5 m cells), kept in sync on
+save. A geohash of precision p is a regular lat/lng grid, so the cells around
+a point can be enumerated ring by ring: ring k is every cell at Chebyshev
+distance k from the point's cell. Each ring is fetched with indexed prefix
+lookups, and the search stops as soon as the rings already scanned provably
+contain the ``limit`` nearest restaurants (or the whole radius).
+"""
+import math
+
+from django.db.models import Q
+
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180.0
+# Rings scanned at most per search; the cell precision is picked to respect it
+MAX_RINGS = 10
+# Largest search radius the API accepts; larger requests are clamped to it
+MAX_RADIUS_KM = 50.0
+# Most grid cells a map viewport is aggregated into (restaurants/clusters)
+MAX_CLUSTER_CELLS = 400
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Standard base32 geohash of a point."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_lo + lng_hi) / 2
+            if longitude >= mid:
+                value = (value << 1) | 1
+                lng_lo = mid
+            else:
+                value <<= 1
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if latitude >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(lat_degrees, lng_degrees) spanned by one cell at ``precision``."""
+    lat_bits = 5 * precision // 2
+    lng_bits = 5 * precision - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _min_cell_km(precision, latitude):
+    dlat, dlng = cell_size(precision)
+    return min(dlat * KM_PER_DEGREE, dlng * KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.0001))
+
+
+def search_precision(radius_km, latitude):
+    """Finest precision whose cells cover ``radius_km`` within MAX_RINGS rings."""
+    for precision in range(7, 1, -1):
+        if radius_km <= MAX_RINGS * _min_cell_km(precision, latitude):
+            return precision
+    return 1
+
+
+def ring_cells(latitude, longitude, precision, k):
+    """Geohash cells at Chebyshev distance ``k`` from the cell containing the point."""
+    dlat, dlng = cell_size(precision)
+    # Centre of the point's cell, so offsets land in the middle of neighbours
+    lat_c = (math.floor((latitude + 90.0) / dlat) + 0.5) * dlat - 90.0
+    lng_c = (math.floor((longitude + 180.0) / dlng) + 0.5) * dlng - 180.0
+    cells = set()
+    for i in range(-k, k + 1):
+        for j in range(-k, k + 1):
+            if max(abs(i), abs(j)) != k:
+                continue
+            lat = lat_c + i * dlat
+            if not -90.0 < lat < 90.0:
+                continue
+            lng = (lng_c + j * dlng + 180.0) % 360.0 - 180.0
+            cells.add(encode(lat, lng, precision))
+    return cells
+
+
+def nearest(queryset, latitude, longitude, radius_km, limit):
+    """Return [(distance_km, obj)] for the ``limit`` nearest rows within ``radius_km``.
+
+    ``queryset`` must expose ``geohash``, ``latitude`` and ``longitude``. Rings
+    are scanned outwards; after ring k every row closer than k cell widths
+    has been seen, which bounds both the work and the answer's correctness.
+    At most MAX_RINGS + 1 rings are scanned; non-finite input raises ValueError.
+    """
+    if not all(math.isfinite(v) for v in (latitude, longitude, radius_km)):
+        raise ValueError('latitude, longitude and radius_km must be finite')
+    if limit <= 0 or radius_km <= 0:
+        return []
+    # Cells narrow towards the poles; size rings by the most poleward latitude reached
+    edge_latitude = min(89.9, abs(latitude) + radius_km / KM_PER_DEGREE)
+    precision = search_precision(radius_km, edge_latitude)
+    step_km = _min_cell_km(precision, edge_latitude)
+    found = []
+    k = 0
+    while True:
+        cells = ring_cells(latitude, longitude, precision, k)
+        if cells:
+            condition = Q()
+            for cell in cells:
+                condition |= Q(geohash__startswith=cell)
+            for obj in queryset.filter(condition):
+                dist = haversine_km(latitude, longitude, float(obj.latitude), float(obj.longitude))
+                if dist <= radius_km:
+                    found.append((dist, obj))
+        covered_km = k * step_km
+        # search_precision() sizes cells so MAX_RINGS rings cover the radius
+        if covered_km >= radius_km or k >= MAX_RINGS:
+            break
+        if sum(1 for d, _ in found if d <= covered_km) >= limit:
+            break
+        k += 1
+    found.sort(key=lambda pair: pair[0])
+    return found[:limit]
+
+
+def cluster_precision(zoom, min_lat, min_lng, max_lat, max_lng):
+    """Geohash precision for clustering a viewport at map ``zoom``.
+
+    Roughly one cell per 64 px tile quarter, coarsened until the viewport
+    spans at most MAX_CLUSTER_CELLS cells.
+    """
+    precision = max(1, min(GEOHASH_PRECISION - 1, (zoom + 1) // 2))
+    lat_span = max(0.0, max_lat - min_lat)
+    lng_span = max_lng - min_lng if min_lng <= max_lng else 360.0 - (min_lng - max_lng)
+    while precision > 1:
+        dlat, dlng = cell_size(precision)
+        if (lat_span / dlat + 1) * (lng_span / dlng + 1) <= MAX_CLUSTER_CELLS:
+            break
+        precision -= 1
+    return precision
@@ -0,0 +1,30 @@
+"""Batch loaders for list endpoints.
+
+Each loader takes the ids of everything a page is about to render and fetches
+the related rows in a fixed number of queries, so per-card work runs purely
+in memory and the query count does not grow with the page size.
+"""
+from marketplace import slot_index
+
+
+def load_feed_page(restaurant_ids, day, offers_qs, offers=None):
+    """Load slot index entries and offers for one feed page.
+
+    ``offers_qs`` is the feed's base queryset of offers active on ``day``; only
+    the rows for ``restaurant_ids`` are fetched. Callers that already hold
+    every active offer of those restaurants pass them as ``offers`` instead
+    and skip that query. Returns a dict with ``entries`` ({restaurant_id:
+    slot index entries}). Booking counts are read from
+    Restaurant.reservations_count and need no query.
+    """
+    restaurant_ids = list(dict.fromkeys(restaurant_ids))
+    offers_by_restaurant: dict[int, list] = {rid: [] for rid in restaurant_ids}
+    if restaurant_ids:
+        if offers is None:
+            offers = offers_qs.filter(restaurant_id__in=restaurant_ids)
+        for off in offers:
+            if off.restaurant_id in offers_by_restaurant:
+                offers_by_restaurant[off.restaurant_id].append(off)
+    return {
+        'entries': slot_index.get_entries(restaurant_ids, day, offers_by_restaurant=offers_by_restaurant),
+    }
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from marketplace.models import City, Restaurant
+
+
+class Command(BaseCommand):
+    help = "Resolve Restaurant.city from coordinates/address. Run after adding or editing cities."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only print what would change without modifying the database.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        dry_run = options.get("dry_run", False)
+        batch_size = options.get("batch_size") or 500
+        cities = list(City.objects.all())
+        changed = []
+        updated = 0
+
+        qs = Restaurant.objects.only("id", "name", "latitude", "longitude", "address", "city").order_by("id")
+        for restaurant in qs.iterator(chunk_size=batch_size):
+            city = City.resolve(restaurant.latitude, restaurant.longitude, restaurant.address, cities=cities)
+            if restaurant.city_id == (city.id if city else None):
+                continue
+            if dry_run:
+                self.stdout.write(f"Would set city of restaurant {restaurant.id} - {restaurant.name} to {city or '-'}")
+                updated += 1
+                continue
+            restaurant.city = city
+            changed.append(restaurant)
+            if len(changed) >= batch_size:
+                updated += Restaurant.objects.bulk_update(changed, ["city"])
+                changed = []
+        if changed:
+            updated += Restaurant.objects.bulk_update(changed, ["city"])
+
+        if not dry_run and updated:
+            # bulk_update skips signals; drop cached feed pages by hand
+            from marketplace import cache as response_cache
+            response_cache.bump_catalog()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would update' if dry_run else 'Updated'} {updated} restaurant(s)."
+        ))
@@ -0,0 +1,49 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from marketplace import slot_materializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Expand active offers over the next N days into BookingSlots. "
+        "Safe to run concurrently; use --shard/--shards to split the work across processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=slot_materializer.DEFAULT_DAYS, help="Days ahead to cover, today included.")
+        parser.add_argument("--start", help="First date (YYYY-MM-DD); defaults to today.")
+        parser.add_argument("--restaurant", type=int, action="append", dest="restaurants", help="Only this restaurant id (repeatable).")
+        parser.add_argument("--chunk-size", type=int, default=slot_materializer.DEFAULT_CHUNK_SIZE, help="Restaurants per batch.")
+        parser.add_argument("--shard", type=int, default=0, help="Index of this process's shard.")
+        parser.add_argument("--shards", type=int, default=1, help="Total number of shards (restaurant id modulo).")
+        parser.add_argument("--capacity", type=int, default=0, help="Capacity of created slots (0 = unlimited).")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many slots would be created.",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--days and --chunk-size must be positive.")
+        if not 0 <= options["shard"] < options["shards"]:
+            raise CommandError("--shard must be between 0 and --shards - 1.")
+        try:
+            start = dt.date.fromisoformat(options["start"]) if options["start"] else timezone.localdate()
+        except ValueError:
+            raise CommandError("--start must be YYYY-MM-DD.")
+        end = start + dt.timedelta(days=options["days"] - 1)
+
+        restaurant_ids = slot_materializer.candidate_restaurant_ids(
+            options["restaurants"], start, end, shard=options["shard"], shards=options["shards"],
+        )
+        created = slot_materializer.materialize(
+            restaurant_ids, start, end,
+            chunk_size=options["chunk_size"], dry_run=options["dry_run"], capacity=options["capacity"],
+        )
+        verb = "Would create" if options["dry_run"] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {created} slot(s) for {len(restaurant_ids)} restaurant(s) from {start} to {end}."
+        ))
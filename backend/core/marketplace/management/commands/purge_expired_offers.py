@@ -1,10 +1,14 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from marketplace.models import Offer
+from marketplace import slot_index
+from marketplace.models import Offer, RestaurantDaySlotIndex
 
 
 class Command(BaseCommand):
-    help = "Delete or deactivate offers past their end_date. If bookings exist, deactivate instead of delete."
+    help = (
+        "Delete or deactivate offers past their end_date. If bookings exist, deactivate instead of delete. "
+        "Also drops slot index rows for past dates; run daily."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -38,5 +42,12 @@ class Command(BaseCommand):
                     offer.delete()
                     deleted += 1
 
-        summary = f"Expired offers processed. Deleted: {deleted}, Deactivated: {deactivated}."
+        # Slot index rows for past dates are never read again
+        index_rows = 0
+        if dry_run:
+            self.stdout.write(f"Would delete {RestaurantDaySlotIndex.objects.filter(date__lt=today).count()} past slot index rows")
+        else:
+            index_rows = slot_index.purge_past(today)
+
+        summary = f"Expired offers processed. Deleted: {deleted}, Deactivated: {deactivated}, Slot index rows: {index_rows}."
         self.stdout.write(self.style.SUCCESS(summary))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from marketplace import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents for all offers and restaurants."
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
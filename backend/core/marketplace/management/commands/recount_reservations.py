@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Func, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from marketplace.models import Booking, Offer, Restaurant
+
+
+def _count(bookings):
+    """Scalar COUNT subquery over ``bookings`` (no GROUP BY), 0 when empty."""
+    total = bookings.order_by().annotate(total=Func(F('pk'), function='COUNT')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def restaurant_count():
+    live = Booking.objects.exclude(status='cancelled')
+    # Same attribution as Booking.counted_restaurant_id
+    return _count(live.filter(Q(restaurant=OuterRef('pk')) | Q(restaurant__isnull=True, offer__restaurant=OuterRef('pk'))))
+
+
+def offer_count():
+    return _count(Booking.objects.exclude(status='cancelled').filter(offer=OuterRef('pk')))
+
+
+class Command(BaseCommand):
+    help = "Recompute Restaurant.reservations_count and Offer.reservations_count from bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report drifted rows without modifying the database.",
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get("dry_run", False)
+        for label, model, expr in (("restaurant", Restaurant, restaurant_count), ("offer", Offer, offer_count)):
+            drifted = model.objects.annotate(actual=expr()).exclude(reservations_count=F('actual'))
+            if dry_run:
+                for row in drifted.values('id', 'reservations_count', 'actual'):
+                    self.stdout.write(f"Would fix {label} {row['id']}: {row['reservations_count']} -> {row['actual']}")
+                continue
+            # One UPDATE per table, touching only drifted rows
+            fixed = model.objects.filter(pk__in=drifted.values('pk')).update(reservations_count=expr())
+            self.stdout.write(self.style.SUCCESS(f"Fixed {fixed} {label}(s)."))
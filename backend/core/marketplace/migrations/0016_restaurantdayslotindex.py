@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0015_restaurant_image_file'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantDaySlotIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('slots', models.JSONField(blank=True, default=list)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_indexes', to='marketplace.restaurant')),
+            ],
+            options={
+                'verbose_name': 'Restaurant Day Slot Index',
+                'verbose_name_plural': 'Restaurant Day Slot Indexes',
+                'unique_together': {('restaurant', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:33
+
+from django.db import migrations, models
+
+
+def backfill_days_mask(apps, schema_editor):
+    from marketplace.models import days_mask_from_string
+    Offer = apps.get_model('marketplace', 'Offer')
+    # Only offers with a weekday restriction differ from the default (every day)
+    by_mask = {}
+    for pk, days in Offer.objects.exclude(days_of_week__isnull=True).exclude(days_of_week='').values_list('pk', 'days_of_week').iterator():
+        by_mask.setdefault(days_mask_from_string(days), []).append(pk)
+    for mask, pks in by_mask.items():
+        for i in range(0, len(pks), 500):
+            Offer.objects.filter(pk__in=pks[i:i + 500]).update(days_mask=mask)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0016_restaurantdayslotindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='days_mask',
+            field=models.PositiveSmallIntegerField(db_index=True, default=127, editable=False),
+        ),
+        migrations.RunPython(backfill_days_mask, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='offer',
+            index=models.Index(fields=['is_active', 'start_date', 'end_date'], name='offer_active_range_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0017_offer_days_mask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='City',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('aliases', models.JSONField(blank=True, default=list, help_text="Alternative spellings, e.g. ['siem riep']")),
+                ('min_latitude', models.FloatField(blank=True, null=True)),
+                ('max_latitude', models.FloatField(blank=True, null=True)),
+                ('min_longitude', models.FloatField(blank=True, null=True)),
+                ('max_longitude', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'City',
+                'verbose_name_plural': 'Cities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='city',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='restaurants', to='marketplace.city'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+# Bounding boxes previously hard-coded in the offers feed
+CITIES = [
+    ('Phnom Penh', ['phnompenh'], (11.35, 11.80, 104.75, 105.15)),
+    ('Siem Reap', ['siem riep'], (13.25, 13.52, 103.70, 103.97)),
+    ('Sihanoukville', [], (10.50, 10.78, 103.40, 103.68)),
+    ('Battambang', [], (12.95, 13.18, 103.08, 103.32)),
+    ('Kampot', [], (10.50, 10.78, 104.10, 104.33)),
+    ('Kep', [], (10.38, 10.56, 104.22, 104.38)),
+    ('Kampong Cham', [], (11.90, 12.10, 105.38, 105.54)),
+    ('Kampong Thom', [], (12.62, 12.78, 104.82, 104.98)),
+    ('Poipet', [], (13.60, 13.72, 102.50, 102.64)),
+]
+
+
+def _resolve(cities, latitude, longitude, address):
+    # Same order as City.resolve: bounding box, then name/alias in the address
+    if latitude is not None and longitude is not None:
+        lat, lng = float(latitude), float(longitude)
+        for city in cities:
+            box = (city.min_latitude, city.max_latitude, city.min_longitude, city.max_longitude)
+            if None not in box and city.min_latitude <= lat <= city.max_latitude and city.min_longitude <= lng <= city.max_longitude:
+                return city
+    text = (address or '').lower()
+    if text:
+        for city in cities:
+            names = [city.name.lower()] + [a.strip().lower() for a in (city.aliases or []) if a and a.strip()]
+            if any(n in text for n in names):
+                return city
+    return None
+
+
+def seed_cities(apps, schema_editor):
+    City = apps.get_model('marketplace', 'City')
+    Restaurant = apps.get_model('marketplace', 'Restaurant')
+    for name, aliases, (lat_min, lat_max, lng_min, lng_max) in CITIES:
+        City.objects.get_or_create(name=name, defaults={
+            'aliases': aliases,
+            'min_latitude': lat_min,
+            'max_latitude': lat_max,
+            'min_longitude': lng_min,
+            'max_longitude': lng_max,
+        })
+
+    # Backfill Restaurant.city for existing rows; new saves resolve it themselves
+    cities = list(City.objects.all())
+    batch = []
+    qs = Restaurant.objects.filter(city__isnull=True).only('id', 'latitude', 'longitude', 'address')
+    for restaurant in qs.iterator(chunk_size=500):
+        city = _resolve(cities, restaurant.latitude, restaurant.longitude, restaurant.address)
+        if city is None:
+            continue
+        restaurant.city = city
+        batch.append(restaurant)
+        if len(batch) >= 500:
+            Restaurant.objects.bulk_update(batch, ['city'])
+            batch = []
+    if batch:
+        Restaurant.objects.bulk_update(batch, ['city'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0018_city'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_cities, migrations.RunPython.noop),
+    ]
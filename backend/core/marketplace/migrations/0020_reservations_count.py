@@ -0,0 +1,42 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:36
+
+from django.db import migrations, models
+from django.db.models import F, Func, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count(bookings):
+    total = bookings.order_by().annotate(total=Func(F('pk'), function='COUNT')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), 0)
+
+
+def backfill_counts(apps, schema_editor):
+    Booking = apps.get_model('marketplace', 'Booking')
+    Restaurant = apps.get_model('marketplace', 'Restaurant')
+    Offer = apps.get_model('marketplace', 'Offer')
+    live = Booking.objects.exclude(status='cancelled')
+    Restaurant.objects.update(reservations_count=_count(live.filter(
+        Q(restaurant=OuterRef('pk')) | Q(restaurant__isnull=True, offer__restaurant=OuterRef('pk'))
+    )))
+    Offer.objects.update(reservations_count=_count(live.filter(offer=OuterRef('pk'))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0019_seed_cities'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='offer',
+            name='reservations_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='reservations_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
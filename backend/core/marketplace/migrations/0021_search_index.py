@@ -0,0 +1,61 @@
+from django.db import migrations
+
+# Search documents are maintained outside the ORM (see marketplace.search):
+# tsvector columns + GIN indexes on PostgreSQL, FTS5 tables on SQLite.
+POSTGRES_FORWARD = [
+    "ALTER TABLE marketplace_offer ADD COLUMN search_vector tsvector",
+    "ALTER TABLE marketplace_restaurant ADD COLUMN search_vector tsvector",
+    "CREATE INDEX offer_search_vector_gin ON marketplace_offer USING GIN (search_vector)",
+    "CREATE INDEX restaurant_search_vector_gin ON marketplace_restaurant USING GIN (search_vector)",
+    "UPDATE marketplace_restaurant SET search_vector = "
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(cuisine_type, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(address, '')), 'C')",
+    "UPDATE marketplace_offer o SET search_vector = "
+    "setweight(to_tsvector('simple', coalesce(o.title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(r.name, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(o.description, '')), 'C') "
+    "FROM marketplace_restaurant r WHERE r.id = o.restaurant_id",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS offer_search_vector_gin",
+    "DROP INDEX IF EXISTS restaurant_search_vector_gin",
+    "ALTER TABLE marketplace_offer DROP COLUMN IF EXISTS search_vector",
+    "ALTER TABLE marketplace_restaurant DROP COLUMN IF EXISTS search_vector",
+]
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE marketplace_offer_fts USING fts5("
+    "title, restaurant_name, description, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "CREATE VIRTUAL TABLE marketplace_restaurant_fts USING fts5("
+    "name, cuisine_type, address, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "INSERT INTO marketplace_restaurant_fts(rowid, name, cuisine_type, address) "
+    "SELECT id, name, cuisine_type, address FROM marketplace_restaurant",
+    "INSERT INTO marketplace_offer_fts(rowid, title, restaurant_name, description) "
+    "SELECT o.id, o.title, r.name, coalesce(o.description, '') FROM marketplace_offer o "
+    "JOIN marketplace_restaurant r ON r.id = o.restaurant_id",
+]
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS marketplace_offer_fts",
+    "DROP TABLE IF EXISTS marketplace_restaurant_fts",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0020_reservations_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
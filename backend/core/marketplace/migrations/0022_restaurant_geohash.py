@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:43
+
+from django.db import migrations, models
+
+from marketplace import geo
+
+
+def backfill_geohash(apps, schema_editor):
+    Restaurant = apps.get_model('marketplace', 'Restaurant')
+    batch = []
+    qs = Restaurant.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    for restaurant in qs.iterator(chunk_size=500):
+        restaurant.geohash = geo.encode(float(restaurant.latitude), float(restaurant.longitude))
+        batch.append(restaurant)
+        if len(batch) >= 500:
+            Restaurant.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        Restaurant.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0021_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-17 00:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0022_restaurant_geohash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bookingslot',
+            index=models.Index(fields=['date', 'start_time'], name='bookingslot_date_time_idx'),
+        ),
+    ]
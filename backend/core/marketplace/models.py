@@ -5,6 +5,81 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 
 
+class City(models.Model):
+    """A city restaurants are grouped by for feed filtering and card labels.
+
+    Membership is decided by the bounding box when a restaurant has
+    coordinates inside one, otherwise by the name or one of the aliases
+    appearing in its address. Restaurant.city is derived from this on save; run the
+    assign_restaurant_cities command after editing cities.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    aliases = models.JSONField(default=list, blank=True, help_text="Alternative spellings, e.g. ['siem riep']")
+    min_latitude = models.FloatField(blank=True, null=True)
+    max_latitude = models.FloatField(blank=True, null=True)
+    min_longitude = models.FloatField(blank=True, null=True)
+    max_longitude = models.FloatField(blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'City'
+        verbose_name_plural = 'Cities'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def names(self):
+        """Lower-cased name plus aliases, used for lookups and address matching."""
+        return [self.name.lower()] + [a.strip().lower() for a in (self.aliases or []) if a and a.strip()]
+
+    def contains(self, latitude, longitude):
+        if None in (self.min_latitude, self.max_latitude, self.min_longitude, self.max_longitude):
+            return False
+        return self.min_latitude <= latitude <= self.max_latitude and self.min_longitude <= longitude <= self.max_longitude
+
+    @classmethod
+    def lookup(cls, value):
+        """Find a city by name or alias (case-insensitive); None if unknown."""
+        if not value:
+            return None
+        needle = value.strip().lower()
+        for city in cls.objects.all():
+            if needle in city.names:
+                return city
+        return None
+
+    @classmethod
+    def resolve(cls, latitude, longitude, address, cities=None):
+        """Pick the city for a location: bounding box first, then address text.
+
+        Coordinates outside every box still fall back to the address, so a
+        slightly-off pin with "..., Phnom Penh" in its address keeps its city.
+        """
+        cities = list(cls.objects.all()) if cities is None else cities
+        if latitude is not None and longitude is not None:
+            lat, lng = float(latitude), float(longitude)
+            for city in cities:
+                if city.contains(lat, lng):
+                    return city
+        text = (address or '').lower()
+        if text:
+            for city in cities:
+                if any(n in text for n in city.names):
+                    return city
+        return None
+
+
+class RestaurantQuerySet(models.QuerySet):
+    def with_todays_offers(self, day):
+        """Prefetch the offers active on ``day`` (with their active timeslots) into ``todays_offers``.
+
+        RestaurantSerializer reads active_offers and featured_offer from it.
+        """
+        todays_offers = Offer.objects.active_on(day).with_active_time_slots()
+        return self.prefetch_related(models.Prefetch('offers', queryset=todays_offers, to_attr='todays_offers'))
+
+
 class Restaurant(models.Model):
     CUISINE_CHOICES = (
         ('italian', 'Italian'),
@@ -49,18 +124,103 @@ class Restaurant(models.Model):
     # Geolocation (optional). Increase precision to allow more decimals
     latitude = models.DecimalField(max_digits=18, decimal_places=12, blank=True, null=True)
     longitude = models.DecimalField(max_digits=18, decimal_places=12, blank=True, null=True)
+    # Precision-9 geohash of (latitude, longitude), set on save (see marketplace.geo)
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
+    # Derived from coordinates/address on save (see City.resolve)
+    city = models.ForeignKey(City, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='restaurants')
+    # Non-cancelled bookings, kept in sync by Booking signals (repair with recount_reservations)
+    reservations_count = models.PositiveIntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False, help_text="Featured restaurants appear on homepage")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RestaurantQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
+    LOCATION_FIELDS = {'latitude', 'longitude', 'address'}
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.LOCATION_FIELDS & set(update_fields):
+            from marketplace import geo
+            self.city = City.resolve(self.latitude, self.longitude, self.address)
+            has_point = self.latitude is not None and self.longitude is not None
+            self.geohash = geo.encode(float(self.latitude), float(self.longitude)) if has_point else ''
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'city', 'geohash'}
+        super().save(*args, **kwargs)
+
+    @property
+    def city_label(self):
+        """City shown on cards: the resolved City, else the last address segment."""
+        if self.city_id:
+            return self.city.name
+        if self.address:
+            return self.address.split(',')[-1].strip().title()
+        return ''
+
     class Meta:
         verbose_name = 'Restaurant'
         verbose_name_plural = 'Restaurants'
 
+ALL_DAYS_MASK = 0b1111111
+
+
+def days_mask_from_string(days_of_week):
+    """Convert a CSV weekday list ('0,1,2' with 0=Monday) to a bitmask (bit n = weekday n).
+
+    Empty/None means every day. Non-numeric or out-of-range entries are ignored,
+    matching how the CSV has always been parsed.
+    """
+    if not days_of_week:
+        return ALL_DAYS_MASK
+    mask = 0
+    for d in days_of_week.split(','):
+        d = d.strip()
+        if d.isdigit() and int(d) <= 6:
+            mask |= 1 << int(d)
+    return mask
+
+
+class OfferQuerySet(models.QuerySet):
+    def active_on(self, date):
+        """Offers that are active and apply on ``date`` (date range and weekday), filtered in SQL."""
+        from django.db.models import F
+        return self.alias(
+            weekday_bit=F('days_mask').bitand(1 << date.weekday()),
+        ).filter(
+            is_active=True,
+            start_date__lte=date,
+            end_date__gte=date,
+            weekday_bit__gt=0,
+        )
+
+    def with_discount_percent(self):
+        """Annotate ``discount_pct``: discount_percentage, else discount_amount as a percentage of original_price.
+
+        Same percent-over-amount rule as slot_engine.discount_percent, in SQL;
+        NULL when neither gives a value.
+        """
+        from decimal import Decimal
+        from django.db.models import DecimalField, F, Value
+        from django.db.models.functions import Coalesce, NullIf
+        return self.annotate(
+            discount_pct=Coalesce(
+                'discount_percentage',
+                F('discount_amount') * Value(Decimal('100')) / NullIf('original_price', Value(Decimal('0'))),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+        )
+
+    def with_active_time_slots(self):
+        return self.prefetch_related(
+            models.Prefetch('time_slots', queryset=OfferTimeSlot.objects.filter(is_active=True).order_by('start_time')),
+        )
+
+
 class Offer(models.Model):
     OFFER_TYPE_CHOICES = (
         ('percentage', 'Percentage Discount'),
@@ -97,6 +257,8 @@ class Offer(models.Model):
         null=True,
         help_text="Days of week (0=Monday, 6=Sunday). E.g., '0,1,2,3,4' for weekdays"
     )
+    # Bitmask mirror of days_of_week (bit n = weekday n, 127 = every day), kept in sync by save()
+    days_mask = models.PositiveSmallIntegerField(default=ALL_DAYS_MASK, db_index=True, editable=False)
     
     # Availability settings
     available_quantity = models.IntegerField(help_text="Number of bookings available for this offer per day")
@@ -106,12 +268,26 @@ class Offer(models.Model):
     # Status and metadata
     is_active = models.BooleanField(default=True)
     is_featured = models.BooleanField(default=False, help_text="Show on featured offers")
+    # Non-cancelled bookings, kept in sync by Booking signals (repair with recount_reservations)
+    reservations_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OfferQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.title} - {self.restaurant.name}"
 
+    def save(self, *args, **kwargs):
+        self.days_mask = days_mask_from_string(self.days_of_week)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'days_of_week' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'days_mask'}
+        super().save(*args, **kwargs)
+
+    def applies_on_weekday(self, weekday):
+        return bool(self.days_mask & (1 << weekday))
+
     @property
     def discounted_price(self):
         """Calculate the final price after discount"""
@@ -146,11 +322,8 @@ class Offer(models.Model):
         if not (self.start_date <= today <= self.end_date):
             return False
         
-        if self.days_of_week:
-            weekday = today.weekday()  # 0=Monday, 6=Sunday
-            allowed_days = [int(d.strip()) for d in self.days_of_week.split(',') if d.strip().isdigit()]
-            if weekday not in allowed_days:
-                return False
+        if not self.applies_on_weekday(today.weekday()):  # 0=Monday, 6=Sunday
+            return False
         
         return self.is_active
 
@@ -158,6 +331,9 @@ class Offer(models.Model):
         verbose_name = 'Offer'
         verbose_name_plural = 'Offers'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'start_date', 'end_date'], name='offer_active_range_idx'),
+        ]
 
 class OfferTimeSlot(models.Model):
     """A 30-minute timeslot discount attached to an Offer.
@@ -224,12 +400,62 @@ class Booking(models.Model):
         else:
             return f"Booking for {self.diner.username} (No restaurant specified)"
 
+    @property
+    def counted_restaurant_id(self):
+        """Restaurant whose reservations_count includes this booking."""
+        if self.restaurant_id:
+            return self.restaurant_id
+        return self.offer.restaurant_id if self.offer_id else None
+
+    @property
+    def reservation_key(self):
+        """(restaurant_id, offer_id) this booking is counted under, or None if cancelled."""
+        if self.status == 'cancelled':
+            return None
+        return (self.counted_restaurant_id, self.offer_id)
+
     class Meta:
         verbose_name = 'Booking'
         verbose_name_plural = 'Bookings'
         unique_together = ('diner', 'offer', 'booking_time') # Prevent duplicate bookings for the same offer at the same time by the same diner
         ordering = ['booking_time']
 
+class BookingSlotQuerySet(models.QuerySet):
+    def with_capacity(self):
+        """Annotate booked_total and held_total so capacity checks need no extra queries.
+
+        booked_total sums party sizes over all bookings of the slot; held_total sums
+        active, unexpired holds. BookingSlot.remaining_capacity uses these when present.
+        """
+        from django.db.models import OuterRef, Subquery, Sum, Value
+        from django.db.models.functions import Coalesce, Now
+        booked = (
+            Booking.objects.filter(slot=OuterRef('pk'))
+            .order_by().values('slot').annotate(total=Sum('number_of_people')).values('total')
+        )
+        held = (
+            BookingHold.objects.filter(slot=OuterRef('pk'), status='active', expires_at__gt=Now())
+            .order_by().values('slot').annotate(total=Sum('party_size')).values('total')
+        )
+        return self.annotate(
+            booked_total=Coalesce(Subquery(booked), Value(0)),
+            held_total=Coalesce(Subquery(held), Value(0)),
+        )
+
+    def bookable_for(self, party_size):
+        """Active, not closed slots accepting ``party_size`` with room for it.
+
+        Party-size bounds and remaining capacity are checked in SQL (capacity 0
+        means unlimited); past/lead-time rules still need effective_status().
+        """
+        from django.db.models import F, Q
+        return self.with_capacity().filter(
+            is_active=True, min_party_size__lte=party_size, max_party_size__gte=party_size,
+        ).exclude(status='closed').alias(
+            free=F('capacity') - F('booked_total') - F('held_total'),
+        ).filter(Q(capacity=0) | Q(free__gte=party_size))
+
+
 class BookingSlot(models.Model):
     """Discrete time slot for restaurant discounting and capacity management.
 
@@ -256,11 +482,17 @@ class BookingSlot(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookingSlotQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Booking Slot'
         verbose_name_plural = 'Booking Slots'
         unique_together = ('restaurant', 'date', 'start_time')
         ordering = ['date', 'start_time']
+        indexes = [
+            # Cross-restaurant availability search (who has a table at D, T?)
+            models.Index(fields=['date', 'start_time'], name='bookingslot_date_time_idx'),
+        ]
 
     def __str__(self):
         return f"{self.restaurant.name} {self.date} {self.start_time}-{self.end_time}"
@@ -269,10 +501,13 @@ class BookingSlot(models.Model):
     def remaining_capacity(self):
         """Remaining capacity considering confirmed bookings and active holds.
 
-        Holds are counted if status='active' and not expired.
+        Holds are counted if status='active' and not expired. Uses the
+        booked_total/held_total annotations from with_capacity() when present.
         """
         if self.capacity == 0:
             return None  # Unlimited
+        if hasattr(self, 'booked_total') and hasattr(self, 'held_total'):
+            return max(0, self.capacity - (self.booked_total or 0) - (self.held_total or 0))
         from django.db.models import Sum
         from django.utils import timezone
         booked = self.slot_bookings.aggregate(total=Sum('number_of_people'))['total'] or 0
@@ -345,4 +580,28 @@ class BookingHold(models.Model):
         if self.status == 'active' and self.expires_at <= timezone.now():
             self.status = 'expired'
             self.save(update_fields=['status'])
-        return self.status
\ No newline at end of file
+        return self.status
+
+class RestaurantDaySlotIndex(models.Model):
+    """Materialized, merged timeslot list for one restaurant on one date.
+
+    Each entry in ``slots`` holds the time (HH:MM), the best offer discount at
+    that time and, when a concrete BookingSlot exists, its id plus the raw
+    inputs needed to derive remaining capacity (capacity, booked guests and
+    active holds with their expiry). Time-dependent checks (past, lead time,
+    hold expiry) are applied when the row is read, so a row only goes stale
+    when one of its source rows changes. Signals delete stale rows and readers
+    rebuild them on demand (see marketplace.slot_index).
+    """
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='slot_indexes')
+    date = models.DateField()
+    slots = models.JSONField(default=list, blank=True)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Restaurant Day Slot Index'
+        verbose_name_plural = 'Restaurant Day Slot Indexes'
+        unique_together = ('restaurant', 'date')
+
+    def __str__(self):
+        return f"Slot index {self.restaurant_id} {self.date} ({len(self.slots or [])} slots)"
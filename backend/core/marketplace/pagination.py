@@ -0,0 +1,170 @@
+"""Keyset (seek) cursor helpers for the offers feed.
+
+Offset cursors make deep pages slower and shift cards whenever offers are
+inserted. Instead the cursor carries the sort key tuple of the last card on
+the page and the next page seeks past it, so every page costs the same as
+the first one.
+"""
+import base64
+import datetime
+import json
+from decimal import Decimal
+
+from django.db.models import DecimalField, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+# Sort mode -> ordered (lookup, descending) pairs. The trailing id keeps the
+# ordering total so equal keys never straddle a page boundary.
+FEED_SORT_KEYS = {
+    'recommended': [('is_featured', True), ('restaurant__rating', True), ('created_at', True), ('id', True)],
+    'highest_discount': [('sort_discount_percentage', True), ('sort_discount_amount', True), ('id', True)],
+    'most_popular': [('restaurant__rating', True), ('restaurant__created_at', True), ('id', True)],
+    'nearest_time': [('start_time', False), ('id', False)],
+}
+
+
+def order_feed(qs, sort):
+    """Apply the keyset ordering for ``sort`` (unknown modes fall back to recommended)."""
+    if sort not in FEED_SORT_KEYS:
+        sort = 'recommended'
+    if sort == 'highest_discount':
+        # Nullable discounts would break tuple comparison; treat missing as zero
+        qs = qs.annotate(
+            sort_discount_percentage=Coalesce('discount_percentage', Value(Decimal('0')), output_field=DecimalField(max_digits=5, decimal_places=2)),
+            sort_discount_amount=Coalesce('discount_amount', Value(Decimal('0')), output_field=DecimalField(max_digits=10, decimal_places=2)),
+        )
+    keys = FEED_SORT_KEYS[sort]
+    return qs.order_by(*[f'-{k}' if desc else k for k, desc in keys]), sort
+
+
+def order_loaded(objs, sort):
+    """Sort already loaded offers like order_feed() would; returns (list, sort)."""
+    if sort not in FEED_SORT_KEYS:
+        sort = 'recommended'
+    ordered = list(objs)
+    # Stable sorts from the least to the most significant key
+    for lookup, desc in reversed(FEED_SORT_KEYS[sort]):
+        ordered.sort(key=lambda obj: _loaded_value(obj, lookup), reverse=desc)
+    return ordered, sort
+
+
+def _loaded_value(obj, lookup):
+    if lookup.startswith('sort_'):
+        value = getattr(obj, lookup, None)
+        if value is None:
+            value = getattr(obj, lookup[len('sort_'):])
+        return value if value is not None else Decimal('0')
+    return _sort_value(obj, lookup)
+
+
+def _parse_bool(value):
+    if not isinstance(value, bool):
+        raise ValueError(value)
+    return value
+
+
+def _parse_int(value):
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(value)
+    return value
+
+
+def _parse_decimal(value):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(value)
+    parsed = Decimal(str(value))
+    if not parsed.is_finite():
+        raise ValueError(value)
+    return parsed
+
+
+def _parse_datetime(value):
+    parsed = datetime.datetime.fromisoformat(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
+
+
+def _parse_time(value):
+    return datetime.time.fromisoformat(value)
+
+
+# Sort key lookup -> parser turning its cursor value back into a field value
+KEY_PARSERS = {
+    'is_featured': _parse_bool,
+    'restaurant__rating': _parse_decimal,
+    'sort_discount_percentage': _parse_decimal,
+    'sort_discount_amount': _parse_decimal,
+    'created_at': _parse_datetime,
+    'restaurant__created_at': _parse_datetime,
+    'start_time': _parse_time,
+    'id': _parse_int,
+}
+
+
+def _sort_value(obj, lookup):
+    value = obj
+    for part in lookup.split('__'):
+        value = getattr(value, part)
+    return value
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def seek(qs, sort, after):
+    """Filter ``qs`` to rows strictly after the ``after`` key tuple."""
+    keys = FEED_SORT_KEYS[sort]
+    if not after or len(after) != len(keys):
+        return qs
+    condition = Q()
+    prefix = {}
+    for (lookup, desc), value in zip(keys, after):
+        op = 'lt' if desc else 'gt'
+        condition |= Q(**prefix, **{f'{lookup}__{op}': value})
+        prefix[lookup] = value
+    return qs.filter(condition)
+
+
+def cursor_after(obj, sort):
+    """Key tuple for ``obj`` under ``sort``, ready to be embedded in a cursor."""
+    return [_to_json(_sort_value(obj, lookup)) for lookup, _ in FEED_SORT_KEYS[sort]]
+
+
+def encode_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor; malformed cursors restart from the first page.
+
+    ``after`` is checked against the cursor's phase: a restaurant id in the
+    'empty' phase, otherwise one value per sort key of ``sort``, parsed back
+    into the field's type (bool, Decimal, datetime, time or int).
+    """
+    if not cursor:
+        return {}
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8'))
+    except Exception:
+        return {}
+    if not isinstance(payload, dict) or 'after' not in payload:
+        return payload if isinstance(payload, dict) else {}
+    after = payload['after']
+    try:
+        if payload.get('phase') == 'empty':
+            _parse_int(after)
+            return payload
+        keys = FEED_SORT_KEYS[payload.get('sort')]
+        if not isinstance(after, list) or len(after) != len(keys):
+            return {}
+        payload['after'] = [KEY_PARSERS[lookup](value) for (lookup, _), value in zip(keys, after)]
+    except (KeyError, TypeError, ValueError, ArithmeticError):
+        return {}
+    return payload
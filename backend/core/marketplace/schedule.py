@@ -0,0 +1,168 @@
+"""Planner and bulk executor behind OfferViewSet.generate_schedule.
+
+A schedule spec (hours, date range, slot patterns ...) is expanded for one
+or many restaurants in two steps:
+
+- plan() decides, per restaurant and hour, whether a one-hour offer is
+  created, replaces existing ones (``replace``) or is skipped because one
+  already exists. It reads the existing offers of every restaurant in one
+  query and returns plain dicts, so ``dry_run`` can hand the diff back as is;
+- execute() applies a plan inside one transaction: one bulk delete of the
+  replaced offers, one bulk_create of offers and one of their timeslots.
+
+bulk_create skips save() and signals, so execute() sets days_mask itself and
+refreshes the search index, slot index and response cache of the touched
+restaurants in bulk afterwards.
+"""
+import datetime as dt
+
+from django.db import transaction
+
+from marketplace import cache as response_cache
+from marketplace import search, slot_index
+from marketplace.models import Offer, OfferTimeSlot, days_mask_from_string
+
+BULK_BATCH_SIZE = 500
+
+
+def normalize_pattern(entries, offer_type):
+    """Validate slot pattern entries; raises ValueError with a client-facing message."""
+    out = []
+    for entry in entries:
+        minute = entry.get('minute')
+        if minute not in (0, 30):
+            raise ValueError(f'invalid minute {minute}, must be 0 or 30')
+        # Support either percentage or amount
+        disc_pct = entry.get('discount_percentage')
+        disc_amt = entry.get('discount_amount')
+        if offer_type == 'percentage' and disc_pct is None:
+            raise ValueError('discount_percentage required for percentage offer')
+        if offer_type == 'amount' and disc_amt is None:
+            raise ValueError('discount_amount required for amount offer')
+        out.append({'minute': minute, 'discount_percentage': disc_pct, 'discount_amount': disc_amt})
+    return out
+
+
+def _slot_times(hour, minute):
+    """(start, end) of the 30-minute sub-slot starting at hour:minute."""
+    end = (dt.datetime.combine(dt.date.min, dt.time(hour, minute)) + dt.timedelta(minutes=30)).time()
+    return dt.time(hour, minute), end
+
+
+def _headline(pattern, key):
+    values = [p[key] for p in pattern or [] if p[key] is not None]
+    return max(values) if values else None
+
+
+def plan(restaurant_ids, spec):
+    """Return one item per (restaurant, hour) describing what execute() would do.
+
+    Items hold restaurant_id, hour, action ('create', 'replace' or 'skip'),
+    replaces (ids of existing one-hour offers in the same date range), title
+    and slots ([{start_time, end_time, discount_percentage, discount_amount}]).
+    """
+    hours = spec['hours']
+    existing = {}
+    rows = Offer.objects.filter(
+        restaurant_id__in=restaurant_ids, start_date=spec['start_date'], end_date=spec['end_date'],
+        start_time__hour__in=hours,
+    ).values_list('id', 'restaurant_id', 'start_time', 'end_time')
+    for offer_id, rid, start_time, end_time in rows:
+        if end_time is not None and end_time.hour == (start_time.hour + 1) % 24:
+            existing.setdefault((rid, start_time.hour), []).append(offer_id)
+
+    items = []
+    for rid in restaurant_ids:
+        for hour in hours:
+            replaces = existing.get((rid, hour), [])
+            if replaces and not spec['replace']:
+                action = 'skip'
+            else:
+                action = 'replace' if replaces else 'create'
+            pattern = spec['per_hour_patterns'].get(str(hour), spec['base_pattern']) or []
+            slots = []
+            for entry in pattern:
+                start, end = _slot_times(hour, entry['minute'])
+                slots.append({
+                    'start_time': start.strftime('%H:%M'),
+                    'end_time': end.strftime('%H:%M'),
+                    'discount_percentage': entry['discount_percentage'],
+                    'discount_amount': entry['discount_amount'],
+                })
+            items.append({
+                'restaurant_id': rid,
+                'hour': hour,
+                'action': action,
+                'replaces': replaces if action == 'replace' else [],
+                'title': spec['title_template'].replace('{hour}', f'{hour:02d}'),
+                'slots': slots,
+            })
+    return items
+
+
+def _build_offer(item, spec):
+    hour = item['hour']
+    pattern = spec['per_hour_patterns'].get(str(hour), spec['base_pattern'])
+    offer = Offer(
+        restaurant_id=item['restaurant_id'],
+        title=item['title'],
+        description=spec['description'],
+        offer_type=spec['offer_type'],
+        start_date=spec['start_date'],
+        end_date=spec['end_date'],
+        start_time=dt.time(hour, 0),
+        end_time=dt.time((hour + 1) % 24, 0),
+        is_active=True,
+        available_quantity=spec['available_quantity'],
+        max_people_per_booking=spec['max_people_per_booking'],
+        min_advance_booking=spec['min_advance_booking'],
+    )
+    if spec['days_of_week']:
+        offer.days_of_week = spec['days_of_week']
+    # Offer.save() normally derives the mask; bulk_create does not call it
+    offer.days_mask = days_mask_from_string(offer.days_of_week)
+    if spec['offer_type'] == 'percentage':
+        # Headline discount is the best sub-slot discount
+        offer.discount_percentage = _headline(pattern, 'discount_percentage')
+    else:
+        offer.discount_amount = _headline(pattern, 'discount_amount')
+    if spec['original_price'] is not None:
+        offer.original_price = spec['original_price']
+    return offer
+
+
+def execute(items, spec):
+    """Apply a plan atomically; returns (created [{id, restaurant_id, hour}], deleted count)."""
+    to_create = [item for item in items if item['action'] != 'skip']
+    replaced_ids = [offer_id for item in to_create for offer_id in item['replaces']]
+    with transaction.atomic():
+        deleted = 0
+        if replaced_ids:
+            _, per_model = Offer.objects.filter(id__in=replaced_ids).delete()
+            deleted = per_model.get(Offer._meta.label, 0)
+        offers = [_build_offer(item, spec) for item in to_create]
+        Offer.objects.bulk_create(offers, batch_size=BULK_BATCH_SIZE)
+        time_slots = [
+            OfferTimeSlot(
+                offer=offer,
+                restaurant_id=offer.restaurant_id,
+                start_time=dt.time.fromisoformat(slot['start_time']),
+                end_time=dt.time.fromisoformat(slot['end_time']),
+                discount_percentage=slot['discount_percentage'],
+                discount_amount=slot['discount_amount'],
+                is_active=True,
+            )
+            for item, offer in zip(to_create, offers)
+            for slot in item['slots']
+        ]
+        OfferTimeSlot.objects.bulk_create(time_slots, batch_size=BULK_BATCH_SIZE)
+        search.index_offers([offer.id for offer in offers])
+
+    restaurant_ids = sorted({offer.restaurant_id for offer in offers})
+    slot_index.invalidate_many(restaurant_ids)
+    for rid in restaurant_ids:
+        response_cache.bump_restaurant(rid)
+    if offers:
+        response_cache.bump_catalog()
+    created = [{'id': offer.id, 'restaurant_id': offer.restaurant_id, 'hour': item['hour']} for item, offer in zip(to_create, offers)]
+    return created, deleted
@@ -0,0 +1,196 @@
+"""Full-text search over offers and restaurants.
+
+The index lives outside the ORM models and depends on the database engine:
+
+- PostgreSQL: a ``search_vector`` tsvector column on marketplace_offer and
+  marketplace_restaurant with a GIN index, ranked with ts_rank;
+- SQLite: FTS5 virtual tables (marketplace_offer_fts and
+  marketplace_restaurant_fts) keyed by rowid = primary key, ranked with bm25.
+
+Offer documents hold the title, restaurant name and description; restaurant
+documents hold the name, cuisine type and address. Signals call
+index_offer/index_restaurant/unindex_* on save and delete; rebuild() (and the
+rebuild_search_index command) repairs the whole index. On other engines the
+helpers fall back to icontains lookups.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q, FloatField
+from django.db.models.expressions import RawSQL
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Postgres documents: weight A for names/titles, B and C for supporting text
+_PG_OFFER_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(o.title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(r.name, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(o.description, '')), 'C')"
+)
+_PG_RESTAURANT_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(cuisine_type, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(address, '')), 'C')"
+)
+
+
+def _vendor():
+    return connection.vendor if connection.vendor in ('postgresql', 'sqlite') else None
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+def _match_expression(tokens):
+    """Engine-specific query string: every token must match as a prefix."""
+    if _vendor() == 'postgresql':
+        return ' & '.join(f'{t}:*' for t in tokens)
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+# --- Index maintenance -----------------------------------------------------
+
+def index_offer(offer_id):
+    if offer_id:
+        index_offers([offer_id])
+
+
+def index_offers(offer_ids):
+    """Reindex many offers in a fixed number of statements (bulk writes skip signals)."""
+    vendor = _vendor()
+    offer_ids = [int(i) for i in offer_ids if i]
+    if not offer_ids or vendor is None:
+        return
+    placeholders = ', '.join(['%s'] * len(offer_ids))
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(
+                f"UPDATE marketplace_offer o SET search_vector = {_PG_OFFER_VECTOR} "
+                f"FROM marketplace_restaurant r WHERE r.id = o.restaurant_id AND o.id IN ({placeholders})",
+                offer_ids,
+            )
+        else:
+            cursor.execute(f"DELETE FROM marketplace_offer_fts WHERE rowid IN ({placeholders})", offer_ids)
+            cursor.execute(
+                "INSERT INTO marketplace_offer_fts(rowid, title, restaurant_name, description) "
+                "SELECT o.id, o.title, r.name, coalesce(o.description, '') FROM marketplace_offer o "
+                f"JOIN marketplace_restaurant r ON r.id = o.restaurant_id WHERE o.id IN ({placeholders})",
+                offer_ids,
+            )
+
+
+def index_restaurant(restaurant_id):
+    """Reindex a restaurant and the offers that embed its name."""
+    vendor = _vendor()
+    if not restaurant_id or vendor is None:
+        return
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(
+                f"UPDATE marketplace_restaurant SET search_vector = {_PG_RESTAURANT_VECTOR} WHERE id = %s",
+                [restaurant_id],
+            )
+            cursor.execute(
+                f"UPDATE marketplace_offer o SET search_vector = {_PG_OFFER_VECTOR} "
+                "FROM marketplace_restaurant r WHERE r.id = o.restaurant_id AND o.restaurant_id = %s",
+                [restaurant_id],
+            )
+        else:
+            cursor.execute("DELETE FROM marketplace_restaurant_fts WHERE rowid = %s", [restaurant_id])
+            cursor.execute(
+                "INSERT INTO marketplace_restaurant_fts(rowid, name, cuisine_type, address) "
+                "SELECT id, name, cuisine_type, address FROM marketplace_restaurant WHERE id = %s",
+                [restaurant_id],
+            )
+            cursor.execute(
+                "UPDATE marketplace_offer_fts SET restaurant_name = "
+                "(SELECT name FROM marketplace_restaurant WHERE id = %s) "
+                "WHERE rowid IN (SELECT id FROM marketplace_offer WHERE restaurant_id = %s)",
+                [restaurant_id, restaurant_id],
+            )
+
+
+def unindex_offer(offer_id):
+    # Postgres rows carry their own vector and go away with the row
+    if offer_id and _vendor() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM marketplace_offer_fts WHERE rowid = %s", [offer_id])
+
+
+def unindex_restaurant(restaurant_id):
+    if restaurant_id and _vendor() == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM marketplace_restaurant_fts WHERE rowid = %s", [restaurant_id])
+
+
+def rebuild():
+    """Rebuild every document; used after bulk writes that skip signals."""
+    vendor = _vendor()
+    if vendor is None:
+        return
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute(f"UPDATE marketplace_restaurant SET search_vector = {_PG_RESTAURANT_VECTOR}")
+            cursor.execute(
+                f"UPDATE marketplace_offer o SET search_vector = {_PG_OFFER_VECTOR} "
+                "FROM marketplace_restaurant r WHERE r.id = o.restaurant_id"
+            )
+        else:
+            cursor.execute("DELETE FROM marketplace_restaurant_fts")
+            cursor.execute(
+                "INSERT INTO marketplace_restaurant_fts(rowid, name, cuisine_type, address) "
+                "SELECT id, name, cuisine_type, address FROM marketplace_restaurant"
+            )
+            cursor.execute("DELETE FROM marketplace_offer_fts")
+            cursor.execute(
+                "INSERT INTO marketplace_offer_fts(rowid, title, restaurant_name, description) "
+                "SELECT o.id, o.title, r.name, coalesce(o.description, '') FROM marketplace_offer o "
+                "JOIN marketplace_restaurant r ON r.id = o.restaurant_id"
+            )
+
+
+# --- Queries ---------------------------------------------------------------
+
+def _search(qs, text, table, fts_table, fallback_fields, rank):
+    tokens = _tokens(text)
+    if not tokens:
+        return qs
+    vendor = _vendor()
+    if vendor is None:
+        condition = Q()
+        for token in tokens:
+            condition &= Q(*[Q(**{f'{f}__icontains': token}) for f in fallback_fields], _connector=Q.OR)
+        return qs.filter(condition)
+    match = _match_expression(tokens)
+    if vendor == 'postgresql':
+        ids = RawSQL(f"SELECT id FROM {table} WHERE search_vector @@ to_tsquery('simple', %s)", [match])
+        score = RawSQL(f"ts_rank({table}.search_vector, to_tsquery('simple', %s))", [match], output_field=FloatField())
+    else:
+        ids = RawSQL(f"SELECT rowid FROM {fts_table} WHERE {fts_table} MATCH %s", [match])
+        # bm25() is lower-is-better; negate so both engines sort by -search_rank.
+        # Column weights mirror the Postgres A/B/C weights.
+        score = RawSQL(
+            f"(SELECT -bm25({fts_table}, 10.0, 4.0, 1.0) FROM {fts_table} WHERE {fts_table} MATCH %s AND rowid = {table}.id)",
+            [match], output_field=FloatField(),
+        )
+    qs = qs.filter(pk__in=ids)
+    if rank:
+        qs = qs.annotate(search_rank=score)
+    return qs
+
+
+def search_offers(qs, text, rank=False):
+    """Restrict an Offer queryset to matches for ``text`` (optionally annotating search_rank)."""
+    return _search(
+        qs, text, 'marketplace_offer', 'marketplace_offer_fts',
+        ['title', 'description', 'restaurant__name'], rank,
+    )
+
+
+def search_restaurants(qs, text, rank=False):
+    """Restrict a Restaurant queryset to matches for ``text`` (optionally annotating search_rank)."""
+    return _search(
+        qs, text, 'marketplace_restaurant', 'marketplace_restaurant_fts',
+        ['name', 'cuisine_type', 'address'], rank,
+    )
@@ -1,8 +1,14 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
 from rest_framework import serializers
 from marketplace.models import Restaurant, Offer, Booking, BookingSlot, OfferTimeSlot, BookingHold
 from users.serializers import UserSerializer
+from marketplace.fieldsets import SparseFieldsetMixin
+from marketplace import slot_index
+from marketplace import cache as response_cache
 
-class RestaurantSerializer(serializers.ModelSerializer):
+class RestaurantSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     owner = UserSerializer(read_only=True)
     active_offers = serializers.SerializerMethodField()
     featured_offer = serializers.SerializerMethodField()
@@ -11,6 +17,13 @@ class RestaurantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Restaurant
         fields = '__all__'
+        # Columns read by computed fields (see marketplace.fieldsets); nested
+        # offers read their restaurant's name and cuisine through the prefetch
+        sparse_sources = {
+            'cover_image_url': ['image_url'],
+            'active_offers': ['name', 'cuisine_type'],
+            'featured_offer': ['name', 'cuisine_type'],
+        }
 
     def get_cover_image_url(self, obj):
         """Return absolute URL for restaurant image if possible.
@@ -34,52 +47,30 @@ class RestaurantSerializer(serializers.ModelSerializer):
         # Optionally, add custom validation for URLs if needed
         return value
 
+    def _todays_offers(self, obj):
+        """Offers active today, from RestaurantQuerySet.with_todays_offers() when prefetched."""
+        offers = getattr(obj, 'todays_offers', None)
+        if offers is None:
+            from django.utils import timezone
+            offers = list(obj.offers.active_on(timezone.localdate()))
+        return offers
+
     def get_active_offers(self, obj):
         """Get all offers active for today (date range and optional day-of-week)."""
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        active_offers = obj.offers.filter(
-            is_active=True,
-            start_date__lte=today,
-            end_date__gte=today,
-        )
-        
-        # Further filter by day of week if specified
-        weekday = today.weekday()
-        filtered_offers = []
-        
-        for offer in active_offers:
-            if offer.days_of_week:
-                allowed_days = [int(d.strip()) for d in offer.days_of_week.split(',') if d.strip().isdigit()]
-                if weekday in allowed_days:
-                    filtered_offers.append(offer)
-            else:
-                filtered_offers.append(offer)
-        
-        return OfferSerializer(filtered_offers, many=True, context=self.context).data
+        return OfferSerializer(self._todays_offers(obj), many=True, context=self.context).data
 
     def get_featured_offer(self, obj):
         """Pick the best offer available today by date range/day-of-week, not exact time window."""
-        from django.utils import timezone
-        today = timezone.now().date()
-        
-        best_offer = obj.offers.filter(
-            is_active=True,
-            start_date__lte=today,
-            end_date__gte=today
-        ).order_by('-is_featured', '-discount_percentage', '-discount_amount').first()
-        
-        if best_offer:
-            # Check if it's available today based on days_of_week
-            if best_offer.days_of_week:
-                weekday = today.weekday()
-                allowed_days = [int(d.strip()) for d in best_offer.days_of_week.split(',') if d.strip().isdigit()]
-                if weekday not in allowed_days:
-                    return None
-            
-            return OfferSerializer(best_offer, context=self.context).data
-        return None
+        offers = self._todays_offers(obj)
+        if not offers:
+            return None
+        # Featured first, then the highest discount; missing discounts rank last
+        best_offer = max(offers, key=lambda o: (
+            o.is_featured,
+            o.discount_percentage if o.discount_percentage is not None else -1,
+            o.discount_amount if o.discount_amount is not None else -1,
+        ))
+        return OfferSerializer(best_offer, context=self.context).data
 
     def validate_opening_time(self, value):
         # Accept any string, optionally add custom logic
@@ -94,7 +85,7 @@ class OfferTimeSlotSerializer(serializers.ModelSerializer):
         model = OfferTimeSlot
         fields = ['id', 'start_time', 'end_time', 'discount_percentage', 'discount_amount', 'is_active']
 
-class OfferSerializer(serializers.ModelSerializer):
+class OfferSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
     restaurant_cuisine = serializers.CharField(source='restaurant.cuisine_type', read_only=True)
     restaurant_location = serializers.CharField(source='restaurant.location', read_only=True)
@@ -120,6 +111,12 @@ class OfferSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at', 'time_slots', 'time_slots_detail'
         ]
         read_only_fields = ['created_at', 'updated_at', 'discounted_price', 'savings_amount', 'is_available_today']
+        # Columns read by computed fields (see marketplace.fieldsets)
+        sparse_sources = {
+            'discounted_price': ['offer_type', 'original_price', 'discount_percentage', 'discount_amount'],
+            'savings_amount': ['offer_type', 'original_price', 'discount_percentage', 'discount_amount'],
+            'is_available_today': ['start_date', 'end_date', 'days_mask', 'is_active'],
+        }
 
     def validate(self, data):
         """Validate offer data"""
@@ -159,46 +156,111 @@ class OfferSerializer(serializers.ModelSerializer):
         
         return data
 
+    @staticmethod
+    def _decimal(value, field):
+        if value in (None, ''):
+            return None
+        try:
+            return Decimal(str(value)).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            raise serializers.ValidationError({'time_slots': f'Invalid {field} {value!r}'})
+
     def _upsert_time_slots(self, offer, slots):
-        """Create or replace OfferTimeSlot entries for this offer.
+        """Sync the offer's OfferTimeSlots with ``slots``, matched by start_time.
+
         Each slot: { start_time: 'HH:MM', end_time: 'HH:MM', discount_percentage?, discount_amount? }
-        Minutes must be 00 or 30 and duration 30m.
+        Matching rows keep their id and are only written when something
+        differs; the rest are bulk created or deleted. Returns
+        {'created', 'updated', 'deleted', 'unchanged'} counts.
         """
-        if slots is None:
-            return
-        # Clear and recreate for simplicity
-        OfferTimeSlot.objects.filter(offer=offer).delete()
         import datetime
+        from django.utils import timezone
+        incoming = {}
         for s in slots:
-            st = datetime.time.fromisoformat((s.get('start_time') or '00:00'))
-            et = datetime.time.fromisoformat((s.get('end_time') or '00:00'))
+            try:
+                st = datetime.time.fromisoformat((s.get('start_time') or '00:00'))
+                et = datetime.time.fromisoformat((s.get('end_time') or '00:00'))
+            except (TypeError, ValueError):
+                raise serializers.ValidationError({'time_slots': 'start_time and end_time must be HH:MM'})
             dur = et.hour*60+et.minute - (st.hour*60+st.minute)
             if dur <= 0:
                 raise serializers.ValidationError({'time_slots': 'Each slot must have end_time after start_time'})
-            OfferTimeSlot.objects.create(
-                offer=offer,
-                restaurant=offer.restaurant,
-                start_time=st,
-                end_time=et,
-                discount_percentage=s.get('discount_percentage'),
-                discount_amount=s.get('discount_amount'),
-                is_active=True,
-            )
+            if st in incoming:
+                raise serializers.ValidationError({'time_slots': f'Duplicate slot start_time {st:%H:%M}'})
+            incoming[st] = {
+                'end_time': et,
+                'discount_percentage': self._decimal(s.get('discount_percentage'), 'discount_percentage'),
+                'discount_amount': self._decimal(s.get('discount_amount'), 'discount_amount'),
+            }
+
+        existing = {}
+        to_delete = []
+        for ts in OfferTimeSlot.objects.filter(offer=offer).order_by('start_time', 'id'):
+            # Older rows may repeat a start_time; keep the first
+            if ts.start_time in existing or ts.start_time not in incoming:
+                to_delete.append(ts.id)
+            else:
+                existing[ts.start_time] = ts
+
+        now = timezone.now()
+        to_create, to_update = [], []
+        for st, values in incoming.items():
+            ts = existing.get(st)
+            if ts is None:
+                to_create.append(OfferTimeSlot(offer=offer, restaurant=offer.restaurant, start_time=st, is_active=True, **values))
+                continue
+            wanted = dict(values, is_active=True, restaurant_id=offer.restaurant_id)
+            if any(getattr(ts, field) != value for field, value in wanted.items()):
+                for field, value in wanted.items():
+                    setattr(ts, field, value)
+                ts.updated_at = now  # bulk_update skips auto_now
+                to_update.append(ts)
+
+        changes = {
+            'created': len(to_create),
+            'updated': len(to_update),
+            'deleted': len(to_delete),
+            'unchanged': len(existing) - len(to_update),
+        }
+        if not (to_create or to_update or to_delete):
+            return changes
+        with transaction.atomic():
+            if to_delete:
+                OfferTimeSlot.objects.filter(id__in=to_delete).delete()
+            if to_update:
+                OfferTimeSlot.objects.bulk_update(
+                    to_update, ['end_time', 'discount_percentage', 'discount_amount', 'is_active', 'restaurant', 'updated_at'],
+                )
+            if to_create:
+                OfferTimeSlot.objects.bulk_create(to_create)
+        # Bulk writes skip the OfferTimeSlot signals
+        slot_index.invalidate(offer.restaurant_id)
+        response_cache.bump_restaurant(offer.restaurant_id)
+        return changes
 
     def create(self, validated_data):
         slots = validated_data.pop('time_slots', None)
-        offer = super().create(validated_data)
-        self._upsert_time_slots(offer, slots)
+        with transaction.atomic():
+            offer = super().create(validated_data)
+            if slots is not None:
+                offer.time_slot_changes = self._upsert_time_slots(offer, slots)
         return offer
 
     def update(self, instance, validated_data):
         slots = validated_data.pop('time_slots', None)
-        offer = super().update(instance, validated_data)
-        # Only owners/admins can modify; enforced by view permissions already
-        if slots is not None:
-            self._upsert_time_slots(offer, slots)
+        with transaction.atomic():
+            offer = super().update(instance, validated_data)
+            # Only owners/admins can modify; enforced by view permissions already
+            if slots is not None:
+                offer.time_slot_changes = self._upsert_time_slots(offer, slots)
         return offer
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        changes = getattr(instance, 'time_slot_changes', None)
+        if changes is not None:
+            data['time_slot_changes'] = changes
+        return data
 
 # Feed and related lightweight serializers
 class SlotSerializer(serializers.Serializer):
@@ -235,6 +297,8 @@ class FiltersSerializer(serializers.Serializer):
     brands = serializers.ListField(child=serializers.CharField())
     themes = serializers.ListField(child=serializers.CharField())
     price_tiers = serializers.ListField(child=serializers.IntegerField())
+    total = serializers.IntegerField()
+    facets = serializers.DictField()
 
 class AvailabilitySerializer(serializers.Serializer):
     available = serializers.BooleanField()
@@ -370,7 +434,7 @@ class BookingSerializer(serializers.ModelSerializer):
         return {'applied':applied,'source':source,'slot_percentage':slot_disc,'offer_percentage':offer_disc_pct,'offer_amount':offer_disc_amt}
 
 # Admin-specific serializers
-class AdminRestaurantSerializer(serializers.ModelSerializer):
+class AdminRestaurantSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     owner_username = serializers.CharField(source='owner.username', read_only=True)
     owner_email = serializers.CharField(source='owner.email', read_only=True)
     total_offers = serializers.SerializerMethodField()
@@ -380,6 +444,8 @@ class AdminRestaurantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Restaurant
         fields = '__all__'
+        # Columns read by computed fields (see marketplace.fieldsets)
+        sparse_sources = {'cover_image_url': ['image_url'], 'total_bookings': ['reservations_count']}
 
     def validate_image_url(self, value):
         return value
@@ -394,11 +460,8 @@ class AdminRestaurantSerializer(serializers.ModelSerializer):
         return obj.offers.count()
     
     def get_total_bookings(self, obj):
-        # Count bookings from both offers and direct restaurant bookings
-        from django.db.models import Q
-        return Booking.objects.filter(
-            Q(offer__restaurant=obj) | Q(restaurant=obj)
-        ).count()
+        # Denormalized count of non-cancelled bookings (direct and via offers)
+        return obj.reservations_count
 
     def get_cover_image_url(self, obj):
         raw = getattr(obj, 'image_url', None)
@@ -2,10 +2,15 @@ import os
 import uuid
 import requests
 from django.core.files.base import ContentFile
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.conf import settings
-from .models import Restaurant
+from .models import City, Restaurant, Offer, OfferTimeSlot, BookingSlot, Booking, BookingHold
+from . import slot_index, search, spatial
+from . import cache as response_cache
 
 TIMEOUT = 10
 ALLOWED_CONTENT_TYPES = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
@@ -38,13 +43,21 @@ def _download_image(url: str):
 def fetch_restaurant_cover(sender, instance: Restaurant, created, **kwargs):
     """Download remote image_url once and store into image_file if empty.
 
-    Only runs when: image_url present, image_file empty, and protocol is http/https.
+    Only runs when: RESTAURANT_COVER_AUTO_DOWNLOAD is set, image_url present,
+    image_file empty, and protocol is http/https. The download happens after
+    the transaction commits, so it never holds a transaction open.
     """
+    if not getattr(settings, 'RESTAURANT_COVER_AUTO_DOWNLOAD', False):
+        return
     if not instance.image_url or instance.image_file:
         return
     url = instance.image_url.strip()
     if not (url.startswith('http://') or url.startswith('https://')):
         return
+    transaction.on_commit(lambda: _store_cover(instance, url))
+
+
+def _store_cover(instance: Restaurant, url: str):
     content, ext = _download_image(url)
     if not content or not ext:
         return
@@ -54,3 +67,168 @@ def fetch_restaurant_cover(sender, instance: Restaurant, created, **kwargs):
     except Exception:
         # Silent fail—retain original image_url
         pass
+
+
+# --- Derived data invalidation ---------------------------------------------
+# Writes drop stale slot index rows and bump the response cache version
+# counters of every restaurant they touch (see marketplace.slot_index and
+# marketplace.cache), and keep the full-text search documents current
+# (marketplace.search).
+
+SPATIAL_FIELDS = ('latitude', 'longitude', 'is_active')
+
+
+@receiver(pre_save, sender=Restaurant)
+def remember_restaurant_location(sender, instance: Restaurant, update_fields=None, **kwargs):
+    """Remember whether the save moves the restaurant in or out of the spatial index."""
+    instance._location_changed = True
+    if not instance.pk:
+        return
+    if update_fields is not None and not set(SPATIAL_FIELDS) & set(update_fields):
+        instance._location_changed = False
+        return
+    stored = Restaurant.objects.filter(pk=instance.pk).values_list(*SPATIAL_FIELDS).first()
+    if stored is not None:
+        current = tuple(Restaurant._meta.get_field(name).to_python(getattr(instance, name)) for name in SPATIAL_FIELDS)
+        instance._location_changed = current != stored
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def restaurant_changed(sender, instance: Restaurant, signal, **kwargs):
+    response_cache.bump_restaurant(instance.pk)
+    response_cache.bump_catalog()
+    # Creates and deletes always count; other saves only when position or is_active moved
+    if signal is post_delete or getattr(instance, '_location_changed', True):
+        response_cache.bump_locations()
+        spatial.invalidate()
+
+
+@receiver(post_save, sender=Restaurant)
+def restaurant_saved_search(sender, instance: Restaurant, **kwargs):
+    search.index_restaurant(instance.pk)
+
+
+@receiver(post_delete, sender=Restaurant)
+def restaurant_deleted_search(sender, instance: Restaurant, **kwargs):
+    search.unindex_restaurant(instance.pk)
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def city_changed(sender, instance: City, **kwargs):
+    # City filters and card labels read Restaurant.city; reassignment is done by assign_restaurant_cities
+    response_cache.bump_catalog()
+
+
+@receiver(pre_save, sender=Offer)
+def remember_offer_restaurant(sender, instance: Offer, **kwargs):
+    """Remember the previous restaurant so a reassigned offer invalidates both."""
+    if instance.pk:
+        instance._previous_restaurant_id = (
+            Offer.objects.filter(pk=instance.pk).values_list('restaurant_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def offer_changed(sender, instance: Offer, **kwargs):
+    restaurant_ids = {instance.restaurant_id, getattr(instance, '_previous_restaurant_id', None)}
+    for rid in filter(None, restaurant_ids):
+        slot_index.invalidate(rid)
+        response_cache.bump_restaurant(rid)
+    response_cache.bump_catalog()
+
+
+@receiver(post_save, sender=Offer)
+def offer_saved_search(sender, instance: Offer, **kwargs):
+    search.index_offer(instance.pk)
+
+
+@receiver(post_delete, sender=Offer)
+def offer_deleted_search(sender, instance: Offer, **kwargs):
+    search.unindex_offer(instance.pk)
+
+
+@receiver(post_save, sender=OfferTimeSlot)
+@receiver(post_delete, sender=OfferTimeSlot)
+def offer_timeslot_changed(sender, instance: OfferTimeSlot, **kwargs):
+    slot_index.invalidate(instance.restaurant_id)
+    response_cache.bump_restaurant(instance.restaurant_id)
+
+
+@receiver(post_save, sender=BookingSlot)
+@receiver(post_delete, sender=BookingSlot)
+def booking_slot_changed(sender, instance: BookingSlot, **kwargs):
+    slot_index.invalidate(instance.restaurant_id, instance.date)
+    response_cache.bump_restaurant(instance.restaurant_id)
+
+
+def _slot_changed(slot_id):
+    if not slot_id:
+        return
+    slot = BookingSlot.objects.filter(id=slot_id).values('restaurant_id', 'date').first()
+    if slot:
+        slot_index.invalidate(slot['restaurant_id'], slot['date'])
+        response_cache.bump_restaurant(slot['restaurant_id'])
+
+
+def _reservation_key(booking: Booking):
+    try:
+        return booking.reservation_key
+    except Offer.DoesNotExist:
+        return None
+
+
+def _adjust_reservations(key, delta):
+    """Move the denormalized reservation counters for (restaurant_id, offer_id) by ``delta``."""
+    if not key:
+        return
+    restaurant_id, offer_id = key
+    # F() keeps concurrent bookings from losing updates; update() skips model signals
+    counter = Greatest(F('reservations_count') + delta, 0)
+    if restaurant_id:
+        Restaurant.objects.filter(pk=restaurant_id).update(reservations_count=counter)
+        response_cache.bump_restaurant(restaurant_id)
+    if offer_id:
+        Offer.objects.filter(pk=offer_id).update(reservations_count=counter)
+
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_reservation(sender, instance: Booking, **kwargs):
+    """Remember what the stored row was counted under, so edits move the counters."""
+    instance._previous_reservation_key = None
+    if instance.pk:
+        row = (
+            Booking.objects.filter(pk=instance.pk)
+            .values('status', 'restaurant_id', 'offer_id', 'offer__restaurant_id').first()
+        )
+        if row and row['status'] != 'cancelled':
+            instance._previous_reservation_key = (row['restaurant_id'] or row['offer__restaurant_id'], row['offer_id'])
+
+
+@receiver(post_save, sender=Booking)
+def booking_saved(sender, instance: Booking, created, **kwargs):
+    previous = None if created else getattr(instance, '_previous_reservation_key', None)
+    current = _reservation_key(instance)
+    if previous != current:
+        _adjust_reservations(previous, -1)
+        _adjust_reservations(current, 1)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted(sender, instance: Booking, **kwargs):
+    _adjust_reservations(_reservation_key(instance), -1)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def booking_changed(sender, instance: Booking, **kwargs):
+    _slot_changed(instance.slot_id)
+    response_cache.bump_restaurant(instance.restaurant_id)
+
+
+@receiver(post_save, sender=BookingHold)
+@receiver(post_delete, sender=BookingHold)
+def booking_hold_changed(sender, instance: BookingHold, **kwargs):
+    _slot_changed(instance.slot_id)
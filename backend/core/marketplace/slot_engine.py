@@ -0,0 +1,284 @@
+"""Shared "best discount for restaurant R on date D at time T" engine.
+
+A restaurant-day is a DayGrid of 48 half-hour bins. Each bin holds the best
+discount percentage, where it came from ('offer', 'slot' or 'both'), the
+offer that produced it and the concrete BookingSlot at that time, if any.
+
+Offers with active OfferTimeSlots fill the bins of those timeslots; offers
+without them fill every bin of their [start_time, end_time) window. The
+higher discount wins a bin and ties keep the first writer. Times are snapped
+to the 30-minute grid.
+
+Bins without a usable discount are kept, not dropped: a timeslot without
+its own discount inherits the offer's, and an offer with none at all (a
+'special' offer, or an amount without original_price) still covers its
+bins at 0%, so the time stays visible and bookable.
+
+The feed (via slot_index), timeslots, materialize_slot and hourly_offers all
+resolve discounts through this module, so amount -> percent conversion and
+window expansion live in one place. Filling a grid is plain list indexing
+(no datetime arithmetic), cheap enough for thousands of restaurant-days per
+second.
+"""
+import datetime as dt
+
+from marketplace.models import Offer, OfferTimeSlot, BookingSlot
+
+BIN_MINUTES = 30
+BINS_PER_DAY = 24 * 60 // BIN_MINUTES
+
+
+def bin_of(value):
+    """Bin index of a time (or 'HH:MM' string), snapped down to the grid."""
+    if isinstance(value, str):
+        hh, mm = map(int, value.split(':')[:2])
+        return (hh * 60 + mm) // BIN_MINUTES
+    return _minutes(value) // BIN_MINUTES
+
+
+def time_of(index):
+    """'HH:MM' label of a bin's start."""
+    minutes = index * BIN_MINUTES
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def start_time_of(index):
+    minutes = index * BIN_MINUTES
+    return dt.time(minutes // 60, minutes % 60)
+
+
+def _to_percent(percentage, amount, original_price):
+    try:
+        if percentage is not None:
+            return max(0.0, min(100.0, float(percentage)))
+        if amount is not None and original_price:
+            return max(0.0, min(100.0, float(amount) / float(original_price) * 100.0))
+    except (TypeError, ValueError, ZeroDivisionError):
+        pass
+    return None
+
+
+def discount_percent(offer, ts=None):
+    """Discount of an OfferTimeSlot (or the offer itself) as a 0-100 percentage.
+
+    Percentages win over amounts; amounts are converted against the offer's
+    original price. A timeslot without a usable discount inherits the
+    offer's. Returns None when nothing is usable.
+    """
+    if ts is not None:
+        pct = _to_percent(ts.discount_percentage, ts.discount_amount, offer.original_price)
+        if pct is not None:
+            return pct
+    return _to_percent(offer.discount_percentage, offer.discount_amount, offer.original_price)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def window_bins(start_time, end_time):
+    """Bins whose start lies inside [start_time, end_time)."""
+    if start_time is None or end_time is None:
+        return range(0)
+    first = -(-_minutes(start_time) // BIN_MINUTES)
+    last = -(-_minutes(end_time) // BIN_MINUTES)
+    return range(first, min(last, BINS_PER_DAY))
+
+
+class DayGrid:
+    """Best discount per half-hour bin for one restaurant and date."""
+
+    __slots__ = ('day', 'discount', 'source', 'offer_id', 'slot')
+
+    def __init__(self, day):
+        self.day = day
+        self.discount = [None] * BINS_PER_DAY
+        self.source = [None] * BINS_PER_DAY
+        self.offer_id = [None] * BINS_PER_DAY
+        self.slot = [None] * BINS_PER_DAY
+
+    def _offer_bin(self, index, pct, offer_id):
+        current = self.discount[index]
+        if self.source[index] is None or (current or 0) < pct:
+            self.discount[index] = pct
+            self.source[index] = 'offer'
+            self.offer_id[index] = offer_id
+
+    def add_offer(self, offer, time_slots=()):
+        """Fill bins from an offer and its active OfferTimeSlots."""
+        if time_slots:
+            for ts in time_slots:
+                self._offer_bin(bin_of(ts.start_time), discount_percent(offer, ts) or 0.0, offer.id)
+        else:
+            pct = discount_percent(offer) or 0.0
+            for index in window_bins(offer.start_time, offer.end_time):
+                self._offer_bin(index, pct, offer.id)
+
+    def add_slots(self, slots, add_missing=True):
+        """Attach concrete BookingSlots, merging their own discounts.
+
+        With ``add_missing`` False, slots at times no offer covers are ignored.
+        """
+        for slot in slots:
+            index = bin_of(slot.start_time)
+            source = self.source[index]
+            if source is None and not add_missing:
+                continue
+            self.slot[index] = slot
+            pct = float(slot.discount_percentage) if slot.discount_percentage is not None else None
+            if source is None:
+                self.discount[index] = pct
+                self.source[index] = 'slot'
+            else:
+                if (pct or 0) > (self.discount[index] or 0):
+                    self.discount[index] = pct
+                self.source[index] = 'both'
+
+    def covers(self, index):
+        return self.source[index] is not None
+
+    def bins(self):
+        """Indices of covered bins in time order."""
+        return [i for i in range(BINS_PER_DAY) if self.source[i] is not None]
+
+    def best_offer_id(self, first, last):
+        """Offer with the best discount across bins [first, last), or None."""
+        best_id, best_pct = None, None
+        for index in range(first, last):
+            offer_id = self.offer_id[index]
+            if offer_id is not None and (best_pct is None or (self.discount[index] or 0) > best_pct):
+                best_id, best_pct = offer_id, self.discount[index] or 0
+        return best_id
+
+
+def load_time_slots(offer_ids):
+    """{offer_id: [active OfferTimeSlot, ...]} ordered by start time, in one query."""
+    time_slots = {}
+    if offer_ids:
+        for ts in OfferTimeSlot.objects.filter(offer_id__in=offer_ids, is_active=True).order_by('start_time'):
+            time_slots.setdefault(ts.offer_id, []).append(ts)
+    return time_slots
+
+
+def build_grids(restaurant_ids, day, offers_by_restaurant=None):
+    """Return {restaurant_id: DayGrid} for ``day`` filled from offers.
+
+    Runs at most two queries (offers unless ``offers_by_restaurant`` is
+    supplied, then their timeslots). Offers not active on ``day``'s weekday
+    are skipped, so callers may pass offers loaded by date range only.
+    BookingSlots are attached by the caller with DayGrid.add_slots.
+    """
+    restaurant_ids = list(dict.fromkeys(restaurant_ids))
+    if offers_by_restaurant is None:
+        offers_by_restaurant = {}
+        if restaurant_ids:
+            for off in Offer.objects.active_on(day).filter(restaurant_id__in=restaurant_ids):
+                offers_by_restaurant.setdefault(off.restaurant_id, []).append(off)
+    weekday = day.weekday()
+    offers_by_restaurant = {
+        rid: [o for o in offers_by_restaurant.get(rid, []) if o.is_active and o.applies_on_weekday(weekday)]
+        for rid in restaurant_ids
+    }
+    time_slots = load_time_slots([o.id for offers in offers_by_restaurant.values() for o in offers])
+    grids = {}
+    for rid, offers in offers_by_restaurant.items():
+        grid = DayGrid(day)
+        for off in offers:
+            grid.add_offer(off, time_slots.get(off.id, ()))
+        grids[rid] = grid
+    return grids
+
+
+def build_range_grids(restaurant_ids, start, end):
+    """Return {restaurant_id: {date: DayGrid}} for every date in [start, end].
+
+    Loads every offer overlapping the window and their timeslots in two
+    queries, then fills each day's grid in memory with the offers whose date
+    range and weekdays include that day.
+    """
+    restaurant_ids = list(dict.fromkeys(restaurant_ids))
+    offers_by_restaurant = {rid: [] for rid in restaurant_ids}
+    if restaurant_ids:
+        overlapping = Offer.objects.filter(
+            restaurant_id__in=restaurant_ids, is_active=True, start_date__lte=end, end_date__gte=start,
+        )
+        for off in overlapping:
+            offers_by_restaurant[off.restaurant_id].append(off)
+    time_slots = load_time_slots([o.id for offers in offers_by_restaurant.values() for o in offers])
+    days = [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+    grids = {}
+    for rid, offers in offers_by_restaurant.items():
+        grids[rid] = {}
+        for day in days:
+            grid = DayGrid(day)
+            weekday = day.weekday()
+            for off in offers:
+                if off.start_date <= day <= off.end_date and off.applies_on_weekday(weekday):
+                    grid.add_offer(off, time_slots.get(off.id, ()))
+            grids[rid][day] = grid
+    return grids
+
+
+def is_bookable(slot):
+    """True for an open BookingSlot with capacity left (uses with_capacity annotations)."""
+    remaining = slot.remaining_capacity
+    return slot.effective_status() == 'open' and (remaining is None or remaining > 0)
+
+
+def attach_bookable_slots(grids, start, end):
+    """Attach bookable BookingSlots to grids from build_range_grids in one query.
+
+    Booked and held party sizes come from BookingSlot.objects.with_capacity(),
+    so bookings and holds need no further queries.
+    """
+    if not grids:
+        return
+    slots = BookingSlot.objects.with_capacity().filter(
+        restaurant_id__in=list(grids), date__gte=start, date__lte=end, is_active=True,
+    ).order_by('start_time')
+    for slot in slots:
+        grid = grids.get(slot.restaurant_id, {}).get(slot.date)
+        if grid is not None and is_bookable(slot):
+            grid.add_slots([slot])
+
+
+def timeslot_entries(grid):
+    """Timeslot dicts as served by the timeslots endpoints, in time order."""
+    entries = []
+    for index in grid.bins():
+        slot = grid.slot[index]
+        entries.append({
+            'time': slot.start_time.strftime('%H:%M') if slot else time_of(index),
+            'discount_percent': grid.discount[index],
+            'source': grid.source[index],
+            'slot_id': slot.id if slot else None,
+            'offer_id': grid.offer_id[index],
+        })
+    return entries
+
+
+def bookable_slots(grids, party_size, window_start, window_end):
+    """Yield (restaurant_id, date, slot, discount, source) for real slots in a time window.
+
+    ``grids`` come from build_range_grids + attach_bookable_slots. A slot
+    qualifies when it starts inside [window_start, window_end] (aware
+    datetimes), accepts ``party_size`` and has room for it. Synthetic
+    offer-only times are skipped since nothing can be booked there yet.
+    """
+    from django.utils import timezone
+    tz = timezone.get_current_timezone()
+    for rid, by_day in grids.items():
+        for day, grid in by_day.items():
+            for index in grid.bins():
+                slot = grid.slot[index]
+                if slot is None:
+                    continue
+                starts_at = timezone.make_aware(dt.datetime.combine(day, slot.start_time), tz)
+                if not window_start <= starts_at <= window_end:
+                    continue
+                if not slot.min_party_size <= party_size <= slot.max_party_size:
+                    continue
+                remaining = slot.remaining_capacity
+                if remaining is not None and remaining < party_size:
+                    continue
+                yield rid, day, slot, grid.discount[index], grid.source[index]
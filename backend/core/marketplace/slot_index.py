@@ -0,0 +1,199 @@
+"""Precomputed per-restaurant daily slot index used by the offers feed.
+
+The feed used to rebuild every card's merged slot list on each request (one
+OfferTimeSlot query per offer and one BookingSlot lookup per time). Instead we
+keep one RestaurantDaySlotIndex row per restaurant and date holding the merged
+time -> best discount -> slot -> capacity inputs. Rows are deleted by signals
+when an Offer, OfferTimeSlot, BookingSlot, Booking or BookingHold changes and
+rebuilt lazily the next time someone reads them. The merge itself is done
+by marketplace.slot_engine.
+"""
+import datetime as dt
+
+from django.db import IntegrityError
+from django.utils import timezone
+
+from marketplace.models import BookingSlot, BookingHold, RestaurantDaySlotIndex
+from marketplace import slot_engine
+
+# Capacity shown for synthetic (offer-only) times and unlimited slots
+UNLIMITED_CAPACITY = 99
+
+
+def build_entries_bulk(restaurant_ids, day, offers_by_restaurant=None):
+    """Compute merged index entries for many restaurants on one date.
+
+    Runs a fixed number of queries regardless of how many restaurants are
+    passed: offers (unless ``offers_by_restaurant`` is supplied), their active
+    OfferTimeSlots, the day's BookingSlots (with booked totals annotated) and
+    active holds. Discounts are resolved by slot_engine. Returns
+    {restaurant_id: entries}.
+    """
+    restaurant_ids = list(dict.fromkeys(restaurant_ids))
+    if not restaurant_ids:
+        return {}
+    grids = slot_engine.build_grids(restaurant_ids, day, offers_by_restaurant)
+
+    # Attach concrete BookingSlot capacity inputs at times offers cover
+    with_times = [rid for rid, grid in grids.items() if grid.bins()]
+    slot_ids = []
+    if with_times:
+        for s in BookingSlot.objects.with_capacity().filter(restaurant_id__in=with_times, date=day):
+            grids[s.restaurant_id].add_slots([s], add_missing=False)
+            slot_ids.append(s.id)
+    holds: dict[int, list] = {}
+    if slot_ids:
+        # Holds are kept individually (not as held_total) so expiry can be applied at read time
+        active = BookingHold.objects.filter(slot_id__in=slot_ids, status='active', expires_at__gt=timezone.now())
+        for slot_id, party_size, expires_at in active.values_list('slot_id', 'party_size', 'expires_at'):
+            holds.setdefault(slot_id, []).append([expires_at.isoformat(), party_size])
+
+    result = {}
+    for rid, grid in grids.items():
+        entries = []
+        for index in grid.bins():
+            bslot = grid.slot[index]
+            # Real slots keep their exact start; synthetic times use the bin start
+            time_str = bslot.start_time.strftime('%H:%M') if bslot else slot_engine.time_of(index)
+            entry = {'time': time_str, 'discount': int(round(grid.discount[index] or 0)), 'slot_id': None}
+            if bslot:
+                entry.update({
+                    'slot_id': bslot.id,
+                    'status': 'closed' if (not bslot.is_active or bslot.status == 'closed') else 'open',
+                    'capacity': bslot.capacity,
+                    'booked': bslot.booked_total or 0,
+                    'holds': holds.get(bslot.id, []),
+                    'lead_time_minutes': bslot.lead_time_minutes,
+                })
+            entries.append(entry)
+        result[rid] = entries
+    return result
+
+
+def build_entries(restaurant_id, day, offers=None):
+    """Compute the merged index entries for one restaurant and date."""
+    offers_by_restaurant = {restaurant_id: offers} if offers is not None else None
+    return build_entries_bulk([restaurant_id], day, offers_by_restaurant)[restaurant_id]
+
+
+def rebuild(restaurant_id, day, offers=None):
+    """Recompute and store the index row for one restaurant and date."""
+    entries = build_entries(restaurant_id, day, offers=offers)
+    try:
+        RestaurantDaySlotIndex.objects.update_or_create(
+            restaurant_id=restaurant_id, date=day, defaults={'slots': entries},
+        )
+    except IntegrityError:
+        # A concurrent reader built the same row first; ours is equivalent.
+        pass
+    return entries
+
+
+def get_entries(restaurant_ids, day, offers_by_restaurant=None):
+    """Return {restaurant_id: entries} for ``day``, building missing rows in bulk."""
+    restaurant_ids = list(dict.fromkeys(restaurant_ids))
+    if not restaurant_ids:
+        return {}
+    found = dict(
+        RestaurantDaySlotIndex.objects.filter(restaurant_id__in=restaurant_ids, date=day)
+        .values_list('restaurant_id', 'slots')
+    )
+    missing = [rid for rid in restaurant_ids if rid not in found]
+    if missing:
+        built = build_entries_bulk(missing, day, offers_by_restaurant)
+        # Concurrent readers may build the same rows; theirs are equivalent.
+        RestaurantDaySlotIndex.objects.bulk_create(
+            [RestaurantDaySlotIndex(restaurant_id=rid, date=day, slots=entries) for rid, entries in built.items()],
+            ignore_conflicts=True,
+        )
+        found.update(built)
+    return found
+
+
+def invalidate(restaurant_id, day=None):
+    """Drop stale index rows for a restaurant (one date, or today onwards)."""
+    if not restaurant_id:
+        return
+    qs = RestaurantDaySlotIndex.objects.filter(restaurant_id=restaurant_id)
+    if day is not None:
+        qs = qs.filter(date=day)
+    else:
+        qs = qs.filter(date__gte=timezone.localdate())
+    qs.delete()
+
+
+def invalidate_many(restaurant_ids):
+    """Drop today-onwards index rows for many restaurants in one statement."""
+    restaurant_ids = [rid for rid in restaurant_ids if rid]
+    if restaurant_ids:
+        RestaurantDaySlotIndex.objects.filter(
+            restaurant_id__in=restaurant_ids, date__gte=timezone.localdate(),
+        ).delete()
+
+
+def purge_past(today=None):
+    """Delete rows for dates before ``today``; they are never read again. Returns the count."""
+    today = today or timezone.localdate()
+    deleted, _ = RestaurantDaySlotIndex.objects.filter(date__lt=today).delete()
+    return deleted
+
+
+def _remaining(entry, now):
+    capacity = entry.get('capacity') or 0
+    if capacity == 0:
+        return None  # Unlimited
+    held = 0
+    for expires_at, party_size in entry.get('holds') or []:
+        if dt.datetime.fromisoformat(expires_at) > now:
+            held += party_size
+    return max(0, capacity - (entry.get('booked') or 0) - held)
+
+
+def _effective_status(entry, day, now):
+    """Mirror BookingSlot.effective_status() from the stored inputs."""
+    if entry.get('status') == 'closed':
+        return 'closed'
+    hh, mm = map(int, entry['time'].split(':'))
+    start_dt = timezone.make_aware(dt.datetime.combine(day, dt.time(hh, mm)), timezone.get_current_timezone())
+    if start_dt < now:
+        return 'past'
+    rem = _remaining(entry, now)
+    if rem is not None and rem <= 0:
+        return 'full'
+    if (start_dt - now).total_seconds() < (entry.get('lead_time_minutes') or 0) * 60:
+        return 'closed'
+    return 'open'
+
+
+def feed_slots(entries, day, now=None, min_discount=None, time_bucket=None):
+    """Turn stored entries into feed slot dicts as of ``now``.
+
+    Drops past times for today, real slots that are not bookable, entries below
+    ``min_discount`` and, optionally, times outside ``time_bucket``.
+    """
+    now = now or timezone.localtime()
+    now_minutes = now.hour * 60 + now.minute
+    is_today = day == now.date()
+    items = []
+    for entry in entries:
+        hh, mm = map(int, entry['time'].split(':'))
+        if is_today and hh * 60 + mm <= now_minutes:
+            continue
+        if min_discount is not None and entry['discount'] < min_discount:
+            continue
+        if time_bucket in ('lunch', 'afternoon', 'dinner', 'late') and _bucket(hh) != time_bucket:
+            continue
+        if entry.get('slot_id'):
+            if _effective_status(entry, day, now) != 'open':
+                continue
+            rem = _remaining(entry, now)
+            cap = rem if rem is not None else UNLIMITED_CAPACITY
+            items.append({'slot_id': str(entry['slot_id']), 'time': entry['time'], 'discount': entry['discount'], 'capacity': cap})
+        else:
+            # Synthetic slot: no real BookingSlot yet, the frontend treats it as a non-bookable offer time.
+            items.append({'slot_id': None, 'time': entry['time'], 'discount': entry['discount'], 'capacity': UNLIMITED_CAPACITY})
+    return items
+
+
+def _bucket(h: int):
+    return 'lunch' if 11 <= h < 14 else 'afternoon' if 14 <= h < 17 else 'dinner' if 17 <= h < 21 else 'late'
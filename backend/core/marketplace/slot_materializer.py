@@ -0,0 +1,92 @@
+"""Expand active offers into real BookingSlots ahead of time.
+
+Every half-hour bin an offer covers (see marketplace.slot_engine) becomes a
+30-minute BookingSlot, so the feed and the timeslots endpoints can hand out
+real slot ids and the read path never has to create slots. The slots carry
+no discount of their own: the offers keep supplying it at read time, so
+lowering or deactivating an offer is reflected immediately instead of being
+frozen into the slots. Bins that already hold a slot for that restaurant and
+date are left alone, as are times already past.
+
+Restaurants are processed in chunks: per chunk one offers query, one
+timeslots query, one query for existing slots and batched
+bulk_create(ignore_conflicts=True) inserts, so concurrent runs (or shards of
+one run, see ``shard``) never fail on the (restaurant, date, start_time)
+unique constraint. bulk_create skips signals, so the slot index and response
+cache of every restaurant that gained slots are invalidated explicitly.
+"""
+import datetime as dt
+
+from django.db import transaction
+from django.utils import timezone
+
+from marketplace import cache as response_cache
+from marketplace import slot_engine, slot_index
+from marketplace.models import BookingSlot, Offer
+
+DEFAULT_DAYS = 14
+DEFAULT_CHUNK_SIZE = 50
+INSERT_BATCH_SIZE = 500
+
+
+def candidate_restaurant_ids(restaurant_ids=None, start=None, end=None, shard=0, shards=1):
+    """Ids of restaurants with active offers overlapping [start, end], in this shard."""
+    qs = Offer.objects.filter(is_active=True, restaurant__is_active=True)
+    if start is not None:
+        qs = qs.filter(end_date__gte=start)
+    if end is not None:
+        qs = qs.filter(start_date__lte=end)
+    if restaurant_ids:
+        qs = qs.filter(restaurant_id__in=restaurant_ids)
+    ids = sorted(set(qs.values_list('restaurant_id', flat=True)))
+    return [rid for rid in ids if rid % shards == shard]
+
+
+def plan_chunk(restaurant_ids, start, end, now=None, capacity=0, min_party_size=1, max_party_size=20):
+    """Unsaved BookingSlots for every offer-covered bin without a slot yet."""
+    now = now or timezone.localtime()
+    tz = timezone.get_current_timezone()
+    grids = slot_engine.build_range_grids(restaurant_ids, start, end)
+    taken = set()
+    existing = BookingSlot.objects.filter(restaurant_id__in=restaurant_ids, date__gte=start, date__lte=end)
+    for rid, day, start_time in existing.values_list('restaurant_id', 'date', 'start_time'):
+        taken.add((rid, day, slot_engine.bin_of(start_time)))
+    slots = []
+    for rid, by_day in grids.items():
+        for day, grid in by_day.items():
+            for index in grid.bins():
+                if (rid, day, index) in taken:
+                    continue
+                starts_at = timezone.make_aware(dt.datetime.combine(day, slot_engine.start_time_of(index)), tz)
+                if starts_at <= now:
+                    continue
+                slots.append(BookingSlot(
+                    restaurant_id=rid,
+                    date=day,
+                    start_time=starts_at.time(),
+                    end_time=(starts_at + dt.timedelta(minutes=slot_engine.BIN_MINUTES)).time(),
+                    discount_percentage=None,
+                    capacity=capacity,
+                    min_party_size=min_party_size,
+                    max_party_size=max_party_size,
+                    status='open',
+                    is_active=True,
+                ))
+    return slots
+
+
+def materialize(restaurant_ids, start, end, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, **slot_defaults):
+    """Create missing slots for ``restaurant_ids`` over [start, end]; returns the planned slot count."""
+    planned = 0
+    for i in range(0, len(restaurant_ids), chunk_size):
+        chunk = restaurant_ids[i:i + chunk_size]
+        slots = plan_chunk(chunk, start, end, **slot_defaults)
+        planned += len(slots)
+        if dry_run or not slots:
+            continue
+        with transaction.atomic():
+            BookingSlot.objects.bulk_create(slots, batch_size=INSERT_BATCH_SIZE, ignore_conflicts=True)
+        for rid in {s.restaurant_id for s in slots}:
+            slot_index.invalidate(rid)
+            response_cache.bump_restaurant(rid)
+    return planned
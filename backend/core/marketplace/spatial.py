@@ -0,0 +1,171 @@
+"""Nearest-restaurant lookups, optionally served from an in-process KD-tree.
+
+nearest() is the single entry point for radius / k-nearest queries. It
+answers from the geohash ring search in marketplace.geo unless
+SPATIAL_INDEX_ENABLED is set (off by default), in which case each worker
+also keeps a KD-tree over the active restaurants' positions as unit vectors
+on the sphere, where straight-line (chord) distance orders points exactly
+like great-circle distance, and lookups run purely in memory.
+
+The tree is stale when:
+
+- the shared locations version (marketplace.cache.bump_locations, bumped
+  whenever a restaurant is created, deleted, moved, (de)activated or
+  bulk-updated) has moved;
+- a restaurant changed in this process (invalidate(), called by signals), so
+  a worker sees its own writes even when the shared cache is unreachable;
+- the tree is older than SPATIAL_INDEX_MAX_AGE seconds.
+
+Building the tree is O(N log N) in Python and happens on a request, so a
+worker rebuilds at most once every SPATIAL_INDEX_MIN_REBUILD_INTERVAL
+seconds; while the tree is stale in between, lookups use the geohash search,
+which always reads current rows.
+"""
+import heapq
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from marketplace import cache as response_cache
+from marketplace import geo
+from marketplace.geo import EARTH_RADIUS_KM
+
+SPATIAL_INDEX_MAX_AGE = 300
+SPATIAL_INDEX_MIN_REBUILD_INTERVAL = 60
+
+_lock = threading.Lock()
+_index = None
+_dirty = False
+_last_build = None
+
+
+def enabled():
+    return getattr(settings, 'SPATIAL_INDEX_ENABLED', False)
+
+
+def _unit_vector(latitude, longitude):
+    phi, lam = math.radians(latitude), math.radians(longitude)
+    cos_phi = math.cos(phi)
+    return (cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi))
+
+
+def _chord_for_km(distance_km):
+    return 2.0 * math.sin(min(distance_km / EARTH_RADIUS_KM, math.pi) / 2.0)
+
+
+def _km_for_chord(chord):
+    return 2.0 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2.0))
+
+
+class KDTree:
+    """Implicit balanced 3-d tree: the median of each range is its node."""
+
+    def __init__(self, items):
+        # items: [(id, (x, y, z))]
+        self.items = list(items)
+        self._build(0, len(self.items), 0)
+
+    def _build(self, lo, hi, axis):
+        if hi - lo <= 1:
+            return
+        segment = sorted(self.items[lo:hi], key=lambda item: item[1][axis])
+        self.items[lo:hi] = segment
+        mid = (lo + hi) // 2
+        self._build(lo, mid, (axis + 1) % 3)
+        self._build(mid + 1, hi, (axis + 1) % 3)
+
+    def __len__(self):
+        return len(self.items)
+
+    def nearest(self, point, k, max_distance):
+        """Up to ``k`` (distance, id) pairs within ``max_distance`` of ``point``, nearest first."""
+        if k <= 0 or not self.items:
+            return []
+        heap = []  # max-heap of (-squared distance, id)
+        limit_sq = max_distance * max_distance
+        items = self.items
+        px, py, pz = point
+
+        def visit(lo, hi, axis):
+            if lo >= hi:
+                return
+            mid = (lo + hi) // 2
+            item_id, (x, y, z) = items[mid]
+            dist_sq = (x - px) ** 2 + (y - py) ** 2 + (z - pz) ** 2
+            bound = -heap[0][0] if len(heap) == k else limit_sq
+            if dist_sq <= bound:
+                if len(heap) == k:
+                    heapq.heapreplace(heap, (-dist_sq, item_id))
+                else:
+                    heapq.heappush(heap, (-dist_sq, item_id))
+            diff = point[axis] - items[mid][1][axis]
+            near, far = ((lo, mid), (mid + 1, hi)) if diff < 0 else ((mid + 1, hi), (lo, mid))
+            next_axis = (axis + 1) % 3
+            visit(near[0], near[1], next_axis)
+            bound = -heap[0][0] if len(heap) == k else limit_sq
+            if diff * diff <= bound:
+                visit(far[0], far[1], next_axis)
+
+        visit(0, len(items), 0)
+        return sorted((math.sqrt(-neg), item_id) for neg, item_id in heap)
+
+
+class SpatialIndex:
+    def __init__(self, version):
+        from marketplace.models import Restaurant
+        rows = Restaurant.objects.filter(
+            is_active=True, latitude__isnull=False, longitude__isnull=False,
+        ).values_list('id', 'latitude', 'longitude')
+        self.tree = KDTree((rid, _unit_vector(float(lat), float(lng))) for rid, lat, lng in rows)
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def nearest(self, latitude, longitude, radius_km, limit):
+        """[(distance_km, restaurant_id)] nearest first."""
+        pairs = self.tree.nearest(_unit_vector(latitude, longitude), limit, _chord_for_km(radius_km))
+        return [(_km_for_chord(chord), rid) for chord, rid in pairs]
+
+
+def invalidate():
+    """Mark this worker's index stale (restaurant saved or deleted here)."""
+    global _dirty
+    _dirty = True
+
+
+def _is_fresh(index, version):
+    return index is not None and not _dirty and index.version == version \
+        and time.monotonic() - index.built_at < SPATIAL_INDEX_MAX_AGE
+
+
+def get_index():
+    """Return a current index, or None while it is stale and a rebuild is not yet due."""
+    global _index, _dirty, _last_build
+    version = response_cache.locations_version()
+    index = _index
+    if _is_fresh(index, version):
+        return index
+    with _lock:
+        index = _index
+        if _is_fresh(index, version):
+            return index
+        if _last_build is not None and time.monotonic() - _last_build < SPATIAL_INDEX_MIN_REBUILD_INTERVAL:
+            return None
+        # Clear first so writes during the build mark the new index stale
+        _dirty = False
+        _last_build = time.monotonic()
+        index = _index = SpatialIndex(version)
+    return index
+
+
+def nearest(latitude, longitude, radius_km, limit):
+    """[(distance_km, restaurant_id)] for the ``limit`` nearest active restaurants within ``radius_km``."""
+    if limit <= 0 or radius_km <= 0:
+        return []
+    index = get_index() if enabled() else None
+    if index is not None:
+        return index.nearest(latitude, longitude, radius_km, limit)
+    from marketplace.models import Restaurant
+    rows = Restaurant.objects.filter(is_active=True).only('id', 'geohash', 'latitude', 'longitude')
+    return [(d, r.id) for d, r in geo.nearest(rows, latitude, longitude, radius_km, limit)]
@@ -1,10 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from django.urls import reverse
 from django.utils import timezone
-from .models import Restaurant, Offer
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from .models import City, Restaurant, Offer, OfferTimeSlot, BookingSlot, Booking, BookingHold, RestaurantDaySlotIndex
+from . import slot_index, slot_engine, geo, spatial
 import datetime
+import io
+from unittest import mock
+from django.core.management import call_command
 
 
 class AdminOfferApiTests(TestCase):
@@ -77,3 +83,1022 @@ class AdminOfferApiTests(TestCase):
 		resp = self.client.post("/api/admin/offers/", self._valid_offer_payload(), format="json")
 		self.assertEqual(resp.status_code, 403)
 
+
+class SlotIndexTests(TestCase):
+	def setUp(self):
+		self.restaurant = Restaurant.objects.create(name="Index Resto", address="1 Road, Phnom Penh")
+		self.day = timezone.localdate() + datetime.timedelta(days=1)
+		self.offer = Offer.objects.create(
+			restaurant=self.restaurant, title="Dinner", description="", offer_type="percentage",
+			discount_percentage=20, start_date=self.day, end_date=self.day,
+			start_time=datetime.time(18, 0), end_time=datetime.time(19, 0), available_quantity=10,
+		)
+		OfferTimeSlot.objects.create(
+			offer=self.offer, restaurant=self.restaurant, start_time=datetime.time(18, 0),
+			end_time=datetime.time(18, 30), discount_percentage=40,
+		)
+		self.slot = BookingSlot.objects.create(
+			restaurant=self.restaurant, date=self.day, start_time=datetime.time(18, 0),
+			end_time=datetime.time(18, 30), capacity=10,
+		)
+
+	def test_entries_merge_offer_slots_with_booking_slot_capacity(self):
+		entries = slot_index.get_entries([self.restaurant.id], self.day)[self.restaurant.id]
+		self.assertEqual([e["time"] for e in entries], ["18:00"])
+		self.assertEqual(entries[0]["discount"], 40)
+		self.assertEqual(entries[0]["slot_id"], self.slot.id)
+		self.assertTrue(RestaurantDaySlotIndex.objects.filter(restaurant=self.restaurant, date=self.day).exists())
+
+		items = slot_index.feed_slots(entries, self.day)
+		self.assertEqual(items[0]["capacity"], 10)
+
+	def test_booking_invalidates_index_row(self):
+		slot_index.get_entries([self.restaurant.id], self.day)
+		Booking.objects.create(
+			restaurant=self.restaurant, slot=self.slot, number_of_people=4,
+			booking_time=timezone.now() + datetime.timedelta(days=1),
+		)
+		self.assertFalse(RestaurantDaySlotIndex.objects.filter(restaurant=self.restaurant, date=self.day).exists())
+		entries = slot_index.get_entries([self.restaurant.id], self.day)[self.restaurant.id]
+		self.assertEqual(slot_index.feed_slots(entries, self.day)[0]["capacity"], 6)
+
+	def test_purge_drops_past_rows(self):
+		slot_index.get_entries([self.restaurant.id], self.day)
+		yesterday = timezone.localdate() - datetime.timedelta(days=1)
+		RestaurantDaySlotIndex.objects.create(restaurant=self.restaurant, date=yesterday, slots=[])
+		out = io.StringIO()
+		call_command("purge_expired_offers", stdout=out)
+		self.assertIn("Slot index rows: 1", out.getvalue())
+		self.assertEqual(list(RestaurantDaySlotIndex.objects.values_list("date", flat=True)), [self.day])
+
+
+class RestaurantCoverTests(TestCase):
+	def test_cover_download_is_opt_in_and_runs_after_commit(self):
+		with mock.patch("marketplace.signals._download_image", return_value=(None, None)) as download:
+			Restaurant.objects.create(name="Photo", address="Street", image_url="https://example.com/a.jpg")
+			download.assert_not_called()
+			with self.settings(RESTAURANT_COVER_AUTO_DOWNLOAD=True):
+				with self.captureOnCommitCallbacks() as callbacks:
+					Restaurant.objects.create(name="Photo 2", address="Street", image_url="https://example.com/b.jpg")
+				download.assert_not_called()
+				for callback in callbacks:
+					callback()
+			download.assert_called_once_with("https://example.com/b.jpg")
+
+
+class FeedPaginationTests(TestCase):
+	def setUp(self):
+		today = timezone.localdate()
+		for i in range(15):
+			restaurant = Restaurant.objects.create(name=f"Resto {i}", address="Street", rating=i % 3)
+			Offer.objects.create(
+				restaurant=restaurant, title=f"Deal {i}", description="", offer_type="percentage",
+				discount_percentage=10 + i % 4, start_date=today, end_date=today,
+				start_time=datetime.time(23, 0), end_time=datetime.time(23, 30), available_quantity=5,
+			)
+		self.client = APIClient()
+
+	def test_keyset_cursor_walks_every_offer_once(self):
+		for sort in ("recommended", "highest_discount", "most_popular", "nearest_time"):
+			seen = []
+			cursor = None
+			while True:
+				url = f"/api/offers/feed/?sort={sort}" + (f"&cursor={cursor}" if cursor else "")
+				resp = self.client.get(url)
+				self.assertEqual(resp.status_code, 200, resp.content)
+				seen += [card["offer_id"] for card in resp.data["results"]]
+				cursor = resp.data["next_cursor"]
+				self.assertEqual(resp.data["has_more"], cursor is not None)
+				if not cursor:
+					break
+			self.assertEqual(len(seen), 15, sort)
+			self.assertEqual(len(set(seen)), 15, sort)
+
+	def test_tampered_cursor_restarts_from_first_page(self):
+		from marketplace import pagination
+		first = self.client.get("/api/offers/feed/?sort=recommended").data["results"]
+		tampered = [
+			{"sort": "nearest_time", "after": ["25:99", "x"]},
+			{"sort": "nearest_time", "after": [None, 1]},
+			{"sort": "recommended", "after": ["yes", "x", "not a date", 1.5]},
+			{"sort": "highest_discount", "after": ["NaN", {}, 3]},
+			{"sort": "highest_discount", "after": ["9.999", "1e999999", 3]},
+			{"sort": "most_popular", "after": [[], "2026-13-01", "1"]},
+			{"sort": "bogus", "after": [1]},
+			{"phase": "empty", "after": "x"},
+		]
+		for payload in tampered:
+			sort = payload.get("sort", "recommended")
+			resp = self.client.get(f"/api/offers/feed/?sort={sort}&cursor={pagination.encode_cursor(payload)}")
+			self.assertEqual(resp.status_code, 200, payload)
+			if sort == "recommended":
+				self.assertEqual(resp.data["results"], first, payload)
+		self.assertEqual(pagination.decode_cursor(pagination.encode_cursor({"sort": "nearest_time", "after": ["25:99", 1]})), {})
+
+
+class FeedEmptyRestaurantsTests(TestCase):
+	def test_full_last_offer_page_continues_with_empty_restaurants(self):
+		today = timezone.localdate()
+		for i in range(12):
+			restaurant = Restaurant.objects.create(name=f"Resto {i}", address="Street", latitude=11.55, longitude=104.92)
+			Offer.objects.create(
+				restaurant=restaurant, title=f"Deal {i}", description="", offer_type="percentage",
+				discount_percentage=10, start_date=today, end_date=today,
+				start_time=datetime.time(23, 0), end_time=datetime.time(23, 30), available_quantity=5,
+			)
+		empty = Restaurant.objects.create(name="No deals", address="Street", latitude=11.55, longitude=104.92)
+		client = APIClient()
+
+		resp = client.get("/api/offers/feed/?city=phnompenh")
+		self.assertEqual(len(resp.data["results"]), 12)
+		self.assertTrue(resp.data["has_more"])
+		resp = client.get(f"/api/offers/feed/?city=phnompenh&cursor={resp.data['next_cursor']}")
+		self.assertEqual([int(c["restaurant_id"]) for c in resp.data["results"]], [empty.id])
+		self.assertIsNone(resp.data["next_cursor"])
+
+
+class FeedBatchLoadingTests(TestCase):
+	def _add_restaurants(self, count):
+		day = timezone.localdate()
+		for i in range(count):
+			restaurant = Restaurant.objects.create(name=f"Batch {i}", address="Street")
+			offer = Offer.objects.create(
+				restaurant=restaurant, title="Late", description="", offer_type="percentage",
+				discount_percentage=15, start_date=day, end_date=day,
+				start_time=datetime.time(23, 0), end_time=datetime.time(23, 59), available_quantity=5,
+			)
+			OfferTimeSlot.objects.create(
+				offer=offer, restaurant=restaurant, start_time=datetime.time(23, 30),
+				end_time=datetime.time(23, 59), discount_percentage=30,
+			)
+			BookingSlot.objects.create(
+				restaurant=restaurant, date=day, start_time=datetime.time(23, 30),
+				end_time=datetime.time(23, 59), capacity=8,
+			)
+
+	def _cold_feed_queries(self):
+		RestaurantDaySlotIndex.objects.all().delete()
+		with CaptureQueriesContext(connection) as ctx:
+			resp = APIClient().get("/api/offers/feed/")
+		self.assertEqual(resp.status_code, 200)
+		return len(resp.data["results"]), len(ctx.captured_queries)
+
+	def test_query_count_does_not_grow_with_page_size(self):
+		self._add_restaurants(2)
+		small_cards, small_queries = self._cold_feed_queries()
+		self._add_restaurants(10)
+		large_cards, large_queries = self._cold_feed_queries()
+		self.assertEqual((small_cards, large_cards), (2, 12))
+		self.assertEqual(small_queries, large_queries)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ResponseCacheTests(TestCase):
+	def setUp(self):
+		from django.core.cache import cache
+		cache.clear()
+		day = timezone.localdate()
+		self.restaurant = Restaurant.objects.create(name="Cached", address="Street")
+		self.offer = Offer.objects.create(
+			restaurant=self.restaurant, title="Late", description="", offer_type="percentage",
+			discount_percentage=15, start_date=day, end_date=day,
+			start_time=datetime.time(23, 0), end_time=datetime.time(23, 30), available_quantity=5,
+		)
+		self.client = APIClient()
+
+	def _feed_queries(self):
+		with CaptureQueriesContext(connection) as ctx:
+			resp = self.client.get("/api/offers/feed/?sort=recommended")
+		self.assertEqual(resp.status_code, 200)
+		return resp, len(ctx.captured_queries)
+
+	def test_feed_served_from_cache_until_restaurant_changes(self):
+		first, _ = self._feed_queries()
+		self.assertEqual(first.data["results"][0]["reservations_count"], 0)
+		_, cached_queries = self._feed_queries()
+		self.assertEqual(cached_queries, 0)
+
+		Booking.objects.create(restaurant=self.restaurant, number_of_people=2, booking_time=timezone.now())
+		refreshed, queries = self._feed_queries()
+		self.assertGreater(queries, 0)
+		self.assertEqual(refreshed.data["results"][0]["reservations_count"], 1)
+
+	def test_new_offer_invalidates_cached_feed(self):
+		self._feed_queries()
+		other = Restaurant.objects.create(name="Newcomer", address="Street")
+		Offer.objects.create(
+			restaurant=other, title="Fresh", description="", offer_type="percentage",
+			discount_percentage=20, start_date=self.offer.start_date, end_date=self.offer.end_date,
+			start_time=datetime.time(23, 0), end_time=datetime.time(23, 30), available_quantity=5,
+		)
+		resp, _ = self._feed_queries()
+		self.assertEqual(len(resp.data["results"]), 2)
+
+
+class BookingSlotCapacityTests(TestCase):
+	def test_with_capacity_matches_property_in_one_query(self):
+		restaurant = Restaurant.objects.create(name="Capacity", address="Street")
+		day = timezone.localdate() + datetime.timedelta(days=2)
+		for hour in range(10, 22):
+			slot = BookingSlot.objects.create(
+				restaurant=restaurant, date=day, start_time=datetime.time(hour, 0),
+				end_time=datetime.time(hour, 30), capacity=10,
+			)
+			Booking.objects.create(restaurant=restaurant, slot=slot, number_of_people=3, booking_time=timezone.now())
+			BookingHold.objects.create(hold_id=f"h{hour}", slot=slot, party_size=2, expires_at=timezone.now() + datetime.timedelta(minutes=5))
+			BookingHold.objects.create(hold_id=f"x{hour}", slot=slot, party_size=4, expires_at=timezone.now() - datetime.timedelta(minutes=5))
+
+		with self.assertNumQueries(1):
+			slots = list(BookingSlot.objects.with_capacity().filter(restaurant=restaurant, date=day))
+			remaining = {s.remaining_capacity for s in slots}
+			statuses = {s.effective_status() for s in slots}
+		self.assertEqual(remaining, {5})
+		self.assertEqual(statuses, {"open"})
+		self.assertEqual(BookingSlot.objects.get(id=slots[0].id).remaining_capacity, 5)
+
+	def test_hold_expiry_is_checked_when_the_query_runs(self):
+		restaurant = Restaurant.objects.create(name="Capacity", address="Street")
+		slot = BookingSlot.objects.create(
+			restaurant=restaurant, date=timezone.localdate() + datetime.timedelta(days=2),
+			start_time=datetime.time(19, 0), end_time=datetime.time(19, 30), capacity=10,
+		)
+		# Built an hour ago, like the class-level querysets of the booking slot views
+		with mock.patch("django.utils.timezone.now", return_value=timezone.now() - datetime.timedelta(hours=1)):
+			qs = BookingSlot.objects.with_capacity()
+		BookingHold.objects.create(hold_id="stale", slot=slot, party_size=4, expires_at=timezone.now() - datetime.timedelta(minutes=5))
+		BookingHold.objects.create(hold_id="live", slot=slot, party_size=2, expires_at=timezone.now() + datetime.timedelta(minutes=5))
+		self.assertEqual(qs.get(id=slot.id).remaining_capacity, 8)
+
+
+class OfferDaysMaskTests(TestCase):
+	def test_active_on_filters_weekday_in_sql(self):
+		restaurant = Restaurant.objects.create(name="Weekdays", address="Street")
+		monday = datetime.date(2030, 1, 7)
+		common = dict(
+			restaurant=restaurant, description="", offer_type="percentage", discount_percentage=10,
+			start_date=monday, end_date=monday + datetime.timedelta(days=6),
+			start_time=datetime.time(12, 0), end_time=datetime.time(13, 0), available_quantity=5,
+		)
+		weekdays = Offer.objects.create(title="Weekdays", days_of_week="0,1,2,3,4", **common)
+		every_day = Offer.objects.create(title="Every day", **common)
+		self.assertEqual(weekdays.days_mask, 0b0011111)
+		self.assertEqual(every_day.days_mask, 0b1111111)
+
+		self.assertEqual(set(Offer.objects.active_on(monday)), {weekdays, every_day})
+		self.assertEqual(set(Offer.objects.active_on(monday + datetime.timedelta(days=5))), {every_day})
+
+		weekdays.days_of_week = "5"
+		weekdays.save(update_fields=["days_of_week"])
+		self.assertEqual(set(Offer.objects.active_on(monday + datetime.timedelta(days=5))), {weekdays, every_day})
+
+
+class RestaurantCityTests(TestCase):
+	def test_city_resolved_on_save_and_used_by_feed(self):
+		today = timezone.localdate()
+		in_box = Restaurant.objects.create(name="Riverside", address="Street 1", latitude=11.55, longitude=104.92)
+		by_address = Restaurant.objects.create(name="Old Town", address="Pub Street, Siem Riep")
+		elsewhere = Restaurant.objects.create(name="Elsewhere", address="Main Road, Takeo")
+		self.assertEqual(in_box.city.name, "Phnom Penh")
+		self.assertEqual(by_address.city.name, "Siem Reap")
+		self.assertIsNone(elsewhere.city)
+		self.assertEqual(elsewhere.city_label, "Takeo")
+		for restaurant in (in_box, by_address, elsewhere):
+			Offer.objects.create(
+				restaurant=restaurant, title="Late", description="", offer_type="percentage",
+				discount_percentage=10, start_date=today, end_date=today,
+				start_time=datetime.time(23, 0), end_time=datetime.time(23, 30), available_quantity=5,
+			)
+
+		resp = APIClient().get("/api/offers/feed/?city=phnompenh")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual([(c["name"], c["city"]) for c in resp.data["results"]], [("Riverside", "Phnom Penh")])
+
+		Restaurant.objects.filter(pk=in_box.pk).update(city=None)
+		call_command("assign_restaurant_cities", stdout=io.StringIO())
+		in_box.refresh_from_db()
+		self.assertEqual(in_box.city.name, "Phnom Penh")
+
+	def test_off_box_coordinates_fall_back_to_address(self):
+		restaurant = Restaurant.objects.create(name="Off pin", address="Street 5, Phnom Penh", latitude=12.5, longitude=104.92)
+		self.assertEqual(restaurant.city.name, "Phnom Penh")
+
+	def test_seed_migration_backfills_existing_restaurants(self):
+		import importlib
+		from django.apps import apps
+		seed = importlib.import_module("marketplace.migrations.0019_seed_cities")
+		in_box = Restaurant.objects.create(name="Riverside", address="Street 1", latitude=11.55, longitude=104.92)
+		by_address = Restaurant.objects.create(name="Old Town", address="Pub Street, Siem Riep", latitude=1.0, longitude=1.0)
+		elsewhere = Restaurant.objects.create(name="Elsewhere", address="Main Road, Takeo")
+		Restaurant.objects.update(city=None)
+		seed.seed_cities(apps, None)
+		cities = dict(Restaurant.objects.values_list("id", "city__name"))
+		self.assertEqual(cities, {in_box.id: "Phnom Penh", by_address.id: "Siem Reap", elsewhere.id: None})
+
+
+class ReservationCounterTests(TestCase):
+	def test_counters_follow_booking_lifecycle(self):
+		user = get_user_model().objects.create_user(username="diner", password="pw")
+		restaurant = Restaurant.objects.create(name="Counted", address="Street")
+		day = timezone.localdate()
+		offer = Offer.objects.create(
+			restaurant=restaurant, title="Deal", description="", offer_type="percentage",
+			discount_percentage=10, start_date=day, end_date=day,
+			start_time=datetime.time(12, 0), end_time=datetime.time(13, 0), available_quantity=5,
+		)
+		when = timezone.now() + datetime.timedelta(days=1)
+		via_offer = Booking.objects.create(diner=user, offer=offer, booking_time=when, number_of_people=2)
+		direct = Booking.objects.create(diner=user, restaurant=restaurant, booking_time=when, number_of_people=2)
+		restaurant.refresh_from_db()
+		offer.refresh_from_db()
+		self.assertEqual((restaurant.reservations_count, offer.reservations_count), (2, 1))
+
+		via_offer.status = "cancelled"
+		via_offer.save()
+		direct.delete()
+		restaurant.refresh_from_db()
+		offer.refresh_from_db()
+		self.assertEqual((restaurant.reservations_count, offer.reservations_count), (0, 0))
+
+		Booking.objects.filter(pk=via_offer.pk).update(status="confirmed")
+		call_command("recount_reservations", stdout=io.StringIO())
+		restaurant.refresh_from_db()
+		offer.refresh_from_db()
+		self.assertEqual((restaurant.reservations_count, offer.reservations_count), (1, 1))
+
+
+class FullTextSearchTests(TestCase):
+	def test_feed_and_restaurant_search_use_index(self):
+		today = timezone.localdate()
+		noodles = Restaurant.objects.create(name="Noodle House", address="Street 1", cuisine_type="asian")
+		grill = Restaurant.objects.create(name="Grill Bar", address="Noodle Lane", cuisine_type="western")
+		for restaurant, title in ((noodles, "Lunch set"), (grill, "Steak night")):
+			Offer.objects.create(
+				restaurant=restaurant, title=title, description="", offer_type="percentage",
+				discount_percentage=10, start_date=today, end_date=today,
+				start_time=datetime.time(23, 0), end_time=datetime.time(23, 30), available_quantity=5,
+			)
+		client = APIClient()
+
+		resp = client.get("/api/offers/feed/?q=nood")
+		self.assertEqual([c["name"] for c in resp.data["results"]], ["Noodle House"])
+
+		# Renaming the restaurant reindexes its offers
+		grill.name = "Steakhouse"
+		grill.save()
+		resp = client.get("/api/offers/feed/?q=steakhouse")
+		self.assertEqual([c["name"] for c in resp.data["results"]], ["Steakhouse"])
+
+		# Name matches outrank address matches
+		resp = client.get("/api/restaurants/?search=noodle")
+		results = resp.data["results"] if isinstance(resp.data, dict) else resp.data
+		self.assertEqual([r["name"] for r in results], ["Noodle House", "Steakhouse"])
+
+
+class SlotEngineTests(TestCase):
+	def test_grid_merges_offers_timeslots_and_slots(self):
+		day = datetime.date(2030, 1, 7)
+		window = Offer(id=1, discount_percentage=10, start_time=datetime.time(12, 0), end_time=datetime.time(13, 30))
+		by_amount = Offer(id=2, discount_amount=5, original_price=20, start_time=datetime.time(0, 0), end_time=datetime.time(0, 0))
+		grid = slot_engine.DayGrid(day)
+		grid.add_offer(window)
+		grid.add_offer(by_amount, [OfferTimeSlot(start_time=datetime.time(12, 30)), OfferTimeSlot(start_time=datetime.time(18, 0), discount_percentage=40)])
+		grid.add_slots([BookingSlot(id=7, start_time=datetime.time(13, 0), discount_percentage=30), BookingSlot(id=8, start_time=datetime.time(20, 0))], add_missing=False)
+
+		self.assertEqual([slot_engine.time_of(i) for i in grid.bins()], ["12:00", "12:30", "13:00", "18:00"])
+		# The 12:30 timeslot has no discount of its own and inherits the offer's 5/20 = 25%
+		self.assertEqual([grid.discount[i] for i in grid.bins()], [10.0, 25.0, 30.0, 40.0])
+		self.assertEqual([grid.source[i] for i in grid.bins()], ["offer", "offer", "both", "offer"])
+		self.assertEqual(grid.best_offer_id(24, 26), 2)
+		self.assertIsNone(grid.slot[slot_engine.bin_of("20:00")])
+
+	def test_times_without_usable_discount_stay_listed_at_zero(self):
+		day = datetime.date(2030, 1, 7)
+		special = Offer(id=1, offer_type="special", start_time=datetime.time(12, 0), end_time=datetime.time(13, 0))
+		no_price = Offer(id=2, discount_amount=5, start_time=datetime.time(18, 0), end_time=datetime.time(18, 30))
+		inherited = Offer(id=3, discount_percentage=15, start_time=datetime.time(0, 0), end_time=datetime.time(0, 0))
+		grid = slot_engine.DayGrid(day)
+		grid.add_offer(special)
+		grid.add_offer(no_price)
+		grid.add_offer(inherited, [OfferTimeSlot(start_time=datetime.time(20, 0))])
+		self.assertEqual(
+			[(slot_engine.time_of(i), grid.discount[i], grid.offer_id[i]) for i in grid.bins()],
+			[("12:00", 0.0, 1), ("12:30", 0.0, 1), ("18:00", 0.0, 2), ("20:00", 15.0, 3)],
+		)
+
+
+class TimeslotRangeTests(TestCase):
+	def test_range_mode_loads_window_in_bulk(self):
+		restaurant = Restaurant.objects.create(name="Range", address="Street")
+		start = timezone.localdate() + datetime.timedelta(days=1)
+		offer = Offer.objects.create(
+			restaurant=restaurant, title="Dinner", description="", offer_type="percentage",
+			discount_percentage=20, start_date=start, end_date=start + datetime.timedelta(days=13),
+			start_time=datetime.time(19, 0), end_time=datetime.time(20, 0), available_quantity=5,
+		)
+		OfferTimeSlot.objects.create(offer=offer, restaurant=restaurant, start_time=datetime.time(19, 0), end_time=datetime.time(19, 30), discount_percentage=30)
+		BookingSlot.objects.create(restaurant=restaurant, date=start + datetime.timedelta(days=2), start_time=datetime.time(21, 0), end_time=datetime.time(21, 30), capacity=4)
+		end = start + datetime.timedelta(days=13)
+		client = APIClient()
+		url = f"/api/offers/timeslots/?restaurant={restaurant.id}&start={start}&end={end}"
+
+		with CaptureQueriesContext(connection) as ctx:
+			resp = client.get(url)
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertLessEqual(len(ctx.captured_queries), 4)
+		self.assertEqual(len(resp.data["dates"]), 14)
+		third = resp.data["dates"][2]
+		self.assertEqual([(t["time"], t["source"]) for t in third["timeslots"]], [("19:00", "offer"), ("21:00", "slot")])
+
+		single = client.get(f"/api/offers/timeslots/?restaurant={restaurant.id}&date={start + datetime.timedelta(days=2)}")
+		self.assertEqual(single.data["timeslots"], third["timeslots"])
+
+	def test_batch_query_count_is_independent_of_restaurant_count(self):
+		day = timezone.localdate() + datetime.timedelta(days=1)
+		ids = []
+		for i in range(30):
+			restaurant = Restaurant.objects.create(name=f"Batch {i}", address="Street")
+			offer = Offer.objects.create(
+				restaurant=restaurant, title="Lunch", description="", offer_type="percentage",
+				discount_percentage=10 + i, start_date=day, end_date=day,
+				start_time=datetime.time(12, 0), end_time=datetime.time(13, 0), available_quantity=5,
+			)
+			OfferTimeSlot.objects.create(offer=offer, restaurant=restaurant, start_time=datetime.time(12, 0), end_time=datetime.time(12, 30))
+			BookingSlot.objects.create(restaurant=restaurant, date=day, start_time=datetime.time(12, 0), end_time=datetime.time(12, 30), capacity=4)
+			ids.append(restaurant.id)
+		client = APIClient()
+
+		def run(restaurant_ids):
+			with CaptureQueriesContext(connection) as ctx:
+				resp = client.get(f"/api/offers/timeslots/batch/?date={day}&restaurants={','.join(map(str, restaurant_ids))}")
+			self.assertEqual(resp.status_code, 200, resp.content)
+			return resp, len(ctx.captured_queries)
+
+		few, few_queries = run(ids[:2])
+		many, many_queries = run(ids)
+		self.assertEqual(few_queries, many_queries)
+		self.assertEqual(len(many.data["results"]), 30)
+		self.assertEqual(many.data["results"][1]["timeslots"][0]["discount_percent"], 11.0)
+		self.assertEqual(many.data["results"][1]["timeslots"][0]["source"], "both")
+
+	def test_range_and_batch_match_single_date_for_special_offers(self):
+		start = timezone.localdate() + datetime.timedelta(days=1)
+		restaurant = Restaurant.objects.create(name="Special", address="Street")
+		offer = Offer.objects.create(
+			restaurant=restaurant, title="Free dessert", description="", offer_type="special",
+			start_date=start, end_date=start + datetime.timedelta(days=1),
+			start_time=datetime.time(18, 0), end_time=datetime.time(19, 0), available_quantity=5,
+		)
+		OfferTimeSlot.objects.create(offer=offer, restaurant=restaurant, start_time=datetime.time(18, 0), end_time=datetime.time(18, 30))
+		client = APIClient()
+		single = client.get(f"/api/offers/timeslots/?restaurant={restaurant.id}&date={start}").data["timeslots"]
+		self.assertEqual([(t["time"], t["discount_percent"], t["source"]) for t in single], [("18:00", 0.0, "offer")])
+		ranged = client.get(f"/api/offers/timeslots/?restaurant={restaurant.id}&start={start}&end={start + datetime.timedelta(days=1)}")
+		self.assertEqual([d["timeslots"] for d in ranged.data["dates"]], [single, single])
+		batch = client.get(f"/api/offers/timeslots/batch/?date={start}&restaurants={restaurant.id}")
+		self.assertEqual(batch.data["results"][0]["timeslots"], single)
+
+
+class NearbyGeohashTests(TestCase):
+	def test_nearby_matches_brute_force(self):
+		import random
+		rng = random.Random(7)
+		points = []
+		for i in range(300):
+			lat, lng = 11.55 + rng.uniform(-0.08, 0.08), 104.92 + rng.uniform(-0.08, 0.08)
+			restaurant = Restaurant.objects.create(name=f"Geo {i}", address="Street", latitude=round(lat, 6), longitude=round(lng, 6))
+			self.assertEqual(restaurant.geohash, geo.encode(round(lat, 6), round(lng, 6)))
+			points.append((geo.haversine_km(11.55, 104.92, round(lat, 6), round(lng, 6)), restaurant.id))
+		client = APIClient()
+		for enabled in (True, False):
+			with self.settings(SPATIAL_INDEX_ENABLED=enabled):
+				for radius, limit in ((2, 5), (5, 20), (15, 50)):
+					resp = client.get(f"/api/restaurants/nearby/?lat=11.55&lng=104.92&radius_km={radius}&limit={limit}")
+					self.assertEqual(resp.status_code, 200, resp.content)
+					expected = [rid for d, rid in sorted(points) if d <= radius][:limit]
+					self.assertEqual([r["id"] for r in resp.data], expected, (enabled, radius))
+
+		# Moving a restaurant rebuilds the in-process index on the next lookup
+		moved = Restaurant.objects.get(id=points[-1][1])
+		moved.latitude, moved.longitude = 11.55, 104.92
+		moved.save()
+		resp = client.get("/api/restaurants/nearby/?lat=11.55&lng=104.92&radius_km=1&limit=1")
+		self.assertEqual([r["id"] for r in resp.data], [moved.id])
+
+	def test_radius_is_bounded(self):
+		Restaurant.objects.create(name="Far", address="Street", latitude=13.36, longitude=103.86)
+		client = APIClient()
+		for enabled in (True, False):
+			with self.settings(SPATIAL_INDEX_ENABLED=enabled):
+				for url in ("/api/restaurants/nearby/", "/api/restaurants/available_now/"):
+					for radius in ("inf", "nan", "-inf"):
+						resp = client.get(f"{url}?lat=11.55&lng=104.92&radius_km={radius}")
+						self.assertEqual(resp.status_code, 400, (url, radius))
+				# ~230 km away: outside the clamped radius
+				resp = client.get("/api/restaurants/nearby/?lat=11.55&lng=104.92&radius_km=20000")
+				self.assertEqual(resp.status_code, 200, resp.content)
+				self.assertEqual(resp.data, [])
+		with self.assertRaises(ValueError):
+			geo.nearest(Restaurant.objects.all(), 11.55, 104.92, float("inf"), 5)
+		with CaptureQueriesContext(connection) as ctx:
+			geo.nearest(Restaurant.objects.all(), 11.55, 104.92, 20000, 5)
+		self.assertLessEqual(len(ctx.captured_queries), geo.MAX_RINGS + 1)
+
+
+class SpatialIndexRebuildTests(TestCase):
+	def setUp(self):
+		spatial._index, spatial._dirty, spatial._last_build = None, False, None
+		self.addCleanup(setattr, spatial, "_index", None)
+		self.addCleanup(setattr, spatial, "_last_build", None)
+
+	@override_settings(SPATIAL_INDEX_ENABLED=True)
+	def test_stale_index_falls_back_to_geohash_until_rebuild_is_due(self):
+		first = Restaurant.objects.create(name="First", address="Street", latitude=11.55, longitude=104.92)
+		self.assertEqual([rid for _, rid in spatial.nearest(11.55, 104.92, 1, 5)], [first.id])
+		built = spatial._index
+		self.assertIsNotNone(built)
+
+		second = Restaurant.objects.create(name="Second", address="Street", latitude=11.5501, longitude=104.92)
+		self.assertEqual([rid for _, rid in spatial.nearest(11.55, 104.92, 1, 5)], [first.id, second.id])
+		self.assertIs(spatial._index, built)
+
+		spatial._last_build -= spatial.SPATIAL_INDEX_MIN_REBUILD_INTERVAL
+		self.assertEqual([rid for _, rid in spatial.nearest(11.55, 104.92, 1, 5)], [first.id, second.id])
+		self.assertIsNot(spatial._index, built)
+
+
+class SpatialInvalidationTests(TestCase):
+	def test_only_location_and_activity_changes_invalidate_spatial_index(self):
+		with mock.patch("marketplace.signals.spatial.invalidate") as invalidate:
+			restaurant = Restaurant.objects.create(name="Pin", address="Street", latitude=11.55, longitude=104.92)
+			self.assertEqual(invalidate.call_count, 1)
+			restaurant.refresh_from_db()
+			restaurant.name = "Renamed"
+			restaurant.save()
+			restaurant.description = "Now with a terrace"
+			restaurant.save(update_fields=["description"])
+			self.assertEqual(invalidate.call_count, 1)
+			restaurant.latitude = 11.56
+			restaurant.save()
+			self.assertEqual(invalidate.call_count, 2)
+			restaurant.is_active = False
+			restaurant.save(update_fields=["is_active"])
+			self.assertEqual(invalidate.call_count, 3)
+			restaurant.delete()
+			self.assertEqual(invalidate.call_count, 4)
+
+
+class RestaurantClusterTests(TestCase):
+	def test_clusters_group_viewport_by_cell(self):
+		today = timezone.localdate()
+		for i in range(6):
+			restaurant = Restaurant.objects.create(name=f"Pin {i}", address="Street", latitude=11.55 + i * 0.001, longitude=104.92)
+			if i == 2:
+				Offer.objects.create(
+					restaurant=restaurant, title="Deal", description="", offer_type="percentage",
+					discount_percentage=35, start_date=today, end_date=today,
+					start_time=datetime.time(12, 0), end_time=datetime.time(13, 0), available_quantity=5,
+				)
+		Restaurant.objects.create(name="Far", address="Street", latitude=13.36, longitude=103.86)
+		client = APIClient()
+		viewport = "min_lat=10&min_lng=102&max_lat=14&max_lng=106"
+
+		with self.assertNumQueries(1):
+			resp = client.get(f"/api/restaurants/clusters/?{viewport}&zoom=5")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		clusters = sorted(resp.data["clusters"], key=lambda c: c["count"])
+		self.assertEqual([c["count"] for c in clusters], [1, 6])
+		self.assertEqual(clusters[1]["best_discount"], 35.0)
+		self.assertAlmostEqual(clusters[1]["lat"], 11.5525, places=4)
+		self.assertIn("restaurant_id", clusters[0])
+
+		resp = client.get(f"/api/restaurants/clusters/?{viewport}&zoom=20")
+		self.assertLessEqual(len(resp.data["clusters"]), geo.MAX_CLUSTER_CELLS)
+
+
+class AvailableNowTests(TestCase):
+	def _add(self, i, starts_at, discount, capacity=4):
+		restaurant = Restaurant.objects.create(name=f"Near {i}", address="Street", latitude=11.55 + i * 0.0005, longitude=104.92)
+		BookingSlot.objects.create(
+			restaurant=restaurant, date=starts_at.date(), start_time=starts_at.time(),
+			end_time=(starts_at + datetime.timedelta(minutes=30)).time(), capacity=capacity,
+			discount_percentage=discount, lead_time_minutes=0,
+		)
+		return restaurant
+
+	def test_ranked_bookable_slots_with_constant_queries(self):
+		soon = (timezone.localtime() + datetime.timedelta(minutes=90)).replace(second=0, microsecond=0)
+		best = self._add(0, soon, 30)
+		self._add(1, soon, 10)
+		self._add(2, soon, 50, capacity=3)  # too small for 4 people
+		self._add(3, soon + datetime.timedelta(hours=5), 60)  # outside the window
+		client = APIClient()
+		url = "/api/restaurants/available_now/?lat=11.55&lng=104.92&radius_km=2&party_size=4&within_minutes=120"
+
+		client.get(url)  # build the spatial index
+		with CaptureQueriesContext(connection) as ctx:
+			resp = client.get(url)
+		few_queries = len(ctx.captured_queries)
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual([(r["restaurant_id"], r["discount_percent"]) for r in resp.data], [(best.id, 30.0), (best.id + 1, 10.0)])
+
+		for i in range(4, 24):
+			self._add(i, soon, 5)
+		client.get(url)  # rebuild the spatial index
+		with CaptureQueriesContext(connection) as ctx:
+			resp = client.get(url)
+		self.assertEqual(len(resp.data), 22)
+		self.assertEqual(len(ctx.captured_queries), few_queries)
+
+
+class AvailabilitySearchTests(TestCase):
+	def test_search_filters_party_capacity_and_sorts_by_discount(self):
+		day = timezone.localdate() + datetime.timedelta(days=3)
+		user = get_user_model().objects.create_user(username="guest", password="pw")
+
+		def add(name, start, capacity=10, discount=None, max_party=20, **extra):
+			restaurant = Restaurant.objects.create(name=name, address="Street", latitude=11.55, longitude=104.92, **extra)
+			return BookingSlot.objects.create(
+				restaurant=restaurant, date=day, start_time=start, end_time=(datetime.datetime.combine(day, start) + datetime.timedelta(minutes=30)).time(),
+				capacity=capacity, discount_percentage=discount, max_party_size=max_party,
+			)
+
+		plain = add("Plain", datetime.time(19, 30))
+		offered = add("Offered", datetime.time(19, 0), cuisine_type="khmer")
+		Offer.objects.create(
+			restaurant=offered.restaurant, title="Dinner", description="", offer_type="percentage",
+			discount_percentage=25, start_date=day, end_date=day,
+			start_time=datetime.time(18, 0), end_time=datetime.time(21, 0), available_quantity=5,
+		)
+		nearly_full = add("Nearly full", datetime.time(19, 30), capacity=8, discount=50)
+		Booking.objects.create(diner=user, restaurant=nearly_full.restaurant, slot=nearly_full, booking_time=timezone.now(), number_of_people=3)
+		add("Small tables", datetime.time(19, 30), max_party=4, discount=60)
+		add("Too late", datetime.time(21, 30), discount=70)
+		elsewhere = add("Elsewhere", datetime.time(19, 30), discount=80)
+		Restaurant.objects.filter(pk=elsewhere.restaurant_id).update(city=None)
+
+		client = APIClient()
+		# Cities, slots, offers, offer timeslots
+		with self.assertNumQueries(4):
+			resp = client.get(f"/api/slots/availability/search/?date={day}&time=19:30&party_size=6&city=phnom penh")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual([(r["slot_id"], r["discount_percent"]) for r in resp.data["results"]], [(offered.id, 25.0), (plain.id, 0.0)])
+
+		resp = client.get(f"/api/slots/availability/search/?date={day}&time=19:30&party_size=6&cuisine=khmer")
+		self.assertEqual([r["restaurant_name"] for r in resp.data["results"]], ["Offered"])
+
+
+class RestaurantFacetTests(TestCase):
+	def test_drill_down_counts_by_city_cuisine_price_and_discount(self):
+		today = timezone.localdate()
+		City.objects.get_or_create(name="Siem Reap", defaults={"aliases": ["siem riep"]})
+
+		def add(name, address, cuisine, price, discount=None):
+			restaurant = Restaurant.objects.create(name=name, address=address, cuisine_type=cuisine, price_range=price)
+			if discount is not None:
+				Offer.objects.create(
+					restaurant=restaurant, title="Deal", description="", offer_type="percentage",
+					discount_percentage=discount, start_date=today, end_date=today,
+					start_time=datetime.time(0, 0), end_time=datetime.time(23, 30), available_quantity=5,
+				)
+			return restaurant
+
+		add("Noodle Bar", "1 Street, Phnom Penh", "khmer", 1, discount=35)
+		add("Noodle Bar", "2 Street, Phnom Penh", "khmer", 1)
+		add("Trattoria", "3 Street, Phnom Penh", "italian", 3, discount=55)
+		temple = add("Temple Grill", "4 Street, Siem Reap", "khmer", 2, discount=10)
+		Restaurant.objects.create(name="Closed", address="5 Street, Phnom Penh", is_active=False)
+		# Amount offers are banded by their percentage of the original price: 12 of 20 = 60%
+		Offer.objects.create(
+			restaurant=temple, title="Set menu", description="", offer_type="amount",
+			discount_amount=12, original_price=20, start_date=today, end_date=today,
+			start_time=datetime.time(0, 0), end_time=datetime.time(23, 30), available_quantity=5,
+		)
+
+		client = APIClient()
+		with self.assertNumQueries(3):
+			resp = client.get("/api/restaurants/filters/?city=phnom penh&cuisine=khmer")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		data = resp.data
+		self.assertEqual(data["total"], 2)
+		self.assertEqual(data["brands"], ["Noodle Bar", "Temple Grill", "Trattoria"])
+		facets = data["facets"]
+		# Each facet ignores its own selection: all Phnom Penh cuisines, all khmer cities
+		self.assertEqual(facets["cuisine"], [{"value": "khmer", "count": 2}, {"value": "italian", "count": 1}])
+		self.assertEqual(facets["city"], [{"value": "Phnom Penh", "count": 2}, {"value": "Siem Reap", "count": 1}])
+		self.assertEqual(facets["price_tier"], [{"value": 1, "count": 2}])
+		self.assertEqual(facets["discount"], [{"value": "30-49", "count": 1}, {"value": "none", "count": 1}])
+
+		resp = client.get("/api/restaurants/filters/?discount=50%2B")
+		self.assertEqual(resp.data["total"], 2)
+		self.assertEqual(resp.data["facets"]["cuisine"], [{"value": "italian", "count": 1}, {"value": "khmer", "count": 1}])
+
+
+class HomeBundleTests(TestCase):
+	def test_home_bundles_banners_facets_and_first_feed_page(self):
+		today = timezone.localdate()
+		for i in range(14):
+			restaurant = Restaurant.objects.create(name=f"R{i}", address="Street, Phnom Penh", rating=i % 5)
+			Offer.objects.create(
+				restaurant=restaurant, title=f"Deal {i}", description="", offer_type="percentage",
+				discount_percentage=20, start_date=today, end_date=today, is_featured=i < 4,
+				start_time=datetime.time(0, 0), end_time=datetime.time(23, 30), available_quantity=5,
+			)
+
+		client = APIClient()
+		# Cities, offers, slot index rows (read, timeslots, booking slots, insert), facet rows, brands
+		with self.assertNumQueries(8):
+			resp = client.get("/api/offers/home/?city=phnom penh")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		data = resp.data
+		self.assertEqual(len(data["banners"]), 3)
+		self.assertEqual(data["filters"]["total"], 14)
+		self.assertEqual(data["filters"]["facets"]["discount"], [{"value": "20-29", "count": 14}])
+
+		feed = client.get("/api/offers/feed/?city=phnom penh").data
+		self.assertEqual(data["feed"]["results"], feed["results"])
+		self.assertTrue(data["feed"]["has_more"])
+		rest = client.get(f"/api/offers/feed/?city=phnom penh&cursor={data['feed']['next_cursor']}").data
+		self.assertEqual(len(rest["results"]), 2)
+
+
+class OfferListQueryCountTests(TestCase):
+	def test_offer_lists_are_paginated_with_prefetched_time_slots(self):
+		today = timezone.localdate()
+		other_days = ",".join(str(d) for d in range(7) if d != today.weekday())
+		for i in range(30):
+			restaurant = Restaurant.objects.create(name=f"R{i}", address="Street, Phnom Penh")
+			offer = Offer.objects.create(
+				restaurant=restaurant, title=f"Deal {i}", description="", offer_type="percentage",
+				discount_percentage=20, start_date=today, end_date=today, is_featured=True,
+				start_time=datetime.time(18, 0), end_time=datetime.time(20, 0), available_quantity=5,
+			)
+			OfferTimeSlot.objects.create(offer=offer, restaurant=restaurant, start_time=datetime.time(18, 0), end_time=datetime.time(18, 30))
+			OfferTimeSlot.objects.create(offer=offer, restaurant=restaurant, start_time=datetime.time(19, 0), end_time=datetime.time(19, 30), is_active=False)
+		Offer.objects.create(
+			restaurant=restaurant, title="Not today", description="", offer_type="percentage",
+			discount_percentage=20, start_date=today, end_date=today, days_of_week=other_days,
+			start_time=datetime.time(18, 0), end_time=datetime.time(20, 0), available_quantity=5,
+		)
+
+		client = APIClient()
+		for url in ("/api/offers/active_offers/", "/api/offers/featured_offers/", "/api/offers/by_restaurant/"):
+			# Count, offers with restaurants, active timeslots
+			with self.assertNumQueries(3):
+				resp = client.get(url)
+			self.assertEqual(resp.status_code, 200, resp.content)
+			self.assertEqual(len(resp.data["results"]), 20)
+			# Only active timeslots are listed; the not-today offer has none
+			for o in resp.data["results"]:
+				self.assertEqual(len(o["time_slots_detail"]), 0 if o["title"] == "Not today" else 1)
+		self.assertEqual(client.get("/api/offers/active_offers/").data["count"], 30)
+		self.assertEqual(client.get("/api/offers/by_restaurant/").data["count"], 31)
+
+
+class RestaurantListQueryCountTests(TestCase):
+	def test_list_mine_and_retrieve_prefetch_todays_offers(self):
+		today = timezone.localdate()
+		owner = get_user_model().objects.create_user(username="owner", password="pw", user_type="restaurant_owner")
+		for i in range(8):
+			restaurant = Restaurant.objects.create(name=f"R{i}", address="Street, Phnom Penh", owner=owner)
+			for pct, featured in ((15, False), (30, False), (10, True)):
+				offer = Offer.objects.create(
+					restaurant=restaurant, title=f"{pct}%", description="", offer_type="percentage",
+					discount_percentage=pct, start_date=today, end_date=today, is_featured=featured,
+					start_time=datetime.time(18, 0), end_time=datetime.time(20, 0), available_quantity=5,
+				)
+				OfferTimeSlot.objects.create(offer=offer, restaurant=restaurant, start_time=datetime.time(18, 0), end_time=datetime.time(18, 30))
+			Offer.objects.create(
+				restaurant=restaurant, title="Expired", description="", offer_type="percentage",
+				discount_percentage=90, start_date=today - datetime.timedelta(days=5), end_date=today - datetime.timedelta(days=1),
+				start_time=datetime.time(18, 0), end_time=datetime.time(20, 0), available_quantity=5,
+			)
+
+		client = APIClient()
+		# Count, restaurants with owners, today's offers, their timeslots
+		with self.assertNumQueries(4):
+			resp = client.get("/api/restaurants/")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		first = resp.data["results"][0]
+		self.assertEqual(sorted(o["title"] for o in first["active_offers"]), ["10%", "15%", "30%"])
+		self.assertEqual(first["featured_offer"]["title"], "10%")
+		self.assertEqual(first["owner"]["username"], "owner")
+
+		with self.assertNumQueries(3):
+			resp = client.get(f"/api/restaurants/{first['id']}/")
+		self.assertEqual(len(resp.data["active_offers"]), 3)
+
+		client.force_authenticate(owner)
+		with self.assertNumQueries(4):
+			resp = client.get("/api/restaurants/mine/")
+		self.assertEqual(resp.data["count"], 8)
+
+
+class SparseFieldsetTests(TestCase):
+	def setUp(self):
+		today = timezone.localdate()
+		self.admin = get_user_model().objects.create_user(username="staff", password="pw", is_staff=True)
+		for i in range(3):
+			restaurant = Restaurant.objects.create(name=f"R{i}", address="Street, Phnom Penh", owner=self.admin, rating=4)
+			offer = Offer.objects.create(
+				restaurant=restaurant, title=f"Deal {i}", description="", offer_type="percentage",
+				discount_percentage=20, start_date=today, end_date=today,
+				start_time=datetime.time(18, 0), end_time=datetime.time(20, 0), available_quantity=5,
+			)
+			OfferTimeSlot.objects.create(offer=offer, restaurant=restaurant, start_time=datetime.time(18, 0), end_time=datetime.time(18, 30))
+		self.client = APIClient()
+
+	def test_fields_trim_payload_columns_and_relations(self):
+		with self.assertNumQueries(2) as ctx:
+			resp = self.client.get("/api/restaurants/?fields=name,rating")
+		self.assertNotIn("address", ctx.captured_queries[1]["sql"])
+		self.assertEqual(set(resp.data["results"][0]), {"id", "name", "rating"})
+
+		# Count, restaurants, today's offers, their timeslots; no owner join
+		with self.assertNumQueries(4):
+			resp = self.client.get("/api/restaurants/?fields=name&expand=active_offers")
+		self.assertEqual(set(resp.data["results"][0]), {"id", "name", "active_offers"})
+		# Nested offers keep their full shape
+		self.assertIn("time_slots_detail", resp.data["results"][0]["active_offers"][0])
+
+		with self.assertNumQueries(2):
+			resp = self.client.get("/api/offers/?fields=title,discounted_price,is_available_today")
+		self.assertEqual(resp.data["results"][0]["is_available_today"], True)
+
+		resp = self.client.get("/api/restaurants/")
+		self.assertIn("featured_offer", resp.data["results"][0])
+
+	def test_admin_viewsets_accept_fields(self):
+		self.client.force_authenticate(self.admin)
+		with self.assertNumQueries(3):
+			resp = self.client.get("/api/admin/restaurants/?fields=name,total_offers")
+		self.assertEqual(resp.data["results"][0]["total_offers"], 1)
+		with self.assertNumQueries(2):
+			resp = self.client.get("/api/admin/offers/?fields=title,restaurant")
+		self.assertEqual(set(resp.data["results"][0]), {"id", "title", "restaurant"})
+
+
+class MaterializeSlotsCommandTests(TestCase):
+	def test_expands_offers_into_missing_slots_idempotently(self):
+		start = timezone.localdate() + datetime.timedelta(days=1)
+		restaurant = Restaurant.objects.create(name="Bistro", address="Street")
+		other = Restaurant.objects.create(name="Cafe", address="Street")
+		for r, pct in ((restaurant, 20), (other, 10)):
+			Offer.objects.create(
+				restaurant=r, title="Dinner", description="", offer_type="percentage",
+				discount_percentage=pct, start_date=start, end_date=start + datetime.timedelta(days=1),
+				start_time=datetime.time(18, 0), end_time=datetime.time(20, 0), available_quantity=5,
+			)
+		# An existing off-grid slot occupies the 18:00 bin on the first day
+		BookingSlot.objects.create(restaurant=restaurant, date=start, start_time=datetime.time(18, 15), end_time=datetime.time(18, 45))
+
+		out = io.StringIO()
+		call_command("materialize_slots", "--start", start.isoformat(), "--days", "3", "--restaurant", str(restaurant.id), stdout=out)
+		self.assertIn("Created 7 slot(s) for 1 restaurant(s)", out.getvalue())
+		slots = BookingSlot.objects.filter(restaurant=restaurant).order_by("date", "start_time")
+		self.assertEqual(
+			[((s.date - start).days, s.start_time.strftime("%H:%M")) for s in slots],
+			[(0, "18:15"), (0, "18:30"), (0, "19:00"), (0, "19:30"), (1, "18:00"), (1, "18:30"), (1, "19:00"), (1, "19:30")],
+		)
+		self.assertEqual({s.discount_percentage for s in slots if s.start_time.minute != 15}, {None})
+
+		out = io.StringIO()
+		call_command("materialize_slots", "--start", start.isoformat(), "--days", "3", "--shards", "2", "--shard", str(other.id % 2), stdout=out)
+		self.assertIn("Created 8 slot(s) for 1 restaurant(s)", out.getvalue())
+		out = io.StringIO()
+		call_command("materialize_slots", "--start", start.isoformat(), "--days", "3", stdout=out)
+		self.assertIn("Created 0 slot(s) for 2 restaurant(s)", out.getvalue())
+
+	def test_materialized_slots_follow_offer_changes(self):
+		day = timezone.localdate() + datetime.timedelta(days=1)
+		restaurant = Restaurant.objects.create(name="Bistro", address="Street")
+		offer = Offer.objects.create(
+			restaurant=restaurant, title="Dinner", description="", offer_type="percentage",
+			discount_percentage=30, start_date=day, end_date=day,
+			start_time=datetime.time(18, 0), end_time=datetime.time(19, 0), available_quantity=5,
+		)
+		call_command("materialize_slots", "--start", day.isoformat(), "--days", "1", stdout=io.StringIO())
+		client = APIClient()
+		url = f"/api/offers/timeslots/?restaurant={restaurant.id}&date={day}"
+		self.assertEqual({t["discount_percent"] for t in client.get(url).data["timeslots"]}, {30.0})
+
+		offer.discount_percentage = 15
+		offer.save()
+		self.assertEqual({(t["discount_percent"], t["source"]) for t in client.get(url).data["timeslots"]}, {(15.0, "both")})
+
+	def test_materialize_slot_endpoint_matches_command_grid(self):
+		day = timezone.localdate() + datetime.timedelta(days=1)
+		restaurant = Restaurant.objects.create(name="Bistro", address="Street")
+		Offer.objects.create(
+			restaurant=restaurant, title="Dinner", description="", offer_type="percentage",
+			discount_percentage=30, start_date=day, end_date=day,
+			start_time=datetime.time(18, 0), end_time=datetime.time(19, 0), available_quantity=5,
+		)
+		client = APIClient()
+		resp = client.post("/api/offers/materialize_slot/", {"restaurant": restaurant.id, "date": str(day), "time": "18:15"}, format="json")
+		self.assertEqual(resp.status_code, 400, resp.content)
+		resp = client.post("/api/offers/materialize_slot/", {"restaurant": restaurant.id, "date": str(day), "time": "18:30"}, format="json")
+		self.assertEqual(resp.status_code, 201, resp.content)
+		slot = BookingSlot.objects.get(restaurant=restaurant)
+		self.assertEqual((slot.start_time, slot.discount_percentage), (datetime.time(18, 30), None))
+
+
+class GenerateScheduleTests(TestCase):
+	def setUp(self):
+		self.owner = get_user_model().objects.create_user(username="chain", password="pw", user_type="restaurant_owner")
+		self.client = APIClient()
+		self.client.force_authenticate(self.owner)
+		self.start = timezone.localdate() + datetime.timedelta(days=1)
+		self.end = self.start + datetime.timedelta(days=6)
+
+	def payload(self, restaurant_ids, **extra):
+		payload = {
+			"restaurants": restaurant_ids, "start_date": self.start.isoformat(), "end_date": self.end.isoformat(),
+			"hours": list(range(10, 22)), "days_of_week": "0,2,4",
+			"slots_pattern": [{"minute": 0, "discount_percentage": 50}, {"minute": 30, "discount_percentage": 40}],
+		}
+		payload.update(extra)
+		return payload
+
+	def test_chain_schedule_is_bulk_and_dry_run_reports_diff(self):
+		outlets = [Restaurant.objects.create(name=f"Outlet {i}", address="Street", owner=self.owner).id for i in range(50)]
+		existing = Offer.objects.create(
+			restaurant_id=outlets[0], title="Old noon", description="", offer_type="percentage", discount_percentage=10,
+			start_date=self.start, end_date=self.end, start_time=datetime.time(12, 0), end_time=datetime.time(13, 0), available_quantity=5,
+		)
+
+		resp = self.client.post("/api/offers/generate_schedule/", self.payload(outlets[:2], replace=True, dry_run=True), format="json")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual(resp.data["create_count"], 24)
+		self.assertEqual(resp.data["replace_count"], 1)
+		noon = [i for i in resp.data["plan"] if i["restaurant_id"] == outlets[0] and i["hour"] == 12][0]
+		self.assertEqual((noon["action"], noon["replaces"]), ("replace", [existing.id]))
+		self.assertEqual(Offer.objects.count(), 1)
+
+		with CaptureQueriesContext(connection) as ctx:
+			resp = self.client.post("/api/offers/generate_schedule/", self.payload(outlets), format="json")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		# Besides the batched bulk inserts (SQLite caps rows per INSERT): owners, plan,
+		# savepoint, search index (2), release, slot index; nothing per offer
+		others = [q for q in ctx.captured_queries if not q["sql"].startswith('INSERT INTO "marketplace_offer')]
+		self.assertEqual(len(others), 7)
+		self.assertEqual(resp.data["created_count"], 50 * 12 - 1)
+		self.assertEqual(resp.data["skipped_existing"], [{"restaurant_id": outlets[0], "hour": 12}])
+		self.assertEqual(OfferTimeSlot.objects.count(), (50 * 12 - 1) * 2)
+		created = Offer.objects.get(restaurant_id=outlets[1], start_time=datetime.time(18, 0))
+		self.assertEqual((created.days_mask, float(created.discount_percentage)), (0b10101, 50.0))
+
+	def test_foreign_restaurant_rejects_whole_request(self):
+		mine = Restaurant.objects.create(name="Mine", address="Street", owner=self.owner)
+		other = Restaurant.objects.create(name="Other", address="Street")
+		resp = self.client.post("/api/offers/generate_schedule/", self.payload([mine.id, other.id]), format="json")
+		self.assertEqual(resp.status_code, 403)
+		self.assertEqual(resp.data["restaurant_ids"], [other.id])
+		self.assertFalse(Offer.objects.exists())
+
+
+class OfferTimeSlotUpsertTests(TestCase):
+	def test_update_diffs_time_slots_by_start_time(self):
+		owner = get_user_model().objects.create_user(username="owner", password="pw", user_type="restaurant_owner")
+		restaurant = Restaurant.objects.create(name="Bistro", address="Street", owner=owner)
+		today = timezone.localdate()
+		client = APIClient()
+		client.force_authenticate(owner)
+		payload = {
+			"restaurant": restaurant.id, "title": "Dinner", "description": "Set menu", "offer_type": "percentage",
+			"discount_percentage": "30", "start_date": today.isoformat(), "end_date": today.isoformat(),
+			"start_time": "18:00", "end_time": "20:00", "available_quantity": 5,
+			"time_slots": [
+				{"start_time": "18:00", "end_time": "18:30", "discount_percentage": 30},
+				{"start_time": "18:30", "end_time": "19:00", "discount_percentage": 20},
+				{"start_time": "19:00", "end_time": "19:30", "discount_percentage": 10},
+			],
+		}
+		resp = client.post("/api/offers/", payload, format="json")
+		self.assertEqual(resp.status_code, 201, resp.content)
+		self.assertEqual(resp.data["time_slot_changes"], {"created": 3, "updated": 0, "deleted": 0, "unchanged": 0})
+		offer_id = resp.data["id"]
+		before = {ts.start_time.strftime("%H:%M"): ts for ts in OfferTimeSlot.objects.filter(offer_id=offer_id)}
+
+		payload["time_slots"] = [
+			{"start_time": "18:00", "end_time": "18:30", "discount_percentage": "30.00"},
+			{"start_time": "18:30", "end_time": "19:00", "discount_percentage": 25},
+			{"start_time": "19:30", "end_time": "20:00", "discount_percentage": 15},
+		]
+		resp = client.put(f"/api/offers/{offer_id}/", payload, format="json")
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual(resp.data["time_slot_changes"], {"created": 1, "updated": 1, "deleted": 1, "unchanged": 1})
+		after = {ts.start_time.strftime("%H:%M"): ts for ts in OfferTimeSlot.objects.filter(offer_id=offer_id)}
+		self.assertEqual(sorted(after), ["18:00", "18:30", "19:30"])
+		# Matched rows keep their ids; untouched rows are not rewritten
+		self.assertEqual(after["18:00"].id, before["18:00"].id)
+		self.assertEqual(after["18:00"].updated_at, before["18:00"].updated_at)
+		self.assertEqual((after["18:30"].id, float(after["18:30"].discount_percentage)), (before["18:30"].id, 25.0))
+
+		with CaptureQueriesContext(connection) as ctx:
+			resp = client.put(f"/api/offers/{offer_id}/", payload, format="json")
+		self.assertEqual(resp.data["time_slot_changes"], {"created": 0, "updated": 0, "deleted": 0, "unchanged": 3})
+		self.assertFalse([q for q in ctx.captured_queries if "offertimeslot" in q["sql"] and not q["sql"].startswith("SELECT")])
+
+		payload["time_slots"] = [payload["time_slots"][0], payload["time_slots"][0]]
+		resp = client.put(f"/api/offers/{offer_id}/", payload, format="json")
+		self.assertEqual(resp.status_code, 400)
@@ -1,10 +1,12 @@
+import math
+
 from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q, Count
-from marketplace.models import Restaurant, Offer, Booking, BookingSlot, OfferTimeSlot, BookingHold
+from marketplace.models import Restaurant, Offer, Booking, BookingSlot, OfferTimeSlot, BookingHold, City
 from users.models import User
 from marketplace.serializers import (
     RestaurantSerializer, OfferSerializer, BookingSerializer,
@@ -13,6 +15,8 @@ from marketplace.serializers import (
     AvailabilitySerializer, BookingHoldSerializer, BookingConfirmSerializer,
 )
 from marketplace.serializers import BookingSlotSerializer
+from marketplace import slot_index, slot_engine, pagination, loaders, search, geo, spatial, fieldsets
+from marketplace import cache as response_cache
 
 class IsAdminOrReadOnly(permissions.BasePermission):
     """Allow read for anyone, write for platform admins (Django staff or custom admin type)."""
@@ -68,16 +72,53 @@ class IsOfferOwnerOrAdmin(permissions.BasePermission):
         # Owner of the related restaurant
         return getattr(obj.restaurant, 'owner_id', None) == user.id
 
-class RestaurantViewSet(viewsets.ModelViewSet):
+
+class FullTextSearchFilter(SearchFilter):
+    """SearchFilter backed by the marketplace.search index.
+
+    Keeps the ``?search=`` parameter. Results are ordered by relevance unless
+    the client asks for an explicit ``?ordering=``, so this backend must run
+    after OrderingFilter.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        queryset = search.search_restaurants(queryset, ' '.join(terms), rank=True)
+        if not request.query_params.get(OrderingFilter.ordering_param):
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        return queryset
+
+
+class RestaurantViewSet(fieldsets.SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, FullTextSearchFilter]
     search_fields = ['name', 'cuisine_type', 'address']
     filterset_fields = ['cuisine_type', 'price_range', 'is_active', 'is_featured']
     ordering_fields = ['name', 'rating', 'created_at']
     ordering = ['-created_at']
+    # Restaurants considered by available_now (nearest first)
+    AVAILABLE_NOW_MAX_CANDIDATES = 200
     permission_classes = [IsRestaurantOwnerOrAdmin]
 
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'mine'):
+            from django.utils import timezone
+            day = timezone.localdate()
+
+            def todays_offers(q):
+                return q.with_todays_offers(day)
+            # Only load what the (possibly ?fields= restricted) serializer reads
+            qs = fieldsets.plan(qs, RestaurantSerializer, self.sparse_fields, {
+                'owner': lambda q: q.select_related('owner'),
+                'active_offers': todays_offers,
+                'featured_offer': todays_offers,
+            })
+        return qs
+
     def perform_create(self, serializer):
         # Set the owner to the requesting user if authenticated; otherwise raise
         user = self.request.user
@@ -88,7 +129,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def mine(self, request):
         """List restaurants owned by the current user."""
-        owned = Restaurant.objects.filter(owner=request.user)
+        owned = self.get_queryset().filter(owner=request.user).order_by(*self.ordering, '-id')
         page = self.paginate_queryset(owned)
         if page is not None:
             ser = self.get_serializer(page, many=True)
@@ -118,19 +159,26 @@ class RestaurantViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
     def filters(self, request):
-        """Return facets for cities, cuisines, brands, themes, and price tiers."""
-        from django.db.models import Value as V
-        cities = list(Restaurant.objects.exclude(address__isnull=True).exclude(address='').values_list('address', flat=True).distinct()[:50])
-        cuisines = list(Restaurant.objects.exclude(cuisine_type__isnull=True).exclude(cuisine_type='').values_list('cuisine_type', flat=True).distinct())
-        brands = list(Restaurant.objects.exclude(name__isnull=True).exclude(name='').values_list('name', flat=True).distinct()[:50])
-        themes = ['Buffet', 'Rooftop', 'Family', 'Romantic', 'Vegan']
-        price_tiers = [1,2,3,4]
+        """Return drill-down facet counts plus the filter option lists.
+
+        Query: city, cuisine, price_tier, discount (a band such as '30-49')
+
+        facets holds counts per city, cuisine, price tier and discount band
+        for the current selection, each facet counted without its own filter.
+        The grouped counts behind it are cached briefly (see marketplace.facets).
+        """
+        from marketplace import facets
+        table = facets.get_table()
+        all_counts = facets.counts(table['rows'], {})
+        selected_counts = facets.counts(table['rows'], facets.parse_selection(request.query_params))
         data = {
-            'cities': cities,
-            'cuisines': cuisines,
-            'brands': brands,
-            'themes': themes,
-            'price_tiers': price_tiers,
+            'cities': [item['value'] for item in all_counts['city']],
+            'cuisines': [item['value'] for item in all_counts['cuisine']],
+            'brands': table['brands'],
+            'themes': ['Buffet', 'Rooftop', 'Family', 'Romantic', 'Vegan'],
+            'price_tiers': [1, 2, 3, 4],
+            'total': selected_counts.pop('total'),
+            'facets': selected_counts,
         }
         return Response(FiltersSerializer(data).data)
 
@@ -141,7 +189,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         Query params:
           - lat (required)
           - lng (required)
-          - radius_km (optional, default 5)
+          - radius_km (optional, default 5, at most geo.MAX_RADIUS_KM)
           - limit (optional, default 50)
         """
         try:
@@ -153,48 +201,199 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             radius_km = float(request.query_params.get('radius_km', 5))
         except ValueError:
             radius_km = 5.0
+        if not all(math.isfinite(v) for v in (lat, lng, radius_km)):
+            return Response({'error': 'lat, lng and radius_km must be finite'}, status=status.HTTP_400_BAD_REQUEST)
+        radius_km = min(radius_km, geo.MAX_RADIUS_KM)
         try:
             limit = int(request.query_params.get('limit', 50))
         except ValueError:
             limit = 50
+        limit = max(1, min(limit, 200))
 
-        # crude Haversine computation in SQL via bounding box, then refine in Python
-        # bounding box first
-        import math
-        earth_radius_km = 6371.0
-        dlat = (radius_km / earth_radius_km) * (180.0 / math.pi)
-        dlng = (radius_km / earth_radius_km) * (180.0 / math.pi) / max(math.cos(math.radians(lat)), 0.0001)
-        min_lat, max_lat = lat - dlat, lat + dlat
-        min_lng, max_lng = lng - dlng, lng + dlng
-
-        candidates = Restaurant.objects.filter(
-            is_active=True,
-            latitude__isnull=False,
-            longitude__isnull=False,
-            latitude__gte=min_lat, latitude__lte=max_lat,
-            longitude__gte=min_lng, longitude__lte=max_lng,
-        )[:limit*2]
-
-        def haversine_km(lat1, lng1, lat2, lng2):
-            phi1, phi2 = math.radians(lat1), math.radians(lat2)
-            dphi = math.radians(lat2 - lat1)
-            dlambda = math.radians(lng2 - lng1)
-            a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-            return 2*earth_radius_km*math.asin(math.sqrt(a))
+        # Nearest ids first (KD-tree or geohash rings), then the rows to serialize
+        pairs = spatial.nearest(lat, lng, radius_km, limit)
+        found = Restaurant.objects.filter(is_active=True).in_bulk([rid for _, rid in pairs])
+        results = [(d, found[rid]) for d, rid in pairs if rid in found]
+        items = [self.get_serializer(r).data | {'distance_km': round(d, 2)} for d, r in results[:limit]]
+        return Response(items)
 
-        results = []
-        for r in candidates:
-            try:
-                dist = haversine_km(float(r.latitude), float(r.longitude), lat, lng)
-            except Exception:
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def clusters(self, request):
+        """Grid-aggregated restaurants inside a map viewport.
+
+        Query params:
+          - min_lat, min_lng, max_lat, max_lng (required; min_lng > max_lng crosses the antimeridian)
+          - zoom (optional, default 12) map zoom level picking the geohash cell size
+        Returns {precision, clusters: [{cell, count, lat, lng, best_discount, restaurant_id?}]}
+        computed with one GROUP BY on a prefix of Restaurant.geohash. The cell size is
+        coarsened so a viewport never yields more than geo.MAX_CLUSTER_CELLS cells.
+        """
+        from django.db.models import Avg, Count, F, Max, Min, OuterRef, Subquery
+        from django.db.models.functions import Substr
+        from django.utils import timezone
+        try:
+            min_lat = float(request.query_params.get('min_lat'))
+            min_lng = float(request.query_params.get('min_lng'))
+            max_lat = float(request.query_params.get('max_lat'))
+            max_lng = float(request.query_params.get('max_lng'))
+        except (TypeError, ValueError):
+            return Response({'error': 'min_lat, min_lng, max_lat and max_lng are required numeric query params'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            zoom = int(request.query_params.get('zoom', 12))
+        except ValueError:
+            zoom = 12
+        precision = geo.cluster_precision(zoom, min_lat, min_lng, max_lat, max_lng)
+
+        restaurants = Restaurant.objects.filter(is_active=True, latitude__gte=min_lat, latitude__lte=max_lat).exclude(geohash='')
+        if min_lng <= max_lng:
+            restaurants = restaurants.filter(longitude__gte=min_lng, longitude__lte=max_lng)
+        else:
+            restaurants = restaurants.filter(Q(longitude__gte=min_lng) | Q(longitude__lte=max_lng))
+
+        # Best discount (percent, amounts converted) among each restaurant's offers active today
+        best_offer = (
+            Offer.objects.active_on(timezone.localdate()).filter(restaurant=OuterRef('pk')).with_discount_percent()
+            .order_by(F('discount_pct').desc(nulls_last=True)).values('discount_pct')[:1]
+        )
+        rows = (
+            restaurants.annotate(best_today=Subquery(best_offer), cell=Substr('geohash', 1, precision))
+            .values('cell')
+            .annotate(count=Count('id'), lat=Avg('latitude'), lng=Avg('longitude'), best_discount=Max('best_today'), any_id=Min('id'))
+            .order_by('cell')
+        )
+        clusters = []
+        for row in rows:
+            cluster = {
+                'cell': row['cell'],
+                'count': row['count'],
+                'lat': round(float(row['lat']), 6),
+                'lng': round(float(row['lng']), 6),
+                'best_discount': round(float(row['best_discount']), 2) if row['best_discount'] is not None else None,
+            }
+            if row['count'] == 1:
+                cluster['restaurant_id'] = row['any_id']
+            clusters.append(cluster)
+        return Response({'zoom': zoom, 'precision': precision, 'clusters': clusters})
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def available_now(self, request):
+        """Bookable slots near a point within the next few minutes/hours.
+
+        Query params:
+          - lat, lng (required)
+          - radius_km (optional, default 2, at most geo.MAX_RADIUS_KM)
+          - party_size (optional, default 2)
+          - within_minutes (optional, default 60, at most 24h) window starting now
+          - sort (optional) 'discount' (default), 'distance' or 'time'
+          - limit (optional, default 50, at most 200)
+        Returns [{restaurant_id, restaurant_name, distance_km, slot_id, date, time,
+        discount_percent, source, remaining_capacity}] ranked by ``sort``. The query
+        count does not depend on how many restaurants are in range.
+        """
+        import datetime
+        from django.utils import timezone
+        try:
+            lat = float(request.query_params.get('lat'))
+            lng = float(request.query_params.get('lng'))
+        except (TypeError, ValueError):
+            return Response({'error': 'lat and lng are required numeric query params'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            radius_km = float(request.query_params.get('radius_km', 2))
+            party_size = int(request.query_params.get('party_size', 2))
+            within_minutes = int(request.query_params.get('within_minutes', 60))
+            limit = int(request.query_params.get('limit', 50))
+        except ValueError:
+            return Response({'error': 'radius_km, party_size, within_minutes and limit must be numeric'}, status=status.HTTP_400_BAD_REQUEST)
+        if not all(math.isfinite(v) for v in (lat, lng, radius_km)):
+            return Response({'error': 'lat, lng and radius_km must be finite'}, status=status.HTTP_400_BAD_REQUEST)
+        radius_km = min(radius_km, geo.MAX_RADIUS_KM)
+        within_minutes = max(1, min(within_minutes, 24 * 60))
+        limit = max(1, min(limit, 200))
+        sort = request.query_params.get('sort', 'discount')
+
+        # Spatial candidate set (bounded), then bulk slot capacity + discounts for it
+        distances = {rid: d for d, rid in spatial.nearest(lat, lng, radius_km, self.AVAILABLE_NOW_MAX_CANDIDATES)}
+        now = timezone.localtime()
+        window_end = now + datetime.timedelta(minutes=within_minutes)
+        start_day, end_day = now.date(), window_end.date()
+        grids = slot_engine.build_range_grids(list(distances), start_day, end_day)
+        slot_engine.attach_bookable_slots(grids, start_day, end_day)
+
+        matches = list(slot_engine.bookable_slots(grids, party_size, now, window_end))
+        sort_keys = {
+            'distance': lambda m: (distances[m[0]], m[1], m[2].start_time),
+            'time': lambda m: (m[1], m[2].start_time, distances[m[0]]),
+        }
+        matches.sort(key=sort_keys.get(sort, lambda m: (-(m[3] or 0), distances[m[0]], m[1], m[2].start_time)))
+        matches = matches[:limit]
+
+        restaurants = Restaurant.objects.filter(is_active=True).in_bulk({m[0] for m in matches})
+        items = []
+        for rid, day, slot, discount, source in matches:
+            if rid not in restaurants:
                 continue
-            if dist <= radius_km:
-                results.append((dist, r))
-        results.sort(key=lambda x: x[0])
-        items = [self.get_serializer(r).data | {'distance_km': round(d, 2)} for d, r in results[:limit]]
+            items.append({
+                'restaurant_id': rid,
+                'restaurant_name': restaurants[rid].name,
+                'distance_km': round(distances[rid], 2),
+                'slot_id': slot.id,
+                'date': day.isoformat(),
+                'time': slot.start_time.strftime('%H:%M'),
+                'discount_percent': discount,
+                'source': source,
+                'remaining_capacity': slot.remaining_capacity,
+            })
         return Response(items)
 
-class OfferViewSet(viewsets.ModelViewSet):
+
+def _image_url(rest):
+    return rest.image_file.url if getattr(rest, 'image_file', None) else (rest.image_url or '')
+
+
+def _feed_card(rest, offer, slots):
+    """Feed card for a restaurant and its offer (None for restaurants without one today)."""
+    from django.utils import timezone
+    return {
+        'offer_id': str(offer.id) if offer else '',
+        'restaurant_id': str(rest.id),
+        'name': rest.name,
+        'city': rest.city_label,
+        'image_url': _image_url(rest),
+        'rating': float(rest.rating or 0),
+        'reservations_count': rest.reservations_count,
+        'price_tier': int(rest.price_range or 2),
+        'badges': [b for b in (['Hot'] if rest.is_featured else []) + (['New'] if (rest.created_at and (timezone.now() - rest.created_at).days <= 30) else [])],
+        'slots': slots,
+    }
+
+
+def _banner_items(offers, now):
+    return [{
+        'id': f'b{i}',
+        'image_url': _image_url(o.restaurant),
+        'headline': o.title,
+        'subtext': (o.description or '')[:80],
+        'cta_label': 'Reserve now',
+        'cta_href': f"/restaurants/{o.restaurant.id}",
+        'active_from': now,
+        'active_to': now,
+    } for i, o in enumerate(offers, start=1)]
+
+
+def _select_offer_restaurant(qs):
+    return qs.select_related('restaurant')
+
+
+# Relation loaders per OfferSerializer field, for fieldsets.plan()
+OFFER_LOADERS = {
+    'restaurant_name': _select_offer_restaurant,
+    'restaurant_cuisine': _select_offer_restaurant,
+    'restaurant_location': _select_offer_restaurant,
+    'time_slots_detail': lambda qs: qs.with_active_time_slots(),
+}
+
+
+class OfferViewSet(fieldsets.SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Offer.objects.all().select_related('restaurant')
     serializer_class = OfferSerializer
     permission_classes = [IsOfferOwnerOrAdmin]
@@ -203,6 +402,24 @@ class OfferViewSet(viewsets.ModelViewSet):
     filterset_fields = ['restaurant', 'offer_type', 'is_active', 'is_featured', 'recurring']
     ordering_fields = ['title', 'start_date', 'end_date', 'created_at']
     ordering = ['-created_at']
+    # Longest window served by timeslots?start=&end= in one response
+    TIMESLOT_RANGE_MAX_DAYS = 31
+    # Most restaurants accepted by timeslots/batch
+    TIMESLOT_BATCH_MAX_RESTAURANTS = 100
+    FEED_PAGE_SIZE = 12
+    BANNER_COUNT = 3
+    # Most restaurants (outlets of a chain) scheduled by one generate_schedule call
+    SCHEDULE_MAX_RESTAURANTS = 200
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            qs = self._plan_offers(qs)
+        return qs
+
+    def _plan_offers(self, qs):
+        """Load the relations (and with ?fields= only the columns) OfferSerializer reads."""
+        return fieldsets.plan(qs.select_related(None), OfferSerializer, self.sparse_fields, OFFER_LOADERS)
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -235,14 +452,21 @@ class OfferViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
     def timeslots(self, request):
-        """Unified timeslot discounts for a restaurant and date.
+        """Unified timeslot discounts for a restaurant and date (or date range).
 
         Query params:
           - restaurant (id, required)
           - date (YYYY-MM-DD, optional; defaults to today)
-          - limit (int, optional) to cap number of returned timeslots
+          - start, end (YYYY-MM-DD, optional) return every date in the range
+            (at most TIMESLOT_RANGE_MAX_DAYS) instead of a single date
+          - limit (int, optional) to cap number of returned timeslots (per date)
         Returns a list of timeslots with discount percentage and source ('slot','offer','both').
         Prefers the higher discount when both exist at the same start time.
+        Offer times come from marketplace.slot_engine: on the 30-minute grid,
+        offers without timeslots list every bin of their window and times
+        without a usable discount are listed at 0.0.
+        Range mode answers {restaurant_id, start, end, dates: [{date, timeslots}]}; each
+        date's list is exactly what single-date mode returns for it.
         """
         import datetime
         from django.utils import timezone
@@ -251,145 +475,137 @@ class OfferViewSet(viewsets.ModelViewSet):
         if not restaurant_id:
             return Response({'error': 'restaurant query param required'}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            restaurant = Restaurant.objects.get(id=restaurant_id)
-        except Restaurant.DoesNotExist:
+            restaurant_id = int(restaurant_id)
+        except ValueError:
             return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        date_str = request.query_params.get('date')
-        if date_str:
+        # Keyed on the restaurant's version counter: any write to its offers/slots/bookings moves it
+        version = response_cache.restaurant_versions([restaurant_id])[restaurant_id]
+        cache_key = response_cache.make_key('timeslots', request.query_params, restaurant_id, version, response_cache.time_bucket())
+        cached = response_cache.get_cached(cache_key)
+        if cached is not None:
+            return Response(cached)
+
+        if not Restaurant.objects.filter(id=restaurant_id).exists():
+            return Response({'error': 'Restaurant not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        start_str = request.query_params.get('start')
+        end_str = request.query_params.get('end')
+        range_mode = bool(start_str or end_str)
+        try:
+            if range_mode:
+                if not (start_str and end_str):
+                    return Response({'error': 'start and end are both required'}, status=status.HTTP_400_BAD_REQUEST)
+                start = datetime.date.fromisoformat(start_str)
+                end = datetime.date.fromisoformat(end_str)
+            else:
+                date_str = request.query_params.get('date')
+                start = end = datetime.date.fromisoformat(date_str) if date_str else timezone.localdate()
+        except ValueError:
+            return Response({'error': 'Invalid date format (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        if end < start or (end - start).days >= self.TIMESLOT_RANGE_MAX_DAYS:
+            return Response(
+                {'error': f'end must be on or after start and span at most {self.TIMESLOT_RANGE_MAX_DAYS} days'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        lim = None
+        limit = request.query_params.get('limit')
+        if limit:
             try:
-                target_date = datetime.date.fromisoformat(date_str)
+                lim = int(limit) if int(limit) > 0 else None
             except ValueError:
-                return Response({'error': 'Invalid date format (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+                pass
+
+        # Offers, timeslots and bookable slots for the whole window in three queries
+        grids = slot_engine.build_range_grids([restaurant_id], start, end)
+        slot_engine.attach_bookable_slots(grids, start, end)
+        dates = [
+            {'date': day.isoformat(), 'timeslots': slot_engine.timeslot_entries(grid)[:lim]}
+            for day, grid in grids[restaurant_id].items()
+        ]
+
+        if range_mode:
+            data = {'restaurant_id': restaurant_id, 'start': start.isoformat(), 'end': end.isoformat(), 'dates': dates}
         else:
-            target_date = timezone.localdate()
+            data = {'restaurant_id': restaurant_id, 'date': dates[0]['date'], 'timeslots': dates[0]['timeslots']}
+        response_cache.set_cached(cache_key, data)
+        return Response(data)
 
-        # Collect active slots for the date
-        slot_entries = {}
-        slots = BookingSlot.objects.filter(restaurant=restaurant, date=target_date, is_active=True)
-        for s in slots:
-            # Only include bookable/open slots with remaining capacity
-            status_eff = s.effective_status()
-            rem = s.remaining_capacity
-            if status_eff == 'open' and (rem is None or rem > 0):
-                key = s.start_time.strftime('%H:%M')
-                slot_disc = float(s.discount_percentage) if s.discount_percentage is not None else None
-                slot_entries[key] = {
-                    'time': key,
-                    'discount_percent': slot_disc,
-                    'source': 'slot',
-                    'slot_id': s.id,
-                    'offer_id': None,
-                }
-
-    # Collect active offers applicable to the date/weekday
-        weekday = target_date.weekday()
-        offers_qs = self.queryset.filter(
-            restaurant=restaurant,
-            is_active=True,
-            start_date__lte=target_date,
-            end_date__gte=target_date,
-        )
-        offer_entries = {}
-        for off in offers_qs:
-            if off.days_of_week:
-                allowed = [int(d.strip()) for d in off.days_of_week.split(',') if d.strip().isdigit()]
-                if weekday not in allowed:
-                    continue
-            # Use 30-minute slots if defined; otherwise fall back to the single hour window start
-            slots = OfferTimeSlot.objects.filter(offer=off, is_active=True).order_by('start_time')
-            if slots.exists():
-                for ts in slots:
-                    key = ts.start_time.strftime('%H:%M')
-                    disc_pct = None
-                    if ts.discount_percentage is not None:
-                        disc_pct = float(ts.discount_percentage)
-                    elif ts.discount_amount is not None and off.original_price:
-                        try:
-                            disc_pct = max(0.0, min(100.0, float(ts.discount_amount) / float(off.original_price) * 100.0))
-                        except Exception:
-                            disc_pct = None
-                    if disc_pct is None:
-                        continue
-                    offer_entries[key] = {
-                        'time': key,
-                        'discount_percent': disc_pct,
-                        'source': 'offer',
-                        'slot_id': None,
-                        'offer_id': off.id,
-                    }
-            else:
-                try:
-                    key = off.start_time.strftime('%H:%M')
-                except Exception:
-                    continue
-                disc_pct = None
-                if off.discount_percentage is not None:
-                    disc_pct = float(off.discount_percentage)
-                elif off.discount_amount is not None and off.original_price:
-                    try:
-                        disc_pct = max(0.0, min(100.0, float(off.discount_amount) / float(off.original_price) * 100.0))
-                    except Exception:
-                        disc_pct = None
-                if disc_pct is None:
-                    continue
-                offer_entries[key] = {
-                    'time': key,
-                    'discount_percent': disc_pct,
-                    'source': 'offer',
-                    'slot_id': None,
-                    'offer_id': off.id,
-                }
-
-        # Merge, preferring higher discount where both exist
-        merged = {}
-        for t, v in offer_entries.items():
-            merged[t] = v
-        for t, v in slot_entries.items():
-            if t not in merged:
-                merged[t] = v
-            else:
-                # both exist -> choose higher discount, annotate source
-                existing = merged[t]
-                e_pct = existing.get('discount_percent') or 0
-                v_pct = v.get('discount_percent') or 0
-                if v_pct > e_pct:
-                    # slot wins
-                    v['source'] = 'both' if existing['source'] == 'offer' else v['source']
-                    v['offer_id'] = existing.get('offer_id')
-                    merged[t] = v
-                else:
-                    # offer stays, but note both
-                    existing['source'] = 'both'
-                    existing['slot_id'] = v.get('slot_id')
-
-        # Build sorted list
-        timeslots = list(merged.values())
-        timeslots.sort(key=lambda x: x['time'])
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny], url_path='timeslots/batch')
+    def batch_timeslots(self, request):
+        """Merged timeslots for many restaurants on one date.
+
+        Query params:
+          - restaurants (comma-separated ids, required, at most TIMESLOT_BATCH_MAX_RESTAURANTS)
+          - date (YYYY-MM-DD, optional; defaults to today)
+          - limit (int, optional) to cap number of returned timeslots per restaurant
+        Returns {date, results: [{restaurant_id, timeslots}]} in request order; unknown
+        ids are skipped. Runs a fixed number of queries however many ids are passed.
+        Each restaurant's timeslots follow the same merge rules as timeslots (see
+        marketplace.slot_engine), including 0.0 entries for times without a usable discount.
+        """
+        import datetime
+        from django.utils import timezone
 
+        try:
+            restaurant_ids = list(dict.fromkeys(
+                int(v) for v in (request.query_params.get('restaurants') or '').split(',') if v.strip()
+            ))
+        except ValueError:
+            return Response({'error': 'restaurants must be comma-separated ids'}, status=status.HTTP_400_BAD_REQUEST)
+        if not restaurant_ids:
+            return Response({'error': 'restaurants query param required'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(restaurant_ids) > self.TIMESLOT_BATCH_MAX_RESTAURANTS:
+            return Response(
+                {'error': f'At most {self.TIMESLOT_BATCH_MAX_RESTAURANTS} restaurants per request'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        date_str = request.query_params.get('date')
+        try:
+            target_date = datetime.date.fromisoformat(date_str) if date_str else timezone.localdate()
+        except ValueError:
+            return Response({'error': 'Invalid date format (YYYY-MM-DD)'}, status=status.HTTP_400_BAD_REQUEST)
+        lim = None
         limit = request.query_params.get('limit')
         if limit:
             try:
-                lim = int(limit)
-                if lim > 0:
-                    timeslots = timeslots[:lim]
+                lim = int(limit) if int(limit) > 0 else None
             except ValueError:
                 pass
 
-        return Response({
-            'restaurant_id': restaurant.id,
+        # Rejected on read if any of the restaurants' version counters moved
+        cache_key = response_cache.make_key('timeslots-batch', request.query_params, response_cache.time_bucket())
+        cached = response_cache.get_cached_list(cache_key)
+        if cached is not None:
+            return Response(cached)
+
+        known = set(Restaurant.objects.filter(id__in=restaurant_ids).values_list('id', flat=True))
+        restaurant_ids = [rid for rid in restaurant_ids if rid in known]
+        grids = slot_engine.build_range_grids(restaurant_ids, target_date, target_date)
+        slot_engine.attach_bookable_slots(grids, target_date, target_date)
+        data = {
             'date': target_date.isoformat(),
-            'timeslots': timeslots,
-        })
+            'results': [
+                {'restaurant_id': rid, 'timeslots': slot_engine.timeslot_entries(grids[rid][target_date])[:lim]}
+                for rid in restaurant_ids
+            ],
+        }
+        response_cache.set_cached_list(cache_key, data, restaurant_ids)
+        return Response(data)
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
     def feed(self, request):
         """Cursor-paginated offers feed aggregated as cards with slot list.
 
         Query: city, q, cuisine, brand, theme, min_discount, time_bucket, sort, cursor
+
+        The cursor is a keyset: it carries the sort key tuple of the last card so
+        the next page seeks past it instead of counting/offsetting. When a city is
+        selected and offers run out, the feed continues with that city's
+        restaurants that have no active offers (ordered by id).
         """
         from django.utils import timezone
-        import base64, json, datetime as dt
         today = timezone.localdate()
         city = request.query_params.get('city')
         # Automatically include empty restaurants (no active offers) for a city selection
@@ -401,305 +617,184 @@ class OfferViewSet(viewsets.ModelViewSet):
         min_discount = request.query_params.get('min_discount')
         time_bucket = request.query_params.get('time_bucket')
         sort = request.query_params.get('sort', 'recommended')
-        cursor = request.query_params.get('cursor')
-        page_size = 12
-        offset = 0
-        if cursor:
-            try:
-                payload = json.loads(base64.b64decode(cursor).decode('utf-8'))
-                offset = int(payload.get('offset', 0))
-            except Exception:
-                offset = 0
-
-        # Filter active offers for today and allowed weekdays
-        weekday = today.weekday()
-        offers_qs = Offer.objects.filter(
-            is_active=True,
-            restaurant__is_active=True,
-            start_date__lte=today,
-            end_date__gte=today,
-        ).select_related('restaurant')
+        cursor = pagination.decode_cursor(request.query_params.get('cursor'))
+        page_size = self.FEED_PAGE_SIZE
 
-        # Include offers that are active in the date range regardless of weekday; we'll only emit times for those allowed today.
-        offers = list(offers_qs)
+        # Identical feed queries within a 30-minute bucket share one cached page
+        cache_key = response_cache.make_key('feed', request.query_params, response_cache.catalog_version(), response_cache.time_bucket())
+        cached = response_cache.get_cached_list(cache_key)
+        if cached is not None:
+            return Response(cached)
 
-        from django.db.models import Q
-        qs = Offer.objects.filter(id__in=[o.id for o in offers]).select_related('restaurant')
-        # Central bounding boxes accessible for both filtering & card city detection
-        CITY_BOXES = {
-            'phnom penh': (11.35, 11.80, 104.75, 105.15),
-            'siem reap': (13.25, 13.52, 103.70, 103.97),
-            'sihanoukville': (10.50, 10.78, 103.40, 103.68),
-            'battambang': (12.95, 13.18, 103.08, 103.32),
-            'kampot': (10.50, 10.78, 104.10, 104.33),
-            'kep': (10.38, 10.56, 104.22, 104.38),
-            'kampong cham': (11.90, 12.10, 105.38, 105.54),
-            'kampong thom': (12.62, 12.78, 104.82, 104.98),
-            'poipet': (13.60, 13.72, 102.50, 102.64),
-        }
-        CITY_ALIASES = {
-            'siem riep': 'siem reap',
-            'phnompenh': 'phnom penh',
-        }
+        # Filter active offers for today and allowed weekdays (in SQL)
+        offers_qs = Offer.objects.active_on(today).filter(
+            restaurant__is_active=True,
+        ).select_related('restaurant', 'restaurant__city')
 
-        def normalize_city(value: str | None) -> str | None:
-            if not value:
-                return None
-            v = value.strip().lower()
-            return CITY_ALIASES.get(v, v)
-        # Track restaurant IDs matched by city so we can optionally include empty ones
-        city_restaurant_ids = set()
+        from django.db.models import Q
+        qs = offers_qs
+        # Track restaurants matched by city so we can optionally include empty ones
+        city_restaurants = Restaurant.objects.none()
         if city:
-            norm_city = normalize_city(city)
-            box = CITY_BOXES.get(norm_city) if norm_city else None
-            if box:
-                lat_min, lat_max, lon_min, lon_max = box
-                # Offer-level coord filter (restaurant__ prefixed)
-                offer_coord_filter = Q(restaurant__latitude__gte=lat_min) & Q(restaurant__latitude__lte=lat_max) & \
-                                      Q(restaurant__longitude__gte=lon_min) & Q(restaurant__longitude__lte=lon_max)
-                # Restaurant-level coord filter (no prefix)
-                rest_coord_filter = Q(latitude__gte=lat_min) & Q(latitude__lte=lat_max) & \
-                                     Q(longitude__gte=lon_min) & Q(longitude__lte=lon_max)
-                qs = qs.filter(offer_coord_filter | (
-                    Q(restaurant__latitude__isnull=True, restaurant__longitude__isnull=True, restaurant__address__icontains=norm_city)
-                ))
+            city_obj = City.lookup(city)
+            if city_obj:
+                # Restaurant.city is resolved on save, so this is an indexed equality lookup
+                qs = qs.filter(restaurant__city=city_obj)
                 if include_empty:
-                    rest_q = Restaurant.objects.filter(is_active=True).filter(
-                        rest_coord_filter | Q(latitude__isnull=True, longitude__isnull=True, address__icontains=norm_city)
-                    ).values_list('id', flat=True)
-                    city_restaurant_ids.update(rest_q)
+                    city_restaurants = Restaurant.objects.filter(is_active=True, city=city_obj)
             else:
-                # No bounding box; rely on normalized address contains
+                # Unknown city; rely on address contains
+                norm_city = city.strip().lower()
                 qs = qs.filter(restaurant__address__icontains=norm_city)
                 if include_empty:
-                    rest_q = Restaurant.objects.filter(is_active=True, address__icontains=norm_city).values_list('id', flat=True)
-                    city_restaurant_ids.update(rest_q)
+                    city_restaurants = Restaurant.objects.filter(is_active=True, address__icontains=norm_city)
         if q:
-            qs = qs.filter(Q(title__icontains=q) | Q(description__icontains=q) | Q(restaurant__name__icontains=q))
+            qs = search.search_offers(qs, q)
         if cuisine:
             qs = qs.filter(restaurant__cuisine_type__icontains=cuisine)
         if brand:
             qs = qs.filter(restaurant__name__icontains=brand)
         if theme:
-            qs = qs.filter(Q(description__icontains=theme) | Q(title__icontains=theme))
-
-        if sort == 'highest_discount':
-            qs = qs.order_by('-discount_percentage', '-discount_amount')
-        elif sort == 'most_popular':
-            qs = qs.order_by('-restaurant__rating', '-restaurant__created_at')
-        elif sort == 'nearest_time':
-            qs = qs.order_by('start_time')
-        else:
-            qs = qs.order_by('-is_featured', '-restaurant__rating', '-created_at')
+            qs = search.search_offers(qs, theme)
+
+        qs, sort = pagination.order_feed(qs, sort)
 
         cards = []
         now = timezone.localtime()
-
-        # Cache merged slots per restaurant to avoid recomputing for multiple offers of same restaurant
-        merged_slots_cache: dict[int, list[dict]] = {}
+        try:
+            min_discount_val = int(min_discount) if min_discount else None
+        except ValueError:
+            min_discount_val = None
+
+        page_offers = []
+        has_more = False
+        if cursor.get('phase', 'offers') == 'offers':
+            seek_qs = qs
+            if cursor.get('sort') == sort:
+                seek_qs = pagination.seek(qs, sort, cursor.get('after'))
+            # Probe one extra row instead of counting the whole result set
+            page_offers = list(seek_qs[:page_size + 1])
+            has_more = len(page_offers) > page_size
+            page_offers = page_offers[:page_size]
+
+        # Batch-load slot index rows for every restaurant on the page
+        page_data = loaders.load_feed_page([o.restaurant_id for o in page_offers], today, offers_qs)
+        index_entries = page_data['entries']
 
         cards_emitted = 0
-        for off in qs[offset: offset + page_size]:
+        for off in page_offers:
             rest = off.restaurant
-            # If already computed for this restaurant, reuse
-            if rest.id in merged_slots_cache:
-                slot_items = merged_slots_cache[rest.id]
-            else:
-                # Build a unified slot list across ALL active offers for this restaurant (today + weekday)
-                # 1) Gather all relevant offers for this restaurant from the pre-filtered list
-                rest_offers = [o for o in offers if o.restaurant_id == rest.id]
-
-                # Helper: compute percentage
-                def pct_from_any(offr, ts=None):
-                    if ts is not None:
-                        if ts.discount_percentage is not None:
-                            try:
-                                return int(float(ts.discount_percentage))
-                            except Exception:
-                                return 0
-                        if ts.discount_amount is not None and offr.original_price:
-                            try:
-                                val = (float(ts.discount_amount) / float(offr.original_price)) * 100.0
-                                return max(0, min(100, int(round(val))))
-                            except Exception:
-                                return 0
-                    if offr.discount_percentage is not None:
-                        try:
-                            return int(float(offr.discount_percentage))
-                        except Exception:
-                            return 0
-                    return 0
-
-                # 2) Merge by time using highest discount
-                merged_by_time: dict[str, dict] = {}
-                for ro in rest_offers:
-                    # Skip timeslot generation if this offer is not allowed today by its days_of_week constraint.
-                    allowed_today = True
-                    if ro.days_of_week:
-                        try:
-                            allowed_days = [int(d.strip()) for d in ro.days_of_week.split(',') if d.strip().isdigit()]
-                            allowed_today = (weekday in allowed_days)
-                        except Exception:
-                            allowed_today = True
-                    if not allowed_today:
-                        continue
-
-                    ro_ts = OfferTimeSlot.objects.filter(offer=ro, is_active=True).order_by('start_time')
-                    if ro_ts.exists():
-                        for ts in ro_ts:
-                            time_str = ts.start_time.strftime('%H:%M')
-                            # Skip past times today
-                            if today == now.date() and (ts.start_time.hour * 60 + ts.start_time.minute) <= (now.hour * 60 + now.minute):
-                                continue
-                            disc = pct_from_any(ro, ts)
-                            if min_discount and disc < int(min_discount):
-                                continue
-                            cur = merged_by_time.get(time_str)
-                            if not cur or disc > cur['discount']:
-                                merged_by_time[time_str] = {'time': time_str, 'discount': disc}
-                    else:
-                        # Fall back to the offer's time window on a 30-minute grid
-                        cur_dt = dt.datetime.combine(today, ro.start_time)
-                        end_dt = dt.datetime.combine(today, ro.end_time)
-                        while cur_dt < end_dt:
-                            time_str = cur_dt.strftime('%H:%M')
-                            if today == now.date() and (cur_dt.time().hour * 60 + cur_dt.time().minute) <= (now.hour * 60 + now.minute):
-                                cur_dt += dt.timedelta(minutes=30)
-                                continue
-                            disc = pct_from_any(ro)
-                            if min_discount and disc < int(min_discount):
-                                cur_dt += dt.timedelta(minutes=30)
-                                continue
-                            cur = merged_by_time.get(time_str)
-                            if not cur or disc > cur['discount']:
-                                merged_by_time[time_str] = {'time': time_str, 'discount': disc}
-                            cur_dt += dt.timedelta(minutes=30)
-
-                # 3) Attach real slot info where available; else synthetic ids
-                slot_items = []
-                for time_str, info in sorted(merged_by_time.items(), key=lambda kv: kv[0]):
-                    hh, mm = map(int, time_str.split(':'))
-                    try:
-                        bslot = BookingSlot.objects.filter(restaurant=rest, date=today, start_time=dt.time(hh, mm)).first()
-                    except Exception:
-                        bslot = None
-                    disc = info['discount']
-                    if bslot:
-                        status_eff = bslot.effective_status()
-                        rem = bslot.remaining_capacity
-                        # Note: we show all open slots, even if capacity is low, client can re-check on booking page
-                        if status_eff != 'open':
-                            continue
-                        cap = rem if rem is not None else 99
-                        slot_items.append({'slot_id': str(bslot.id), 'time': time_str, 'discount': disc, 'capacity': cap})
-                    else:
-                        # This is a synthetic slot, it has no real BookingSlot yet.
-                        # The frontend should treat it as a non-bookable offer time.
-                        slot_items.append({'slot_id': None, 'time': time_str, 'discount': disc, 'capacity': 99})
-
-                # 4) Optional time bucket filtering
-                if time_bucket in ('lunch', 'afternoon', 'dinner', 'late'):
-                    def bucket(h: int):
-                        return 'lunch' if 11 <= h < 14 else 'afternoon' if 14 <= h < 17 else 'dinner' if 17 <= h < 21 else 'late'
-                    slot_items = [s for s in slot_items if bucket(int(s['time'][:2])) == time_bucket]
-
-                merged_slots_cache[rest.id] = slot_items
-
-            # Determine city for card: prefer bounding box mapping over address suffix
-            detected_city = ''
-            if getattr(rest, 'latitude', None) is not None and getattr(rest, 'longitude', None) is not None:
-                lat = float(rest.latitude)
-                lon = float(rest.longitude)
-                for cname, (la_min, la_max, lo_min, lo_max) in CITY_BOXES.items():  # type: ignore
-                    if la_min <= lat <= la_max and lo_min <= lon <= lo_max:
-                        detected_city = cname.title()
-                        break
-            if not detected_city and getattr(rest, 'address', None):
-                if ',' in rest.address:
-                    detected_city = rest.address.split(',')[-1].strip().title()
-                else:
-                    detected_city = rest.address.strip().title()
-
-            card = {
-                'offer_id': str(off.id),
-                'restaurant_id': str(rest.id),
-                'name': rest.name,
-                'city': detected_city,
-                'image_url': (rest.image_file.url if getattr(rest, 'image_file', None) else (rest.image_url or '')),
-                'rating': float(rest.rating or 0),
-                'reservations_count': rest.bookings.count(),
-                'price_tier': int(rest.price_range or 2),
-                'badges': [b for b in (['Hot'] if rest.is_featured else []) + (['New'] if (rest.created_at and (timezone.now() - rest.created_at).days <= 30) else [])],
-                'slots': slot_items,
-            }
-            cards.append(card)
-            cards_emitted += 1
+            slot_items = slot_index.feed_slots(
+                index_entries.get(rest.id, []), today, now=now,
+                min_discount=min_discount_val, time_bucket=time_bucket,
+            )
 
-        # If we have a city filter, include_empty flag, and we emitted nothing (or fewer than page size) add placeholder cards for restaurants with no active offers
-        if city and include_empty and cards_emitted < page_size:
-            remaining = page_size - cards_emitted
-            extra_ids = [rid for rid in city_restaurant_ids if rid not in [c['restaurant_id'] for c in cards]][:remaining]
-            if extra_ids:
-                extra_restaurants = Restaurant.objects.filter(id__in=extra_ids)
-                for rest in extra_restaurants:
-                    # Determine city same way as above
-                    detected_city = ''
-                    if getattr(rest, 'latitude', None) is not None and getattr(rest, 'longitude', None) is not None:
-                        lat = float(rest.latitude)
-                        lon = float(rest.longitude)
-                        for cname, (la_min, la_max, lo_min, lo_max) in CITY_BOXES.items():  # type: ignore
-                            if la_min <= lat <= la_max and lo_min <= lon <= lo_max:
-                                detected_city = cname.title()
-                                break
-                    if not detected_city and getattr(rest, 'address', None):
-                        if ',' in rest.address:
-                            detected_city = rest.address.split(',')[-1].strip().title()
-                        else:
-                            detected_city = rest.address.strip().title()
-                    cards.append({
-                        'offer_id': '',
-                        'restaurant_id': str(rest.id),
-                        'name': rest.name,
-                        'city': detected_city,
-                        'image_url': (rest.image_file.url if getattr(rest, 'image_file', None) else (rest.image_url or '')),
-                        'rating': float(rest.rating or 0),
-                        'reservations_count': rest.bookings.count(),
-                        'price_tier': int(rest.price_range or 2),
-                        'badges': [b for b in (['Hot'] if rest.is_featured else []) + (['New'] if (rest.created_at and (timezone.now() - rest.created_at).days <= 30) else [])],
-                        'slots': [],
-                    })
-                    cards_emitted += 1
-                    if cards_emitted >= page_size:
-                        break
+            cards.append(_feed_card(rest, off, slot_items))
+            cards_emitted += 1
 
         next_cursor = None
-        # Adjust total to include extra restaurants if include_empty
-        total = qs.count()
-        if city and include_empty:
-            total = max(total, len(city_restaurant_ids))
-        if total > offset + page_size:
-            next_cursor = base64.b64encode(json.dumps({'offset': offset + page_size}).encode('utf-8')).decode('utf-8')
-
-        return Response({'results': FeedCardSerializer(cards, many=True).data, 'next_cursor': next_cursor})
+        if has_more:
+            next_cursor = pagination.encode_cursor({'sort': sort, 'after': pagination.cursor_after(page_offers[-1], sort)})
+        elif city and include_empty and cards_emitted < page_size:
+            # Offers exhausted: continue with the city's restaurants that have no active offer today
+            after_id = cursor.get('after') if cursor.get('phase') == 'empty' else None
+            empty_qs = city_restaurants.select_related('city').exclude(id__in=qs.order_by().values('restaurant_id')).order_by('id')
+            if isinstance(after_id, int):
+                empty_qs = empty_qs.filter(id__gt=after_id)
+            remaining = page_size - cards_emitted
+            extra_restaurants = list(empty_qs[:remaining + 1])
+            if len(extra_restaurants) > remaining:
+                extra_restaurants = extra_restaurants[:remaining]
+                next_cursor = pagination.encode_cursor({'phase': 'empty', 'after': extra_restaurants[-1].id})
+            for rest in extra_restaurants:
+                cards.append(_feed_card(rest, None, []))
+                cards_emitted += 1
+        elif city and include_empty and cursor.get('phase', 'offers') == 'offers':
+            # Offers ran out exactly at the end of a full page: empty restaurants start on the next one
+            next_cursor = pagination.encode_cursor({'phase': 'empty'})
+
+        data = {'results': list(FeedCardSerializer(cards, many=True).data), 'next_cursor': next_cursor, 'has_more': next_cursor is not None}
+        response_cache.set_cached_list(cache_key, data, [int(c['restaurant_id']) for c in cards])
+        return Response(data)
 
     @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
     def banners(self, request):
         from django.utils import timezone
         now = timezone.now()
-        items = []
-        featured = Offer.objects.filter(is_active=True, is_featured=True).select_related('restaurant')[:3]
-        for i, o in enumerate(featured, start=1):
-            items.append({
-                'id': f'b{i}',
-                'image_url': (o.restaurant.image_file.url if getattr(o.restaurant, 'image_file', None) else (o.restaurant.image_url or '')),
-                'headline': o.title,
-                'subtext': (o.description or '')[:80],
-                'cta_label': 'Reserve now',
-                'cta_href': f"/restaurants/{o.restaurant.id}",
-                'active_from': now,
-                'active_to': now,
-            })
-        return Response(BannerSerializer(items, many=True).data)
+        featured = Offer.objects.filter(is_active=True, is_featured=True).select_related('restaurant')[:self.BANNER_COUNT]
+        return Response(BannerSerializer(_banner_items(featured, now), many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.AllowAny])
+    def home(self, request):
+        """Banners, filter facets and the first feed page in one response.
+
+        Query: city
+
+        Today's active offers are loaded once; banners (featured offers among
+        them) and the first recommended feed page are derived from that list in
+        memory, and the page's slot index rows reuse it instead of reloading
+        offers. Facets come from the shared facet table (marketplace.facets).
+        next_cursor continues in the feed endpoint with the same city. The
+        bundle is cached per city and 30-minute time bucket.
+        """
+        from django.utils import timezone
+        from marketplace import facets
+        today = timezone.localdate()
+        city = (request.query_params.get('city') or '').strip()
+
+        cache_key = response_cache.make_key('home', {'city': city}, response_cache.catalog_version(), response_cache.time_bucket())
+        cached = response_cache.get_cached_list(cache_key)
+        if cached is not None:
+            return Response(cached)
+
+        offers_qs = Offer.objects.active_on(today).filter(
+            restaurant__is_active=True,
+        ).select_related('restaurant', 'restaurant__city')
+        selection = {}
+        if city:
+            city_obj = City.lookup(city)
+            if city_obj:
+                offers_qs = offers_qs.filter(restaurant__city=city_obj)
+            else:
+                offers_qs = offers_qs.filter(restaurant__address__icontains=city.lower())
+            selection['city'] = city_obj.name if city_obj else city
+        offers, sort = pagination.order_loaded(offers_qs, 'recommended')
+
+        now = timezone.now()
+        featured = [o for o in offers if o.is_featured][:self.BANNER_COUNT]
+
+        page_size = self.FEED_PAGE_SIZE
+        page_offers = offers[:page_size]
+        page_data = loaders.load_feed_page([o.restaurant_id for o in page_offers], today, offers_qs, offers=offers)
+        local_now = timezone.localtime()
+        cards = [
+            _feed_card(off.restaurant, off, slot_index.feed_slots(page_data['entries'].get(off.restaurant_id, []), today, now=local_now))
+            for off in page_offers
+        ]
+        next_cursor = None
+        if len(offers) > page_size:
+            next_cursor = pagination.encode_cursor({'sort': sort, 'after': pagination.cursor_after(page_offers[-1], sort)})
+        elif city:
+            # Offers exhausted: the feed continues with the city's restaurants without offers
+            next_cursor = pagination.encode_cursor({'phase': 'empty'})
+
+        table = facets.get_table(today)
+        facet_counts = facets.counts(table['rows'], selection)
+        data = {
+            'banners': list(BannerSerializer(_banner_items(featured, now), many=True).data),
+            'filters': {
+                'total': facet_counts.pop('total'),
+                'facets': facet_counts,
+                'brands': table['brands'],
+            },
+            'feed': {
+                'results': list(FeedCardSerializer(cards, many=True).data),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None,
+            },
+        }
+        response_cache.set_cached_list(cache_key, data, [o.restaurant_id for o in page_offers + featured])
+        return Response(data)
 
     @action(detail=False, methods=['get'])
     def hourly_offers(self, request):
@@ -728,33 +823,16 @@ class OfferViewSet(viewsets.ModelViewSet):
         else:
             target_date = timezone.localdate()
 
-        weekday = target_date.weekday()
-        offers_qs = self.queryset.filter(
-            restaurant=restaurant,
-            is_active=True,
-            start_date__lte=target_date,
-            end_date__gte=target_date,
-        )
-        # Filter by days_of_week if present
-        filtered = []
-        for off in offers_qs:
-            if off.days_of_week:
-                allowed = [int(d.strip()) for d in off.days_of_week.split(',') if d.strip().isdigit()]
-                if weekday not in allowed:
-                    continue
-            filtered.append(off)
-
-        # Build 24 slots (00-01 ... 23-24) -> single offer or null
+        # Date range and days_of_week are filtered in SQL
+        offers = {o.id: o for o in self.queryset.active_on(target_date).filter(restaurant=restaurant)}
+        grid = slot_engine.build_grids([restaurant.id], target_date, {restaurant.id: list(offers.values())})[restaurant.id]
+
+        # Build 24 slots (00-01 ... 23-24) -> best offer within the hour or null
+        bins_per_hour = 60 // slot_engine.BIN_MINUTES
         slot_map = []
         for hour in range(24):
-            slot_offer = None
-            for off in filtered:
-                try:
-                    if off.start_time.hour == hour:  # one-hour normalized offer
-                        slot_offer = off
-                        break
-                except AttributeError:
-                    continue
+            offer_id = grid.best_offer_id(hour * bins_per_hour, (hour + 1) * bins_per_hour)
+            slot_offer = offers.get(offer_id)
             slot_map.append({
                 'hour': hour,
                 'start': f"{hour:02d}:00",
@@ -770,38 +848,25 @@ class OfferViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def active_offers(self, request):
-        """Get currently active offers"""
+        """Get currently active offers (paginated)"""
         from django.utils import timezone
-        today = timezone.now().date()
-        
-        active_offers = self.queryset.filter(
-            is_active=True,
-            restaurant__is_active=True,
-            start_date__lte=today,
-            end_date__gte=today
-        )
-        
-        # Apply additional filtering based on days_of_week
-        weekday = today.weekday()
-        filtered_offers = []
-        
-        for offer in active_offers:
-            if offer.days_of_week:
-                allowed_days = [int(d.strip()) for d in offer.days_of_week.split(',') if d.strip().isdigit()]
-                if weekday in allowed_days:
-                    filtered_offers.append(offer)
-            else:
-                filtered_offers.append(offer)
-        
-        serializer = self.get_serializer(filtered_offers, many=True)
-        return Response(serializer.data)
+        today = timezone.localdate()
+
+        # Date range and days_of_week are filtered in SQL
+        active_offers = self.queryset.active_on(today).filter(restaurant__is_active=True)
+        return self._paginated_offers(active_offers)
 
     @action(detail=False, methods=['get'])
     def featured_offers(self, request):
-        """Get featured offers"""
-        featured = self.queryset.filter(is_featured=True, is_active=True)
-        serializer = self.get_serializer(featured, many=True)
-        return Response(serializer.data)
+        """Get featured offers (paginated)"""
+        return self._paginated_offers(self.queryset.filter(is_featured=True, is_active=True))
+
+    def _paginated_offers(self, qs):
+        qs = self._plan_offers(qs).order_by(*self.ordering, '-id')
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(qs, many=True).data)
 
     @action(detail=False, methods=['post'], permission_classes=[permissions.AllowAny])
     def materialize_slot(self, request):
@@ -811,8 +876,9 @@ class OfferViewSet(viewsets.ModelViewSet):
         Rules:
         - Only allowed when there is at least one active Offer (date range + weekday) for that restaurant that includes the requested time,
           via either an OfferTimeSlot at that exact minute or within its offer window.
+        - time must fall on a half-hour boundary (:00 or :30), like the slots the materialize_slots command creates.
         - Creates a 30-minute BookingSlot [time, time+30m] if not exists. Returns the existing slot if already present.
-        - Sets discount_percentage to the highest applicable discount among matching offers.
+        - The slot carries no discount of its own; the covering offers supply it when timeslots are read.
         """
         from django.utils import timezone
         import datetime as dt
@@ -834,90 +900,51 @@ class OfferViewSet(viewsets.ModelViewSet):
             end_time = end_dt.time()
         except Exception:
             return Response({'error': 'Invalid date or time format'}, status=400)
+        if start_time != slot_engine.start_time_of(slot_engine.bin_of(start_time)):
+            return Response({'error': 'time must be on a :00 or :30 boundary'}, status=400)
 
-        # Validate there is an active offer covering this date & time
-        weekday = target_date.weekday()
-        offers_qs = Offer.objects.filter(
-            restaurant=restaurant,
-            is_active=True,
-            start_date__lte=target_date,
-            end_date__gte=target_date,
-        )
-        applicable = []
-        for off in offers_qs:
-            if off.days_of_week:
-                allowed = [int(d.strip()) for d in off.days_of_week.split(',') if d.strip().isdigit()]
-                if weekday not in allowed:
-                    continue
-            # match by explicit OfferTimeSlot or within offer window
-            has_ts = OfferTimeSlot.objects.filter(offer=off, is_active=True, start_time=start_time).exists()
-            in_window = False
-            try:
-                in_window = off.start_time <= start_time < off.end_time
-            except Exception:
-                in_window = False
-            if has_ts or in_window:
-                applicable.append(off)
-
-        if not applicable:
+        # Validate there is an active offer covering this date & time (timeslot or window)
+        grid = slot_engine.build_grids([restaurant.id], target_date)[restaurant.id]
+        index = slot_engine.bin_of(start_time)
+        if not grid.covers(index):
             return Response({'error': 'No active offer covers this time'}, status=409)
 
-        # Compute highest discount among applicable offers at that time
-        def pct_for(off: Offer, st: dt.time):
-            ts = OfferTimeSlot.objects.filter(offer=off, is_active=True, start_time=st).first()
-            if ts and ts.discount_percentage is not None:
-                try:
-                    return float(ts.discount_percentage)
-                except Exception:
-                    return 0.0
-            if ts and ts.discount_amount is not None and off.original_price:
-                try:
-                    return max(0.0, min(100.0, float(ts.discount_amount) / float(off.original_price) * 100.0))
-                except Exception:
-                    return 0.0
-            if off.discount_percentage is not None:
-                try:
-                    return float(off.discount_percentage)
-                except Exception:
-                    return 0.0
-            return 0.0
-
-        best_pct = 0.0
-        for off in applicable:
-            best_pct = max(best_pct, pct_for(off, start_time))
-
-        # Get or create the BookingSlot
+        # Get or create the BookingSlot (the materialize_slots command normally creates it ahead of time)
         slot = BookingSlot.objects.filter(restaurant=restaurant, date=target_date, start_time=start_time).first()
         if not slot:
+            from django.db import IntegrityError, transaction
             capacity = int(request.data.get('capacity') or 0)  # 0 = unlimited
             min_party = int(request.data.get('min_party_size') or 1)
             max_party = int(request.data.get('max_party_size') or 20)
-            slot = BookingSlot.objects.create(
-                restaurant=restaurant,
-                date=target_date,
-                start_time=start_time,
-                end_time=end_time,
-                discount_percentage=best_pct if best_pct > 0 else None,
-                capacity=capacity,
-                min_party_size=min_party,
-                max_party_size=max_party,
-                status='open',
-                is_active=True,
-            )
+            try:
+                with transaction.atomic():
+                    slot = BookingSlot.objects.create(
+                        restaurant=restaurant,
+                        date=target_date,
+                        start_time=start_time,
+                        end_time=end_time,
+                        discount_percentage=None,
+                        capacity=capacity,
+                        min_party_size=min_party,
+                        max_party_size=max_party,
+                        status='open',
+                        is_active=True,
+                    )
+            except IntegrityError:
+                # A concurrent request created the same slot first
+                slot = BookingSlot.objects.get(restaurant=restaurant, date=target_date, start_time=start_time)
         data = BookingSlotSerializer(slot, context={'request': request}).data
         return Response(data, status=201)
 
     @action(detail=False, methods=['get'])
     def by_restaurant(self, request):
-        """Get offers grouped by restaurant"""
+        """Get active offers, optionally for one restaurant (paginated)"""
         restaurant_id = request.query_params.get('restaurant_id')
         if restaurant_id:
             offers = self.queryset.filter(restaurant_id=restaurant_id, is_active=True)
         else:
             offers = self.queryset.filter(is_active=True)
-        
-        serializer = self.get_serializer(offers, many=True)
-        return Response(serializer.data)
+        return self._paginated_offers(offers)
 
     @action(detail=True, methods=['post'])
     def toggle_active(self, request, pk=None):
@@ -961,6 +988,8 @@ class OfferViewSet(viewsets.ModelViewSet):
         else:
             offers = all_offers.filter(restaurant__owner=user)
         unauthorized_count = max(0, len(offer_ids) - offers.count())
+        # QuerySet.update() bypasses post_save, so drop the affected slot index rows explicitly
+        affected_restaurants = set(offers.values_list('restaurant_id', flat=True))
 
         if action_type == 'activate':
             offers.update(is_active=True)
@@ -984,6 +1013,11 @@ class OfferViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        for rid in affected_restaurants:
+            slot_index.invalidate(rid)
+            response_cache.bump_restaurant(rid)
+        response_cache.bump_catalog()
+        
         response = {'message': message, 'processed': offers.count()}
         if unauthorized_count:
             response['skipped_unauthorized'] = unauthorized_count
@@ -995,7 +1029,7 @@ class OfferViewSet(viewsets.ModelViewSet):
 
         Payload example (percentage offers):
         {
-          "restaurant": 5,
+          "restaurant": 5,                        # or "restaurants": [5, 6, 7] for a whole chain
           "offer_type": "percentage",            # or "amount"
           "title_template": "Lunch Deal {hour}:00", # {hour} placeholder replaced
           "description": "Auto generated lunch deal",
@@ -1011,29 +1045,40 @@ class OfferViewSet(viewsets.ModelViewSet):
              "18": [ {"minute":0, "discount_percentage":40}, {"minute":30, "discount_percentage":30} ]
           },
           "original_price": 0,                    # optional (needed if using discount_amount to compute %) 
-          "replace": true                         # if true delete existing one-hour offers starting at these hours in range
+          "replace": true,                        # if true delete existing one-hour offers starting at these hours in range
+          "dry_run": false                        # if true only return the plan (create/replace/skip per restaurant and hour)
         }
 
         Rules:
-        - Creates one Offer per listed hour with start_time=HH:00 end_time=HH+1:00.
-        - For each pattern entry creates two OfferTimeSlot (HH:MM to HH:MM+30).
+        - Creates one Offer per listed hour and restaurant with start_time=HH:00 end_time=HH+1:00.
+        - For each pattern entry creates one 30-minute OfferTimeSlot (HH:MM to HH:MM+30).
         - Skips hours that would duplicate an existing offer unless replace=true.
-        - Ownership: only admin/staff or restaurant owner.
+        - Ownership: only admin/staff or the owner of every listed restaurant.
+        - All writes happen in one transaction with bulk statements (see marketplace.schedule).
         """
         import datetime
-        from django.utils import timezone
+        from marketplace import schedule
         data = request.data
-        restaurant_id = data.get('restaurant')
-        if not restaurant_id:
-            return Response({'error': 'restaurant is required'}, status=400)
+        single = 'restaurants' not in data
+        raw_ids = [data.get('restaurant')] if single else data.get('restaurants')
+        if not raw_ids or not isinstance(raw_ids, list) or not all(raw_ids):
+            return Response({'error': 'restaurant (or a non-empty restaurants list) is required'}, status=400)
         try:
-            restaurant = Restaurant.objects.get(id=restaurant_id)
-        except Restaurant.DoesNotExist:
-            return Response({'error': 'Restaurant not found'}, status=404)
+            restaurant_ids = list(dict.fromkeys(int(rid) for rid in raw_ids))
+        except (TypeError, ValueError):
+            return Response({'error': 'restaurant ids must be integers'}, status=400)
+        if len(restaurant_ids) > self.SCHEDULE_MAX_RESTAURANTS:
+            return Response({'error': f'At most {self.SCHEDULE_MAX_RESTAURANTS} restaurants per request'}, status=400)
+        owners = dict(Restaurant.objects.filter(id__in=restaurant_ids).values_list('id', 'owner_id'))
+        missing = [rid for rid in restaurant_ids if rid not in owners]
+        if missing:
+            return Response({'error': 'Restaurant not found', 'restaurant_ids': missing}, status=404)
 
         user = request.user
-        if not (getattr(user,'is_staff',False) or getattr(user,'user_type','')=='admin' or restaurant.owner_id == getattr(user,'id',None)):
-            return Response({'error':'Not authorized for this restaurant'}, status=403)
+        if not (getattr(user,'is_staff',False) or getattr(user,'user_type','')=='admin'):
+            foreign = [rid for rid in restaurant_ids if owners[rid] != getattr(user,'id',None)]
+            if foreign:
+                return Response({'error':'Not authorized for this restaurant', 'restaurant_ids': foreign}, status=403)
 
         try:
             start_date = datetime.date.fromisoformat(data.get('start_date'))
@@ -1054,120 +1099,59 @@ class OfferViewSet(viewsets.ModelViewSet):
         if offer_type not in ('percentage','amount'):
             return Response({'error':'offer_type must be percentage or amount'}, status=400)
 
-        title_template = data.get('title_template','Deal {hour}:00')
-        description = data.get('description','Auto generated offer')
-        days_of_week = data.get('days_of_week','')  # optional
-        replace = bool(data.get('replace', False))
-        original_price = data.get('original_price')
-
         slots_pattern = data.get('slots_pattern') or []
         hour_specific = data.get('hour_specific') or {}
         if (not slots_pattern) and (not hour_specific):
             return Response({'error':'Provide slots_pattern or hour_specific'}, status=400)
-
-        def normalize_pattern(pat_list):
-            out=[]
-            for entry in pat_list:
-                minute = entry.get('minute')
-                if minute not in (0,30):
-                    raise ValueError(f'invalid minute {minute}, must be 0 or 30')
-                # Support either percentage or amount
-                disc_pct = entry.get('discount_percentage')
-                disc_amt = entry.get('discount_amount')
-                if offer_type=='percentage' and disc_pct is None:
-                    raise ValueError('discount_percentage required for percentage offer')
-                if offer_type=='amount' and disc_amt is None:
-                    raise ValueError('discount_amount required for amount offer')
-                out.append({'minute':minute,'discount_percentage':disc_pct,'discount_amount':disc_amt})
-            return out
-
         try:
-            base_pattern = normalize_pattern(slots_pattern) if slots_pattern else None
-            per_hour_patterns = {str(k): normalize_pattern(v) for k,v in hour_specific.items()}
+            base_pattern = schedule.normalize_pattern(slots_pattern, offer_type) if slots_pattern else None
+            per_hour_patterns = {str(k): schedule.normalize_pattern(v, offer_type) for k,v in hour_specific.items()}
         except ValueError as e:
             return Response({'error': str(e)}, status=400)
 
-        created=[]
-        skipped=[]
-        deleted=0
-        for hour in hours:
-            # Optional replacement of existing one-hour offers
-            existing_qs = Offer.objects.filter(restaurant=restaurant, start_time__hour=hour, end_time__hour=(hour+1)%24, start_date=start_date, end_date=end_date)
-            if existing_qs.exists():
-                if replace:
-                    deleted += existing_qs.count()
-                    existing_qs.delete()
-                else:
-                    skipped.append(hour)
-                    continue
-            # Build offer data
-            offer_title = title_template.replace('{hour}', f'{hour:02d}')
+        spec = {
+            'hours': list(dict.fromkeys(hours)),
+            'start_date': start_date,
+            'end_date': end_date,
+            'offer_type': offer_type,
+            'title_template': data.get('title_template','Deal {hour}:00'),
+            'description': data.get('description','Auto generated offer'),
+            'days_of_week': data.get('days_of_week',''),  # optional
+            'replace': bool(data.get('replace', False)),
+            'original_price': data.get('original_price'),
             # Availability / booking settings (with sane defaults if not supplied)
-            available_quantity = data.get('available_quantity', 10)
-            max_people_per_booking = data.get('max_people_per_booking', 6)
-            min_advance_booking = data.get('min_advance_booking', 1)
-            offer_kwargs = dict(
-                restaurant=restaurant,
-                title=offer_title,
-                description=description,
-                offer_type=offer_type,
-                start_date=start_date,
-                end_date=end_date,
-                start_time=datetime.time(hour,0,0),
-                end_time=datetime.time((hour+1)%24,0,0),
-                is_active=True,
-                available_quantity=available_quantity,
-                max_people_per_booking=max_people_per_booking,
-                min_advance_booking=min_advance_booking,
-            )
-            if days_of_week:
-                offer_kwargs['days_of_week']=days_of_week
-            if offer_type=='percentage':
-                # Use max of pattern percentages as headline (optional), else first
-                pattern = per_hour_patterns.get(str(hour), base_pattern)
-                headline = max([p['discount_percentage'] for p in pattern if p['discount_percentage'] is not None]) if pattern else None
-                offer_kwargs['discount_percentage']=headline
-            else:
-                pattern = per_hour_patterns.get(str(hour), base_pattern)
-                if pattern:
-                    # Use max discount amount across pattern as headline
-                    max_amt = None
-                    for p in pattern:
-                        da = p.get('discount_amount')
-                        if da is not None:
-                            if max_amt is None or da > max_amt:
-                                max_amt = da
-                    offer_kwargs['discount_amount']=max_amt
-            if original_price is not None:
-                offer_kwargs['original_price']=original_price
-            offer = Offer.objects.create(**offer_kwargs)
-            # Create time slots
-            pattern = per_hour_patterns.get(str(hour), base_pattern) or []
-            for entry in pattern:
-                minute = entry['minute']
-                st = datetime.time(hour, minute,0)
-                et_minute = 30 if minute==0 else 0
-                et_hour = hour if minute==0 else (hour+1)%24
-                et = datetime.time(et_hour, et_minute,0)
-                OfferTimeSlot.objects.create(
-                    offer=offer,
-                    restaurant=restaurant,
-                    start_time=st,
-                    end_time=et,
-                    discount_percentage=entry.get('discount_percentage'),
-                    discount_amount=entry.get('discount_amount'),
-                    is_active=True,
-                )
-            created.append({'id':offer.id,'hour':hour})
+            'available_quantity': data.get('available_quantity', 10),
+            'max_people_per_booking': data.get('max_people_per_booking', 6),
+            'min_advance_booking': data.get('min_advance_booking', 1),
+            'base_pattern': base_pattern,
+            'per_hour_patterns': per_hour_patterns,
+        }
+        items = schedule.plan(restaurant_ids, spec)
+        skipped = [{'restaurant_id': i['restaurant_id'], 'hour': i['hour']} for i in items if i['action'] == 'skip']
+        response = {
+            'restaurant_ids': restaurant_ids,
+            'date_range': {'start': start_date.isoformat(),'end': end_date.isoformat()},
+            # Hours alone for the single-restaurant form, as before
+            'skipped_existing': [s['hour'] for s in skipped] if single else skipped,
+        }
+        if single:
+            response['restaurant_id'] = restaurant_ids[0]
+        if data.get('dry_run'):
+            response.update({
+                'dry_run': True,
+                'plan': items,
+                'create_count': sum(1 for i in items if i['action'] != 'skip'),
+                'replace_count': sum(len(i['replaces']) for i in items),
+            })
+            return Response(response)
 
-        return Response({
+        created, deleted = schedule.execute(items, spec)
+        response.update({
             'created_count': len(created),
             'created': created,
-            'skipped_existing': skipped,
             'deleted_replaced': deleted,
-            'restaurant_id': restaurant.id,
-            'date_range': {'start': start_date.isoformat(),'end': end_date.isoformat()}
         })
+        return Response(response)
 
 class BookingViewSet(viewsets.ModelViewSet):
     serializer_class = BookingSerializer
@@ -1238,7 +1222,7 @@ class BookingViewSet(viewsets.ModelViewSet):
 
 class BookingSlotAvailabilityViewSet(viewsets.ReadOnlyModelViewSet):
     """Read-only availability for booking slots; filtered by restaurant, date, party size, granularity."""
-    queryset = BookingSlot.objects.select_related('restaurant')
+    queryset = BookingSlot.objects.with_capacity().select_related('restaurant')
     serializer_class = BookingSlotSerializer
     http_method_names = ['get']
 
@@ -1255,7 +1239,7 @@ class BookingSlotAvailabilityViewSet(viewsets.ReadOnlyModelViewSet):
             target_date = datetime.date.fromisoformat(date_str)
         except ValueError:
             return Response({'error': 'Invalid date format (YYYY-MM-DD)'}, status=400)
-        slots = BookingSlot.objects.filter(restaurant_id=restaurant_id, date=target_date, is_active=True)
+        slots = BookingSlot.objects.with_capacity().filter(restaurant_id=restaurant_id, date=target_date, is_active=True)
         # Build response with effective status filtered for party size
         data = []
         for slot in slots:
@@ -1273,6 +1257,82 @@ class BookingSlotAvailabilityViewSet(viewsets.ReadOnlyModelViewSet):
         # Optionally could fill missing granular slots here.
         return Response({'slots': data, 'restaurant_id': int(restaurant_id), 'date': target_date.isoformat(), 'granularity': granularity})
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Which restaurants have a table for N at date D around time T?
+
+        Query params:
+          - date (YYYY-MM-DD, required)
+          - party_size (int, optional, default 2)
+          - time (HH:MM, optional) with flex_minutes (default 30) either side; whole day if omitted
+          - city, cuisine (optional) filters, as in the offers feed
+          - sort (optional) 'discount' (default) or 'time'
+          - limit (optional, default 50, at most 200)
+        Candidate slots come from one SQL query on (date, start_time) with party-size
+        bounds and remaining capacity pushed down; discounts are resolved for all
+        candidates with two more queries through slot_engine.
+        """
+        import datetime
+        try:
+            target_date = datetime.date.fromisoformat(request.query_params.get('date') or '')
+        except ValueError:
+            return Response({'error': 'date is required (YYYY-MM-DD)'}, status=400)
+        try:
+            party_size = int(request.query_params.get('party_size', 2))
+            flex = int(request.query_params.get('flex_minutes', 30))
+            limit = max(1, min(int(request.query_params.get('limit', 50)), 200))
+        except ValueError:
+            return Response({'error': 'party_size, flex_minutes and limit must be integers'}, status=400)
+        sort = request.query_params.get('sort', 'discount')
+
+        slots = BookingSlot.objects.bookable_for(party_size).filter(
+            date=target_date, restaurant__is_active=True,
+        ).select_related('restaurant', 'restaurant__city')
+        time_str = request.query_params.get('time')
+        if time_str:
+            try:
+                hh, mm = map(int, time_str.split(':')[:2])
+                minutes = hh * 60 + mm
+            except ValueError:
+                return Response({'error': 'Invalid time format (HH:MM)'}, status=400)
+            lo, hi = max(0, minutes - flex), min(24 * 60 - 1, minutes + flex)
+            slots = slots.filter(
+                start_time__gte=datetime.time(lo // 60, lo % 60), start_time__lte=datetime.time(hi // 60, hi % 60),
+            )
+        city = request.query_params.get('city')
+        if city:
+            city_obj = City.lookup(city)
+            slots = slots.filter(restaurant__city=city_obj) if city_obj else slots.filter(restaurant__address__icontains=city.strip())
+        cuisine = request.query_params.get('cuisine')
+        if cuisine:
+            slots = slots.filter(restaurant__cuisine_type__icontains=cuisine)
+
+        # Past/lead-time rules depend on "now"; everything else was filtered in SQL
+        candidates = [s for s in slots if slot_engine.is_bookable(s)]
+        grids = slot_engine.build_grids({s.restaurant_id for s in candidates}, target_date)
+        results = []
+        for slot in candidates:
+            grid = grids[slot.restaurant_id]
+            grid.add_slots([slot])
+            index = slot_engine.bin_of(slot.start_time)
+            results.append({
+                'slot_id': slot.id,
+                'restaurant_id': slot.restaurant_id,
+                'restaurant_name': slot.restaurant.name,
+                'city': slot.restaurant.city_label,
+                'date': target_date.isoformat(),
+                'time': slot.start_time.strftime('%H:%M'),
+                'discount_percent': grid.discount[index] or 0.0,
+                'source': grid.source[index],
+                'offer_id': grid.offer_id[index],
+                'remaining_capacity': slot.remaining_capacity,
+            })
+        if sort == 'time':
+            results.sort(key=lambda r: (r['time'], -r['discount_percent']))
+        else:
+            results.sort(key=lambda r: (-r['discount_percent'], r['time']))
+        return Response({'date': target_date.isoformat(), 'party_size': party_size, 'results': results[:limit]})
+
 from rest_framework.views import APIView
 
 class AvailabilityView(APIView):
@@ -1285,7 +1345,7 @@ class AvailabilityView(APIView):
         if not slot_id:
             return Response({'error': 'slot_id required'}, status=400)
         try:
-            slot = BookingSlot.objects.get(id=int(slot_id))
+            slot = BookingSlot.objects.with_capacity().get(id=int(slot_id))
         except (ValueError, BookingSlot.DoesNotExist):
             return Response({'available': False, 'remaining': 0})
         status_eff = slot.effective_status()
@@ -1296,7 +1356,7 @@ class AvailabilityView(APIView):
 
 class BookingSlotViewSet(viewsets.ModelViewSet):
     """CRUD for BookingSlots (restaurant owner for own restaurants or admin)."""
-    queryset = BookingSlot.objects.select_related('restaurant')
+    queryset = BookingSlot.objects.with_capacity().select_related('restaurant')
     serializer_class = BookingSlotSerializer
     filterset_fields = ['restaurant','date']
     permission_classes = [permissions.IsAuthenticated]
@@ -1443,11 +1503,11 @@ class BookingConfirmView(APIView):
         return Response({'booking_id': str(b.id), 'code': code, 'status': 'confirmed'})
 
 # Admin-specific views
-class AdminRestaurantViewSet(viewsets.ModelViewSet):
+class AdminRestaurantViewSet(fieldsets.SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     Admin-only viewset for managing restaurants with additional functionality
     """
-    queryset = Restaurant.objects.all().select_related('owner').prefetch_related('offers')
+    queryset = Restaurant.objects.all()
     permission_classes = [permissions.IsAuthenticated, permissions.IsAdminUser]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     search_fields = ['name', 'cuisine_type', 'address', 'owner__username', 'owner__email']
@@ -1455,6 +1515,15 @@ class AdminRestaurantViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'rating', 'created_at', 'updated_at']
     ordering = ['-created_at']
 
+    def get_queryset(self):
+        def select_owner(q):
+            return q.select_related('owner')
+        return fieldsets.plan(super().get_queryset(), AdminRestaurantSerializer, self.sparse_fields, {
+            'owner_username': select_owner,
+            'owner_email': select_owner,
+            'total_offers': lambda q: q.prefetch_related('offers'),
+        })
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return AdminRestaurantCreateUpdateSerializer
@@ -1603,10 +1672,16 @@ class AdminRestaurantViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        # QuerySet.update() bypasses post_save, so move the cache versions explicitly
+        for rid in restaurant_ids:
+            response_cache.bump_restaurant(rid)
+        response_cache.bump_catalog()
+        response_cache.bump_locations()
+        spatial.invalidate()
         return Response({'message': message})
 
 
-class AdminOfferViewSet(viewsets.ModelViewSet):
+class AdminOfferViewSet(fieldsets.SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """
     Admin-only CRUD for offers. Staff can create, edit, and delete offers for any restaurant.
     """
@@ -1619,13 +1694,16 @@ class AdminOfferViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'updated_at', 'start_date', 'end_date', 'discount_percentage', 'discount_amount']
     ordering = ['-created_at']
 
+    def get_queryset(self):
+        return fieldsets.plan(super().get_queryset().select_related(None), OfferSerializer, self.sparse_fields, OFFER_LOADERS)
+
     @action(detail=False, methods=['get'])
     def by_restaurant(self, request):
         """List offers for a specific restaurant id."""
         restaurant_id = request.query_params.get('restaurant')
         if not restaurant_id:
             return Response({'error': 'restaurant query param required'}, status=status.HTTP_400_BAD_REQUEST)
-        qs = self.queryset.filter(restaurant_id=restaurant_id)
+        qs = self.get_queryset().filter(restaurant_id=restaurant_id)
         page = self.paginate_queryset(qs)
         if page is not None:
             ser = self.get_serializer(page, many=True)
@@ -1641,6 +1719,7 @@ class AdminOfferViewSet(viewsets.ModelViewSet):
         if not action_type or not offer_ids:
             return Response({'error': 'action and offer_ids are required'}, status=status.HTTP_400_BAD_REQUEST)
         offers = Offer.objects.filter(id__in=offer_ids)
+        affected_restaurants = set(offers.values_list('restaurant_id', flat=True))
         if action_type == 'activate':
             offers.update(is_active=True)
             msg = f"{offers.count()} offers activated"
@@ -1659,4 +1738,8 @@ class AdminOfferViewSet(viewsets.ModelViewSet):
             msg = f"{count} offers deleted"
         else:
             return Response({'error': 'Invalid action'}, status=status.HTTP_400_BAD_REQUEST)
+        for rid in affected_restaurants:
+            slot_index.invalidate(rid)
+            response_cache.bump_restaurant(rid)
+        response_cache.bump_catalog()
         return Response({'message': msg})
\ No newline at end of file